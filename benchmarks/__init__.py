@@ -0,0 +1,23 @@
+"""
+Offline benchmarks
+==================
+
+End-to-end grading and database read benchmarks that run without the
+Florence-2 weights or a scoring provider::
+
+    python -m benchmarks.run pipeline --sheets 50 --pages 3
+    python -m benchmarks.run reads --students 10000
+    python -m benchmarks.run all --check
+
+See ``benchmarks/run.py`` for the options.  Everything except
+``extract`` needs the database from ``configuration/config.yml``; rows
+created by a run are removed afterwards.
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (str(ROOT), str(ROOT / "src")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
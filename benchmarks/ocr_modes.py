@@ -0,0 +1,166 @@
+"""
+CPU inference modes: accuracy versus speed
+==========================================
+
+::
+
+    python -m benchmarks.ocr_modes --pages 12 --modes float32,int8,int8+compile --threads 8
+
+Runs the real Florence-2 on CPU over a fixed page set (synthetic answer
+pages with a fixed seed, or the images/PDFs in ``--pages-dir``) once per
+mode.  ``float32`` is always run first and is the reference: for every
+other mode the report gives the speed-up and how closely its ``labels``
+match the float32 ones (exact label matches and a character-level
+similarity), so a ``florence.cpu`` setting can be picked per deployment.
+Thread counts apply to the whole run, since torch sizes its pools once.
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import fitz
+from PIL import Image
+from rapidfuzz import fuzz
+
+from configuration.florenc2_config import CPU_PRECISIONS, build_florence, set_cpu_threads
+from configuration.main_config import FLORENCE_BATCH_SIZE, FLORENCE_PROFILE
+from utility.inference import generate
+
+from .report import peak_rss_mb
+from .synthetic import make_answer_pdf
+
+TASK_PROMPT = "<OCR_WITH_REGION>"
+RASTER_DPI = 200  # pdf2image's default, as used by extract_text_from_pdf
+
+
+def parse_mode(mode: str) -> tuple:
+    precision, _, extra = mode.partition("+")
+    if precision not in CPU_PRECISIONS or extra not in ("", "compile"):
+        raise ValueError(f"Unknown mode '{mode}' (precision[+compile], precision in {CPU_PRECISIONS})")
+    return precision, extra == "compile"
+
+
+def rasterize(path: Path) -> list:
+    pages = []
+    with fitz.open(path) as document:
+        for page in document:
+            pixmap = page.get_pixmap(dpi=RASTER_DPI)
+            pages.append(Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples))
+    return pages
+
+
+def load_pages(pages_dir: Path, count: int) -> list:
+    """The fixed page set: ``pages_dir`` contents in name order, or seeded synthetic pages."""
+    if pages_dir:
+        pages = []
+        for path in sorted(pages_dir.iterdir()):
+            if path.suffix.lower() == ".pdf":
+                pages.extend(rasterize(path))
+            elif path.suffix.lower() in (".png", ".jpg", ".jpeg"):
+                pages.append(Image.open(path).convert("RGB"))
+        return pages[:count]
+    with tempfile.TemporaryDirectory(prefix="grading-ocr-modes-") as workdir:
+        path = Path(workdir) / "pages.pdf"
+        make_answer_pdf(path, count, answers_per_page=5, seed=0)
+        return rasterize(path)
+
+
+def labels_of(result: dict) -> list:
+    return [label.replace("</s>", "").strip() for label in result.get(TASK_PROMPT, {}).get("labels", [])]
+
+
+def agreement(reference: list, candidate: list) -> dict:
+    """How well ``candidate`` labels (per page) reproduce the ``reference`` ones."""
+    matched = total = 0
+    similarity = []
+    for expected, got in zip(reference, candidate):
+        matched += sum((Counter(expected) & Counter(got)).values())
+        total += len(expected)
+        similarity.append(fuzz.ratio("\n".join(expected), "\n".join(got)))
+    return {
+        "label_match": round(matched / total, 4) if total else None,
+        "char_similarity": round(sum(similarity) / len(similarity), 2) if similarity else None,
+    }
+
+
+def bench_mode(mode: str, pages: list, batch_size: int, profile: str) -> tuple:
+    precision, compile = parse_mode(mode)
+    started = time.perf_counter()
+    processor, model = build_florence(precision, compile)
+    load_seconds = time.perf_counter() - started
+
+    # One warm-up batch, so torch.compile's first-call cost is reported apart.
+    started = time.perf_counter()
+    generate(processor, model, pages[:batch_size], TASK_PROMPT, profile)
+    warmup_seconds = time.perf_counter() - started
+
+    labels = []
+    started = time.perf_counter()
+    for index in range(0, len(pages), batch_size):
+        batch = pages[index:index + batch_size]
+        labels.extend(labels_of(result) for result in generate(processor, model, batch, TASK_PROMPT, profile))
+    elapsed = time.perf_counter() - started
+
+    del processor, model
+    gc.collect()
+    return {
+        "load_s": round(load_seconds, 1),
+        "warmup_s": round(warmup_seconds, 1),
+        "pages_per_sec": round(len(pages) / elapsed, 3),
+        "s_per_page": round(elapsed / len(pages), 2),
+    }, labels
+
+
+def run(args) -> dict:
+    modes = ["float32"] + [mode for mode in args.modes.split(",") if mode and mode != "float32"]
+    for mode in modes:
+        parse_mode(mode)
+    set_cpu_threads(args.threads, args.interop_threads)
+    pages = load_pages(args.pages_dir, args.pages)
+    if not pages:
+        raise SystemExit("No pages to run")
+
+    results, reference = {}, None
+    for mode in modes:
+        result, labels = bench_mode(mode, pages, args.batch_size, args.profile)
+        if reference is None:
+            reference = labels
+        result["speedup"] = round(result["pages_per_sec"] / results["float32"]["pages_per_sec"], 2) if results else 1.0
+        result.update(agreement(reference, labels))
+        results[mode] = result
+    results["process"] = {"pages": len(pages), "threads": args.threads, "interop_threads": args.interop_threads,
+                          "peak_rss_mb": peak_rss_mb()}
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.ocr_modes", description=__doc__.split("\n")[1])
+    parser.add_argument("--modes", default="float32,int8,float32+compile,int8+compile")
+    parser.add_argument("--pages", type=int, default=12, help="pages in the fixed set")
+    parser.add_argument("--pages-dir", type=Path, help="use these PDFs/images instead of synthetic pages")
+    parser.add_argument("--batch-size", type=int, default=FLORENCE_BATCH_SIZE)
+    parser.add_argument("--profile", default=FLORENCE_PROFILE)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    parser.add_argument("--interop-threads", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="also write the report here as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
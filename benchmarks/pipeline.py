@@ -0,0 +1,91 @@
+"""Sheets through ``extract_text_from_pdf`` and ``evaluate_answer_sheet``."""
+
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from repository import jobs
+from utility import utilities, scoring
+
+from .report import summarize
+from .synthetic import make_answer_pdf
+
+
+def make_sheets(workdir: Path, sheets: int, pages: int, answers_per_page: int) -> list:
+    seed = uuid.uuid4().int & 0xFFFFFFFF
+    paths = []
+    for n in range(sheets):
+        path = workdir / f"sheet_{n}.pdf"
+        make_answer_pdf(path, pages, answers_per_page, seed=seed + n)
+        paths.append(path)
+    return paths
+
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def _run(function, argument_lists: list, concurrency: int) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda args: _timed(function, *args), argument_lists))
+    elapsed = time.perf_counter() - started
+    return {"sheets_per_min": round(len(argument_lists) / elapsed * 60, 1), **summarize(latencies)}
+
+
+def bench_extract(paths: list, pages: int, concurrency: int) -> dict:
+    """OCR only: rasterize, hand off and extract every sheet (no database)."""
+    result = _run(lambda path: utilities.extract_text_from_pdf(path, use_ocr_cache=False),
+                  [(path,) for path in paths], concurrency)
+    result["pages_per_sec"] = round(result["sheets_per_min"] * pages / 60, 2)
+    return result
+
+
+def _seed_exam(paths: list, question_count: int, scoring_mode: str) -> tuple:
+    with jobs.connect() as conn:
+        exam_id = conn.execute(
+            """INSERT INTO exams (title, subject, instructions, scoring_mode)
+            VALUES ('benchmark', 'benchmark', '', %s) RETURNING id""",
+            (scoring_mode,),
+        ).fetchone()["id"]
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO questions (exam_id, text, ideal_answer, point_value) VALUES (%s, %s, %s, %s)",
+                [(exam_id, f"Question {n}", f"cell membrane protein energy {n}", 2.0) for n in range(question_count)],
+            )
+        sheet_ids = []
+        for n, path in enumerate(paths):
+            student_id = conn.execute(
+                "INSERT INTO students (exam_id, name) VALUES (%s, %s) RETURNING id", (exam_id, f"Student {n}")
+            ).fetchone()["id"]
+            sheet_ids.append(conn.execute(
+                "INSERT INTO answer_sheets (student_id, filename) VALUES (%s, %s) RETURNING id",
+                (student_id, path.name),
+            ).fetchone()["id"])
+    return exam_id, sheet_ids
+
+
+def drop_exam(exam_id: int) -> None:
+    with jobs.connect() as conn:
+        conn.execute("DELETE FROM exams WHERE id = %s", (exam_id,))
+        conn.execute("DELETE FROM score_cache WHERE model_id = %s", (scoring.StubBackend.model_id,))
+
+
+def bench_evaluate(paths: list, pages: int, answers_per_page: int, concurrency: int,
+                   scoring_mode: str, backend) -> dict:
+    """The whole grading path of a worker: OCR, scoring and DB writes.
+
+    ``backend`` is the ``CountingBackend`` installed for scoring; its call
+    and prompt-token counts are the cost of the chosen ``scoring_mode``.
+    """
+    exam_id, sheet_ids = _seed_exam(paths, pages * answers_per_page, scoring_mode)
+    backend.reset()
+    try:
+        result = _run(lambda path, sheet_id: utilities.evaluate_answer_sheet(path, sheet_id, use_ocr_cache=False),
+                      list(zip(paths, sheet_ids)), concurrency)
+    finally:
+        drop_exam(exam_id)
+    return {**result, "scoring_calls": backend.calls, "prompt_tokens_est": backend.prompt_tokens}
@@ -0,0 +1,115 @@
+"""Database-heavy pages at roster scale: exam detail, results and the CSV export.
+
+Pages are measured with the page cache off, so every request runs its
+queries; the cached pages are reported again as ``<name>.cached``.
+"""
+
+import random
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from configuration.database_config import open_pool, close_pool
+from controllers import routes
+from repository import jobs
+from services import service
+from utility.page_cache import PageCache
+
+from .report import summarize
+
+QUESTIONS = 10
+
+
+def seed_roster(students: int, questions: int = QUESTIONS) -> int:
+    """One exam with ``students`` graded sheets, loaded with COPY. Returns the exam id."""
+    rng = random.Random(students)
+    with jobs.connect() as conn:
+        exam_id = conn.execute(
+            "INSERT INTO exams (title, subject, instructions) VALUES ('benchmark', 'benchmark', '') RETURNING id"
+        ).fetchone()["id"]
+        with conn.cursor() as cursor:
+            with cursor.copy("COPY questions (exam_id, text, ideal_answer, point_value) FROM STDIN") as copy:
+                for n in range(questions):
+                    copy.write_row((exam_id, f"Question {n}", f"Ideal answer {n}", 2.0))
+            with cursor.copy("COPY students (exam_id, name) FROM STDIN") as copy:
+                for n in range(students):
+                    copy.write_row((exam_id, f"Student {n}"))
+            cursor.execute(
+                """
+                INSERT INTO answer_sheets (student_id, filename, evaluated_at, total_score)
+                SELECT id, 'benchmark.pdf', now(), 0 FROM students WHERE exam_id = %s
+                """,
+                (exam_id,),
+            )
+            cursor.execute(
+                """SELECT answer_sheets.id FROM answer_sheets
+                JOIN students ON answer_sheets.student_id = students.id WHERE students.exam_id = %s""",
+                (exam_id,),
+            )
+            sheet_ids = [row["id"] for row in cursor.fetchall()]
+            cursor.execute("SELECT id FROM questions WHERE exam_id = %s ORDER BY id", (exam_id,))
+            question_ids = [row["id"] for row in cursor.fetchall()]
+            with cursor.copy("COPY answers (answer_sheet_id, question_id, student_answer, score) FROM STDIN") as copy:
+                for sheet_id in sheet_ids:
+                    for question_id in question_ids:
+                        copy.write_row((sheet_id, question_id, "benchmark answer", round(rng.uniform(0, 2), 2)))
+            cursor.execute(
+                """UPDATE answer_sheets SET total_score = totals.total
+                FROM (SELECT answer_sheet_id, SUM(score) AS total FROM answers
+                      WHERE answer_sheet_id = ANY(%s) GROUP BY answer_sheet_id) AS totals
+                WHERE answer_sheets.id = totals.answer_sheet_id""",
+                (sheet_ids,),
+            )
+            # Grading keeps best_score current; seeded sheets bypass it.
+            cursor.execute(
+                """UPDATE students SET best_score = answer_sheets.total_score
+                FROM answer_sheets WHERE answer_sheets.student_id = students.id AND students.exam_id = %s""",
+                (exam_id,),
+            )
+        conn.execute("ANALYZE questions, students, answer_sheets, answers")
+    return exam_id
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_pool()
+    yield
+    await close_pool()
+
+
+def bench_reads(students: int, repeat: int) -> dict:
+    exam_id = seed_roster(students)
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(routes.router)
+    pages = {
+        "reads.exam_detail": f"{routes.router.prefix}/exams/{exam_id}",
+        "reads.exam_results": f"{routes.router.prefix}/exams/{exam_id}/results",
+        "reads.exam_results_by_score": f"{routes.router.prefix}/exams/{exam_id}/results?sort=score",
+        "reads.export_results": f"{routes.router.prefix}/exams/{exam_id}/export",
+    }
+    cached_pages = ("reads.exam_detail", "reads.exam_results", "reads.exam_results_by_score")
+    runs = [(name, url, False) for name, url in pages.items()]
+    runs += [(f"{name}.cached", pages[name], True) for name in cached_pages]
+    results = {}
+    original = service.page_cache
+    try:
+        with TestClient(app) as client:
+            for name, url, cached in runs:
+                service.page_cache = PageCache(shared=False, enabled=cached)
+                client.get(url)  # warm the pool (and, for .cached, the page cache)
+                latencies = []
+                size = 0
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    size = len(response.content)
+                    latencies.append(time.perf_counter() - started)
+                    response.raise_for_status()
+                results[name] = {"students": students, "bytes": size, **summarize(latencies)}
+    finally:
+        service.page_cache = original
+        with jobs.connect() as conn:
+            conn.execute("DELETE FROM exams WHERE id = %s", (exam_id,))
+    return results
@@ -0,0 +1,62 @@
+"""Latency summaries, peak RSS and the baseline regression check."""
+
+import json
+import resource
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BASELINES = Path(__file__).resolve().parent / "baselines.json"
+
+# Metrics where a larger number is an improvement; everything else is a cost.
+HIGHER_IS_BETTER = {"sheets_per_min", "pages_per_sec"}
+COMPARED = {"sheets_per_min", "pages_per_sec", "p50_ms", "p95_ms", "peak_rss_mb",
+            "scoring_calls", "prompt_tokens_est"}
+
+
+def summarize(latencies: list) -> dict:
+    """p50/p95/mean of per-item latencies given in seconds."""
+    millis = np.array(latencies, dtype=float) * 1000
+    if not len(millis):
+        return {"count": 0}
+    return {
+        "count": int(len(millis)),
+        "p50_ms": round(float(np.percentile(millis, 50)), 1),
+        "p95_ms": round(float(np.percentile(millis, 95)), 1),
+        "mean_ms": round(float(millis.mean()), 1),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def load_baselines(path: Path = BASELINES) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baselines(results: dict, path: Path = BASELINES) -> None:
+    baselines = load_baselines(path)
+    baselines.update(results)
+    path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+
+
+def regressions(results: dict, baselines: dict, threshold: float) -> list:
+    """Describe every compared metric that got worse than its baseline by more than ``threshold``."""
+    found = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baselines.get(name, {}).get(metric)
+            if metric not in COMPARED or not base or value is None:
+                continue
+            change = (value - base) / base
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > threshold:
+                found.append(f"{name}.{metric}: {value} vs baseline {base} ({worse:+.0%} worse)")
+    return found
@@ -0,0 +1,112 @@
+"""
+Benchmark runner
+================
+
+::
+
+    python -m benchmarks.run extract   # OCR path only, no database
+    python -m benchmarks.run pipeline  # extract + evaluate_answer_sheet
+    python -m benchmarks.run reads     # exam detail / results / export
+    python -m benchmarks.run all
+
+OCR is a stub with ``--ocr-batch-ms`` + ``--ocr-page-ms`` latency unless
+``--ocr florence`` runs the real model; scoring always uses the stub
+backend with ``--scoring-ms`` per call plus ``--scoring-item-ms`` per
+score requested.  Run ``pipeline`` with ``--scoring-mode question`` and
+``--scoring-mode sheet`` to compare the two by latency and by the
+``scoring_calls`` / ``prompt_tokens_est`` (cost) of the ``evaluate``
+results.
+
+``--ocr-processes N --ocr-threads T`` runs OCR in a pool of N worker
+processes with T torch threads each; sweep N x T (with ``--ocr florence``)
+to find the split with the best ``pages_per_sec`` on a machine.
+
+``--save-baseline`` stores the results in ``benchmarks/baselines.json``;
+``--check`` exits non-zero when a metric is more than ``--threshold``
+worse than its baseline.  Compare runs on the same machine only.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from . import report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Offline grading benchmarks")
+    parser.add_argument("suite", choices=["extract", "pipeline", "reads", "all"])
+    parser.add_argument("--sheets", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--answers-per-page", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4, help="grading threads, like jobs.concurrency")
+    parser.add_argument("--ocr", choices=["stub", "florence"], default="stub")
+    parser.add_argument("--ocr-batch-ms", type=float, default=50.0)
+    parser.add_argument("--ocr-page-ms", type=float, default=400.0)
+    parser.add_argument("--ocr-processes", type=int, default=0, help="OCR worker processes (0 = in-process)")
+    parser.add_argument("--ocr-threads", type=int, default=4, help="torch threads per OCR process")
+    parser.add_argument("--ocr-batch-size", type=int, default=2, help="pages per batch with --ocr-processes")
+    parser.add_argument("--scoring-ms", type=float, default=200.0, help="latency per scoring call")
+    parser.add_argument("--scoring-item-ms", type=float, default=20.0, help="extra latency per score requested")
+    parser.add_argument("--scoring-mode", choices=["question", "sheet"], default="question")
+    parser.add_argument("--scoring-rate", type=float, default=0,
+                        help="scoring requests/s (0 keeps scoring.rate_per_second)")
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression, 0.2 = 20%%")
+    return parser.parse_args(argv)
+
+
+def run(args) -> dict:
+    results = {}
+    if args.suite in ("extract", "pipeline", "all"):
+        from . import stubs, pipeline
+
+        backend = stubs.install(args.ocr, args.ocr_batch_ms, args.ocr_page_ms, args.answers_per_page,
+                                args.scoring_ms, args.scoring_item_ms, args.scoring_rate,
+                                args.ocr_processes, args.ocr_threads, args.ocr_batch_size)
+        suffix = "" if args.ocr == "stub" else f".{args.ocr}"
+        if args.ocr_processes:
+            suffix += f".pool{args.ocr_processes}x{args.ocr_threads}"
+        with tempfile.TemporaryDirectory(prefix="grading-bench-") as workdir:
+            paths = pipeline.make_sheets(Path(workdir), args.sheets, args.pages, args.answers_per_page)
+            results[f"extract{suffix}"] = pipeline.bench_extract(paths, args.pages, args.concurrency)
+            if args.suite != "extract":
+                results[f"evaluate{suffix}.{args.scoring_mode}"] = pipeline.bench_evaluate(
+                    paths, args.pages, args.answers_per_page, args.concurrency, args.scoring_mode, backend
+                )
+    if args.suite in ("reads", "all"):
+        from . import reads
+
+        results.update(reads.bench_reads(args.students, args.repeat))
+    # Peak RSS covers the whole run, so it is reported once.
+    results["process"] = {"peak_rss_mb": report.peak_rss_mb()}
+    return results
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.save_baseline:
+        report.save_baselines({f"{args.suite}.{name}": value for name, value in results.items()})
+        print(f"Saved baselines to {report.BASELINES}")
+    if args.check:
+        baselines = report.load_baselines()
+        found = report.regressions(
+            {f"{args.suite}.{name}": value for name, value in results.items()}, baselines, args.threshold
+        )
+        if not baselines:
+            print("No baselines recorded yet; run with --save-baseline first")
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
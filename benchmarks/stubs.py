@@ -0,0 +1,81 @@
+"""Stand-ins for Florence-2 and the scoring provider with configurable latency."""
+
+import time
+import random
+import hashlib
+
+from configuration.main_config import FLORENCE_MODE, FLORENCE_POOL_THREADS, FLORENCE_POOL_BATCH_SIZE
+from utility.inference import BatchInferenceEngine, set_engine, get_engine
+from utility.ocr_pool import OCRPool, run_florence
+from utility import scoring
+
+from .synthetic import answer_text
+
+
+class StubOCRRunner:
+    """Drop-in ``runner`` for ``BatchInferenceEngine``.
+
+    Sleeps ``batch_ms + page_ms * len(images)`` like a batched ``generate``
+    and returns ``answers_per_page`` labels per page, derived from the
+    page pixels so identical pages give identical text.
+    """
+
+    def __init__(self, batch_ms: float = 50.0, page_ms: float = 400.0, answers_per_page: int = 5):
+        self.batch_latency = batch_ms / 1000.0
+        self.page_latency = page_ms / 1000.0
+        self.answers_per_page = answers_per_page
+
+    def __call__(self, images: list, task_prompt: str, profile: str = None) -> list:
+        time.sleep(self.batch_latency + self.page_latency * len(images))
+        results = []
+        for image in images:
+            seed = int.from_bytes(hashlib.blake2b(image.tobytes(), digest_size=8).digest(), "big")
+            rng = random.Random(seed)
+            labels = [f"</s>{answer_text(rng)}" for _ in range(self.answers_per_page)]
+            results.append({task_prompt: {"quad_boxes": [[0.0] * 8 for _ in labels], "labels": labels}})
+        return results
+
+
+class CountingBackend(scoring.ScoringBackend):
+    """Counts the calls and estimated prompt tokens (the cost) of a backend."""
+
+    def __init__(self, inner: scoring.ScoringBackend):
+        self.inner = inner
+        self.model_id = inner.model_id
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.prompt_tokens = 0
+
+    async def complete(self, prompt: str) -> str:
+        self.calls += 1
+        self.prompt_tokens += scoring.estimate_tokens(prompt)
+        return await self.inner.complete(prompt)
+
+
+def install(ocr: str, ocr_batch_ms: float, ocr_page_ms: float, answers_per_page: int,
+            scoring_ms: float, scoring_item_ms: float, scoring_rate: float,
+            ocr_processes: int = 0, ocr_threads: int = FLORENCE_POOL_THREADS,
+            ocr_batch_size: int = FLORENCE_POOL_BATCH_SIZE) -> CountingBackend:
+    """Point the grading pipeline at the chosen backends for this process.
+
+    ``ocr_processes`` > 0 runs OCR (stub or real) in an ``OCRPool`` of
+    that many processes with ``ocr_threads`` torch threads each.
+    """
+    if FLORENCE_MODE != "local":
+        raise SystemExit("Benchmarks run OCR in-process; set florence.mode: local")
+    stub = StubOCRRunner(ocr_batch_ms, ocr_page_ms, answers_per_page)
+    if ocr_processes:
+        pool = OCRPool(ocr_processes, ocr_threads, run=stub if ocr == "stub" else run_florence)
+        set_engine(BatchInferenceEngine(runner=pool, max_batch_size=ocr_batch_size, workers=ocr_processes))
+    elif ocr == "stub":
+        set_engine(BatchInferenceEngine(runner=stub))
+    else:
+        # Real Florence-2 (CPU unless CUDA is present); loaded on first page.
+        get_engine()
+    backend = CountingBackend(scoring.StubBackend(latency_ms=scoring_ms, item_latency_ms=scoring_item_ms))
+    scoring.set_backend(backend)
+    if scoring_rate:
+        scoring.set_rate_limit(scoring_rate, max(int(scoring_rate), 1))
+    return backend
@@ -0,0 +1,37 @@
+"""Synthetic multi-page answer sheets, drawn with PyMuPDF."""
+
+import random
+from pathlib import Path
+
+import fitz
+
+WORDS = (
+    "cell membrane protein energy photosynthesis enzyme nucleus osmosis "
+    "diffusion gravity force velocity acceleration mass reaction oxygen "
+    "carbon molecule gene evolution species ecosystem climate water"
+).split()
+
+
+def answer_text(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_answer_pdf(path: Path, pages: int, answers_per_page: int, seed: int = 0) -> list:
+    """Write a typed answer sheet and return its answers in order.
+
+    ``seed`` changes every answer, so sheets from different runs never hit
+    the OCR or score caches.
+    """
+    rng = random.Random(seed)
+    answers = []
+    with fitz.open() as document:
+        for page_number in range(pages):
+            page = document.new_page(width=595, height=842)  # A4 in points
+            page.insert_text((50, 50), f"Answer sheet {seed} - page {page_number + 1}", fontsize=14)
+            for slot in range(answers_per_page):
+                text = answer_text(rng)
+                answers.append(text)
+                y = 100 + slot * (700 / answers_per_page)
+                page.insert_text((50, y), f"{len(answers)}. {text}", fontsize=11, fontname="helv")
+        document.save(path)
+    return answers
@@ -1,13 +1,51 @@
+import os
+import logging
 import psycopg
-from .main_config import DB_URL 
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from .migrations import apply_migrations
+from .main_config import (
+    DB_URL,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_MAX_IDLE,
+)
+
+logger = logging.getLogger("database.blog")
+
+# One pool per uvicorn worker process, opened in the app lifespan.
+# Request handlers borrow a connection with ``async with pool.connection()``;
+# the connection is committed (or rolled back) and returned on exit.
+pool = AsyncConnectionPool(
+    DB_URL,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    max_idle=DB_POOL_MAX_IDLE,
+    kwargs={"row_factory": dict_row},
+    open=False,
+)
+
+async def open_pool() -> None:
+    await pool.open(wait=True)
+
+async def close_pool() -> None:
+    await pool.close()
+
+def pool_stats() -> dict:
+    """Pool counters for sizing ``max_size`` per uvicorn worker."""
+    return {"pid": os.getpid(), **pool.get_stats()}
 
 def get_cursor():
+    # Synchronous connection for the grading worker and scripts, which
+    # run outside the event loop.
     try:
-        conn = psycopg.connect(DB_URL)
+        conn = psycopg.connect(DB_URL, row_factory=dict_row)
         cursor = conn.cursor()
         return conn, cursor
     except Exception as e:
-        print("Database connection failed:", e)
+        logger.error("db_connect_failed", extra={"data": {"error": str(e)}})
         return None, None
     
 def initialise_database() -> None:
@@ -54,6 +92,10 @@ def initialise_database() -> None:
             )
         """)
 
+        cursor.execute("""
+            ALTER TABLE answer_sheets ADD COLUMN IF NOT EXISTS sha256 TEXT
+        """)
+
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS answers (
                 id SERIAL PRIMARY KEY,
@@ -66,9 +108,53 @@ def initialise_database() -> None:
             )
         """)
 
-       
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS grading_jobs (
+                id SERIAL PRIMARY KEY,
+                answer_sheet_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+                locked_by TEXT,
+                locked_until TIMESTAMPTZ,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                finished_at TIMESTAMPTZ,
+                FOREIGN KEY(answer_sheet_id) REFERENCES answer_sheets(id) ON DELETE CASCADE
+            )
+        """)
+
+        # Workers only ever scan jobs that are waiting or leased.
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS grading_jobs_pending_idx
+            ON grading_jobs (run_after, id)
+            WHERE status IN ('queued', 'running')
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS grading_jobs_sheet_idx
+            ON grading_jobs (answer_sheet_id)
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS score_cache (
+                cache_key TEXT PRIMARY KEY,
+                rubric_hash TEXT NOT NULL,
+                model_id TEXT NOT NULL,
+                score REAL NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS score_cache_rubric_idx
+            ON score_cache (rubric_hash)
+        """)
+
         conn.commit()
+        applied = apply_migrations(conn)
+        if applied:
+            logger.info("schema_migrated", extra={"data": {"versions": applied}})
         conn.close()
     except Exception as e:
-        print("initialise_database Failed")
+        logger.error("db_initialise_failed", extra={"data": {"error": str(e)}})
         
\ No newline at end of file
@@ -1,20 +1,95 @@
-from transformers import AutoProcessor , AutoModelForCausalLM
-from PIL import Image 
-import requests , copy 
-import torch
-
 import os
+import threading
+from functools import lru_cache
 os.environ["PYTORCH_USE_SDPA"] = "0"
 
+from configuration.main_config import (
+    FLORENCE_CPU_PRECISION,
+    FLORENCE_CPU_COMPILE,
+    FLORENCE_CPU_THREADS,
+    FLORENCE_CPU_INTEROP_THREADS,
+)
+
 
 model_id = "microsoft/Florence-2-large"
-#model = AutoModelForCausalLM.from_pretrained(model_id, trust_remote_code=True).eval().cuda()
-model = AutoModelForCausalLM.from_pretrained(
-    model_id,
-    trust_remote_code=True,
-    attn_implementation="eager" ,
-    torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
-    device_map="auto" if torch.cuda.is_available() else None,
-).eval()
-
-processor = AutoProcessor.from_pretrained(model_id, trust_remote_code=True)
\ No newline at end of file
+CPU_PRECISIONS = ("float32", "int8")
+
+
+@lru_cache(maxsize=None)
+def cache_model_id(precision: str = FLORENCE_CPU_PRECISION) -> str:
+    """Model id the OCR cache is keyed on.
+
+    int8 weights give (slightly) different text, so their OCR results are
+    cached apart from the float32 ones; CUDA ignores ``precision``, so
+    GPU nodes share the plain model id.
+    """
+    if precision == "float32":
+        return model_id
+    import torch
+
+    return model_id if torch.cuda.is_available() else f"{model_id}:{precision}"
+
+# The model is loaded on first use, not at import: the web tier imports
+# this package but never runs OCR, and should not pay for (or hold) a
+# copy of Florence-2.
+_model = None
+_processor = None
+_lock = threading.Lock()
+
+
+def set_cpu_threads(threads: int = FLORENCE_CPU_THREADS, interop_threads: int = FLORENCE_CPU_INTEROP_THREADS) -> None:
+    """Pin torch's intra-op / inter-op thread pools; 0 keeps torch's default.
+
+    The inter-op pool can only be sized before torch runs any parallel
+    work, so call this before the model is loaded.
+    """
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            pass  # already started; keep the running pool
+
+
+def build_florence(precision: str = FLORENCE_CPU_PRECISION, compile: bool = FLORENCE_CPU_COMPILE):
+    """Load a fresh ``(processor, model)``; ``precision``/``compile`` apply on CPU only."""
+    import torch
+    from transformers import AutoProcessor , AutoModelForCausalLM
+
+    if precision not in CPU_PRECISIONS:
+        raise ValueError(f"Unknown florence.cpu.precision '{precision}'")
+    cuda = torch.cuda.is_available()
+    #model = AutoModelForCausalLM.from_pretrained(model_id, trust_remote_code=True).eval().cuda()
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        trust_remote_code=True,
+        attn_implementation="eager" ,
+        torch_dtype=torch.bfloat16 if cuda else torch.float32,
+        device_map="auto" if cuda else None,
+    ).eval()
+    if not cuda:
+        if precision == "int8":
+            # Weights of every nn.Linear become int8; activations are
+            # quantized on the fly, so no calibration set is needed.
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if compile:
+            # Only the vision encoder: every page is resized to 768x768,
+            # while the decoder's shapes change every step.  The batch
+            # dimension still varies, so compile it as dynamic instead of
+            # recompiling for each batch size.
+            model.vision_tower = torch.compile(model.vision_tower, dynamic=True)
+    processor = AutoProcessor.from_pretrained(model_id, trust_remote_code=True)
+    return processor, model
+
+
+def load_florence(threads: int = FLORENCE_CPU_THREADS, interop_threads: int = FLORENCE_CPU_INTEROP_THREADS):
+    """Return ``(processor, model)``, loading them once per process."""
+    global _model, _processor
+    with _lock:
+        if _model is None:
+            set_cpu_threads(threads, interop_threads)
+            _processor, _model = build_florence()
+    return _processor, _model
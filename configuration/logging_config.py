@@ -1,11 +1,42 @@
 import logging
 from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-from .main_config import LOG_DIRECTORY , LOG_NAME
+from .main_config import LOG_DIRECTORY , LOG_NAME , LOG_FORMAT
+import json
 import os
 
 
 LOG_PATH = os.path.join(LOG_DIRECTORY, LOG_NAME)
 
+
+class EventFormatter(logging.Formatter):
+    """Formats structured events: ``logger.info("event_name", extra={"data": {...}})``.
+
+    ``log.format: text`` appends the fields as ``key=value`` pairs;
+    ``log.format: json`` writes one JSON object per line.
+    """
+
+    def __init__(self, fmt: str, as_json: bool = False):
+        super().__init__(fmt)
+        self.as_json = as_json
+
+    def format(self, record):
+        data = getattr(record, "data", None) or {}
+        if self.as_json:
+            event = {
+                "ts": self.formatTime(record),
+                "level": record.levelname,
+                "logger": record.name,
+                "event": record.getMessage(),
+                **data,
+            }
+            if record.exc_info:
+                event["exc_info"] = self.formatException(record.exc_info)
+            return json.dumps(event, default=str)
+        line = super().format(record)
+        if data:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in data.items())
+        return line
+
 def setup_logging():
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)
@@ -13,8 +44,9 @@ def setup_logging():
     if logger.hasHandlers():
         logger.handlers.clear()
 
-    formatter = logging.Formatter(
-        '%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d - %(funcName)s] - %(message)s'
+    formatter = EventFormatter(
+        '%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d - %(funcName)s] - %(message)s',
+        as_json=LOG_FORMAT == "json",
     )
 
     # Console Handler
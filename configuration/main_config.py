@@ -34,8 +34,65 @@ DB_USER = CONFIG['db']['user']
 DB_PASSWORD = CONFIG['db']['password']
 DB_PORT = CONFIG['db']['port'] 
 DB_HOST = CONFIG['db']['host']
+DB_POOL_MIN_SIZE = CONFIG['db']['pool']['min_size']
+DB_POOL_MAX_SIZE = CONFIG['db']['pool']['max_size']
+DB_POOL_TIMEOUT = CONFIG['db']['pool']['timeout']
+DB_POOL_MAX_IDLE = CONFIG['db']['pool']['max_idle']
 LOG_DIRECTORY = CONFIG['log']['directory']
 LOG_NAME = CONFIG['log']['name']
 LOG_SIZE = CONFIG['log']['size']
+LOG_FORMAT = CONFIG['log']['format']
+METRICS_WORKER_PORT = CONFIG['metrics']['worker_port']
+METRICS_INFERENCE_PORT = CONFIG['metrics']['inference_port']
+UPLOAD_MAX_BYTES = CONFIG['uploads']['max_bytes']
+UPLOAD_CHUNK_SIZE = CONFIG['uploads']['chunk_size']
+JOB_MAX_ATTEMPTS = CONFIG['jobs']['max_attempts']
+JOB_VISIBILITY_TIMEOUT = CONFIG['jobs']['visibility_timeout']
+JOB_HEARTBEAT_INTERVAL = CONFIG['jobs']['heartbeat_interval']
+JOB_BACKOFF_BASE = CONFIG['jobs']['backoff_base']
+JOB_BACKOFF_MAX = CONFIG['jobs']['backoff_max']
+JOB_POLL_INTERVAL = CONFIG['jobs']['poll_interval']
+JOB_CONCURRENCY = CONFIG['jobs']['concurrency']
+FLORENCE_BATCH_SIZE = CONFIG['florence']['batch_size']
+FLORENCE_MAX_WAIT_MS = CONFIG['florence']['max_wait_ms']
+FLORENCE_PROFILE = CONFIG['florence']['profile']
+FLORENCE_PROFILES = CONFIG['florence']['profiles']
+FLORENCE_DEBUG_SPILL_PAGES = CONFIG['florence']['debug_spill_pages']
+FLORENCE_MODE = CONFIG['florence']['mode']
+FLORENCE_SOCKET_PATH = CONFIG['florence']['socket_path']
+FLORENCE_SOCKET_TIMEOUT = CONFIG['florence']['socket_timeout']
+FLORENCE_CACHE_ENABLED = CONFIG['florence']['cache_enabled']
+FLORENCE_CACHE_MAX_ENTRIES = CONFIG['florence']['cache_max_entries']
+FLORENCE_CACHE_EVICT_INTERVAL = CONFIG['florence']['cache_evict_interval']
+FLORENCE_CPU_PRECISION = CONFIG['florence']['cpu']['precision']
+FLORENCE_CPU_COMPILE = CONFIG['florence']['cpu']['compile']
+FLORENCE_CPU_THREADS = CONFIG['florence']['cpu']['threads']
+FLORENCE_CPU_INTEROP_THREADS = CONFIG['florence']['cpu']['interop_threads']
+FLORENCE_POOL_PROCESSES = CONFIG['florence']['pool']['processes']
+FLORENCE_POOL_THREADS = CONFIG['florence']['pool']['threads_per_process']
+FLORENCE_POOL_BATCH_SIZE = CONFIG['florence']['pool']['batch_size']
+SCORING_BACKEND = CONFIG['scoring']['backend']
+SCORING_MODEL = CONFIG['scoring']['model']
+SCORING_CONCURRENCY = CONFIG['scoring']['concurrency']
+SCORING_RATE_PER_SECOND = CONFIG['scoring']['rate_per_second']
+SCORING_BURST = CONFIG['scoring']['burst']
+SCORING_TIMEOUT = CONFIG['scoring']['timeout']
+SCORING_MAX_RETRIES = CONFIG['scoring']['max_retries']
+SCORING_RETRY_BASE = CONFIG['scoring']['retry_base']
+SCORING_STUB_LATENCY_MS = CONFIG['scoring']['stub_latency_ms']
+SCORING_CACHE_ENABLED = CONFIG['scoring']['cache_enabled']
+SCORING_CACHE_SIZE = CONFIG['scoring']['cache_size']
+SCORING_MODE = CONFIG['scoring']['mode']
+SCORING_SHEET_TOKEN_BUDGET = CONFIG['scoring']['sheet_token_budget']
+SCORING_TIERED = CONFIG['scoring']['tiered']
+SCORING_TIER_HIGH = CONFIG['scoring']['tier_high']
+SCORING_TIER_LOW = CONFIG['scoring']['tier_low']
+PAGE_CACHE_ENABLED = CONFIG['page_cache']['enabled']
+PAGE_CACHE_MAX_ENTRIES = CONFIG['page_cache']['max_entries']
+PAGE_CACHE_SHARED = CONFIG['page_cache']['shared']
+PAGE_CACHE_SHARED_MAX_ENTRIES = CONFIG['page_cache']['shared_max_entries']
+PAGE_CACHE_EVICT_INTERVAL = CONFIG['page_cache']['evict_interval']
+PAGE_SIZE = CONFIG['pagination']['page_size']
+MAX_PAGE_SIZE = CONFIG['pagination']['max_page_size']
 
 DB_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""
+Versioned schema migrations
+===========================
+
+``initialise_database`` creates the base tables; every later schema
+change is appended to ``MIGRATIONS`` as ``(version, description,
+statements)`` and applied once, in order, by ``apply_migrations``.
+Applied versions are recorded in ``schema_migrations``.  An advisory
+lock serialises concurrent web and worker processes starting up
+together.
+"""
+
+MIGRATIONS_LOCK_ID = 72_201_901
+
+MIGRATIONS = [
+    (1, "foreign-key indexes", [
+        "CREATE INDEX IF NOT EXISTS questions_exam_id_idx ON questions (exam_id)",
+        "CREATE INDEX IF NOT EXISTS students_exam_id_idx ON students (exam_id)",
+        "CREATE INDEX IF NOT EXISTS answer_sheets_student_id_idx ON answer_sheets (student_id)",
+        "CREATE INDEX IF NOT EXISTS answers_answer_sheet_id_idx ON answers (answer_sheet_id)",
+        "CREATE INDEX IF NOT EXISTS answers_question_id_idx ON answers (question_id)",
+    ]),
+    (2, "exam analytics cache", [
+        """
+        CREATE TABLE IF NOT EXISTS exam_analytics (
+            exam_id INTEGER PRIMARY KEY REFERENCES exams(id) ON DELETE CASCADE,
+            question_ids JSONB NOT NULL,
+            point_values JSONB NOT NULL,
+            sheet_scores JSONB NOT NULL,
+            stats JSONB NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+    ]),
+    (3, "OCR page cache", [
+        """
+        CREATE TABLE IF NOT EXISTS ocr_cache (
+            page_key TEXT PRIMARY KEY,
+            model_id TEXT NOT NULL,
+            task_prompt TEXT NOT NULL,
+            result JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            last_used_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ocr_cache_last_used_idx ON ocr_cache (last_used_at)",
+    ]),
+    (4, "question rescore jobs", [
+        "ALTER TABLE grading_jobs ALTER COLUMN answer_sheet_id DROP NOT NULL",
+        """
+        ALTER TABLE grading_jobs ADD COLUMN IF NOT EXISTS question_id INTEGER
+            REFERENCES questions(id) ON DELETE CASCADE
+        """,
+        "CREATE INDEX IF NOT EXISTS grading_jobs_question_idx ON grading_jobs (question_id)",
+    ]),
+    (5, "per-exam scoring mode", [
+        """
+        ALTER TABLE exams ADD COLUMN IF NOT EXISTS scoring_mode TEXT
+            CHECK (scoring_mode IN ('question', 'sheet'))
+        """,
+    ]),
+    (6, "tiered grading thresholds", [
+        "ALTER TABLE exams ADD COLUMN IF NOT EXISTS tier_high REAL",
+        "ALTER TABLE exams ADD COLUMN IF NOT EXISTS tier_low REAL",
+        "ALTER TABLE answers ADD COLUMN IF NOT EXISTS graded_by TEXT",
+    ]),
+    (7, "answer regions", [
+        # answer_box is [x0, y0, x1, y1] as fractions of the page size.
+        "ALTER TABLE questions ADD COLUMN IF NOT EXISTS answer_page INTEGER",
+        "ALTER TABLE questions ADD COLUMN IF NOT EXISTS answer_box JSONB",
+    ]),
+    (8, "page cache versions", [
+        # Bumped by every write that changes what an exam's pages show.
+        "ALTER TABLE exams ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1",
+        # Shared tier of utility/page_cache.py: one row per page, latest version only.
+        """
+        CREATE UNLOGGED TABLE IF NOT EXISTS page_cache (
+            page TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            body BYTEA NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+    ]),
+    (9, "keyset pagination", [
+        # Best total over a student's sheets, kept by the grading worker so
+        # results can be sorted by score from an index.
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS best_score REAL",
+        """
+        UPDATE students SET best_score = best.score
+        FROM (SELECT student_id, MAX(total_score) AS score FROM answer_sheets GROUP BY student_id) AS best
+        WHERE students.id = best.student_id
+        """,
+        "CREATE INDEX IF NOT EXISTS students_exam_id_id_idx ON students (exam_id, id)",
+        "CREATE INDEX IF NOT EXISTS students_exam_name_idx ON students (exam_id, name, id)",
+        """
+        CREATE INDEX IF NOT EXISTS students_exam_best_score_idx
+            ON students (exam_id, (COALESCE(best_score, '-infinity'::real)), id)
+        """,
+    ]),
+    (10, "one pending job per sheet or question", [
+        # Concurrent NOT EXISTS checks could both insert; keep the oldest job.
+        """
+        DELETE FROM grading_jobs AS duplicate USING grading_jobs AS kept
+        WHERE duplicate.answer_sheet_id = kept.answer_sheet_id AND kept.id < duplicate.id
+          AND duplicate.status IN ('queued', 'running') AND kept.status IN ('queued', 'running')
+        """,
+        """
+        DELETE FROM grading_jobs AS duplicate USING grading_jobs AS kept
+        WHERE duplicate.question_id = kept.question_id AND kept.id < duplicate.id
+          AND duplicate.status = 'queued' AND kept.status = 'queued'
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS grading_jobs_sheet_pending_idx
+            ON grading_jobs (answer_sheet_id) WHERE status IN ('queued', 'running')
+        """,
+        # Question jobs only dedupe while queued: a running re-score read the old rubric.
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS grading_jobs_question_queued_idx
+            ON grading_jobs (question_id) WHERE status = 'queued'
+        """,
+    ]),
+    (11, "analytics rebuilt lazily by exam version", [
+        # Workers no longer fold sheets into the cache; a stamp behind exams.version is stale.
+        "ALTER TABLE exam_analytics ADD COLUMN IF NOT EXISTS exam_version BIGINT",
+        "ALTER TABLE exam_analytics DROP COLUMN IF EXISTS sheet_scores",
+    ]),
+    (12, "regrades reuse extracted answers", [
+        # Regrade jobs re-score the answers stored for the sheet instead of running OCR.
+        "ALTER TABLE grading_jobs ADD COLUMN IF NOT EXISTS rescore_only BOOLEAN NOT NULL DEFAULT false",
+    ]),
+]
+
+
+def apply_migrations(conn) -> list:
+    """Apply pending migrations on a psycopg connection; return the versions applied."""
+    applied_now = []
+    with conn.transaction():
+        conn.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+        applied = {row["version"] for row in conn.execute("SELECT version FROM schema_migrations")}
+        for version, description, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description),
+            )
+            applied_now.append(version)
+    return applied_now
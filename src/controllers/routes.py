@@ -1,12 +1,14 @@
-import os
-import uuid
+import asyncio
 from pathlib import Path
 from fastapi import APIRouter , HTTPException , Request
-from configuration.database_config import get_cursor
+from configuration.database_config import pool_stats
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import RedirectResponse, FileResponse , HTMLResponse
-from ..utility import utilities
-from services import service
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import RedirectResponse, FileResponse , HTMLResponse , JSONResponse , StreamingResponse
+from services import service , analytics
+from utility.uploads import receive_upload
+from utility.score_cache import score_cache
+from utility import progress
 from repository import repository
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -25,21 +27,33 @@ router = APIRouter(
 
 @router.get("/")
 async def index(request: Request):
-    conn , cursor = get_cursor()
-    cursor.execute("SELECT id, title, subject FROM exams ORDER BY id DESC")
-    exams = cursor.fetchall()
-    conn.close()
-    logger.info(f"Checked")
-    return templates.TemplateResponse(
-        "index.html",
-        {"request": request, "exams": exams},
+    page = service.parse_page(request, "id", "desc")
+
+    async def render():
+        exams, next_cursor = await service.exams_page(page)
+        logger.info(f"Checked")
+        return templates.TemplateResponse(
+            request,
+            "index.html",
+            {"request": request, "exams": exams, "page": page, "next_cursor": next_cursor},
+        )
+    return await service.cached_page(
+        request, service.page_cache_key("index", page), await repository.get_exams_list_version(), render,
+        share=service.shareable(page),
     )
 
+@router.get("/exams")
+async def list_exams(request: Request):
+    """JSON: exams, newest first, a page at a time (``limit``, ``after``)."""
+    page = service.parse_page(request, "id", "desc")
+    exams, next_cursor = await service.exams_page(page)
+    return JSONResponse(jsonable_encoder({"exams": exams, "next_cursor": next_cursor}))
+
 @router.get("/exams/new")
 async def new_exam_form(request: Request):
     try:
         logger.info(f"get exam list")
-        return templates.TemplateResponse("create_exam.html", {"request": request})
+        return templates.TemplateResponse(request, "create_exam.html", {"request": request})
     except Exception as e:
         logger.error(f"Error is {e}")
 
@@ -55,17 +69,17 @@ async def create_exam(request: Request):
 
 @router.get("/exams/{exam_id}")
 async def exam_detail(request: Request, exam_id: int):
-    try:
+    page = service.parse_page(request)
+
+    async def render():
         exam = await repository.get_exams(exam_id)
         if exam is None:
             raise HTTPException(status_code=404, detail="Exam not found")
         questions = await repository.get_questons(exam_id)
-        students = await repository.get_students(exam_id)
-        sheet_counts = {}
-        for student in students:
-            sheet_data = await repository.get_data(student)
-            sheet_counts[student["id"]] = sheet_data
+        students, next_cursor = await service.students_page(exam_id, page)
+        sheet_counts = {student["id"]: student["sheet_count"] for student in students}
         return templates.TemplateResponse(
+            request,
             "exam_detail.html",
             {
                 "request": request,
@@ -73,8 +87,15 @@ async def exam_detail(request: Request, exam_id: int):
                 "questions": questions,
                 "students": students,
                 "sheet_counts": sheet_counts,
+                "page": page,
+                "next_cursor": next_cursor,
             },
         )
+    try:
+        return await service.cached_page(
+            request, service.page_cache_key(f"exam_detail:{exam_id}", page),
+            await repository.get_exam_version(exam_id), render, share=service.shareable(page),
+        )
     except Exception as e:
         logger.error(f"Error is {e}")
 
@@ -86,24 +107,36 @@ async def add_question(request: Request, exam_id: int):
         form = await request.form()
         text = form.get("text", "").strip()
         ideal_answer = form.get("ideal_answer", "").strip()
-        point_value = form.get("point_value", "1").strip()
-        try:
-            point_value_float = float(point_value)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Point value must be a number")
+        point_value = service.form_point_value(form)
         if not text or not ideal_answer:
             raise HTTPException(status_code=400, detail="Question text and ideal answer are required")
-        conn , cursor = get_cursor()
-        cursor.execute(
-            "INSERT INTO questions (exam_id, text, ideal_answer, point_value) VALUES (%s, %s, %s, %s)",
-            (exam_id, text, ideal_answer, point_value_float),
-        )
-        conn.commit()
-        conn.close()
+        await repository.add_question(exam_id, text, ideal_answer, point_value)
+        await warn_if_layout_incomplete(exam_id)
         return RedirectResponse(url=f"/exams/{exam_id}", status_code=303)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error is {e}")
 
+@router.post("/exams/{exam_id}/scoring")
+async def set_scoring(request: Request, exam_id: int):
+    """Per-exam scoring: per-question or whole-sheet calls, and the RapidFuzz tier thresholds."""
+    form = await request.form()
+    scoring_mode = service.parse_scoring_mode(form.get("scoring_mode"))
+    tier_high, tier_low = service.parse_tier_thresholds(form)
+    if not await repository.set_scoring(exam_id, scoring_mode, tier_high, tier_low):
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return RedirectResponse(url=f"/exams/{exam_id}", status_code=303)
+
+@router.get("/exams/{exam_id}/students")
+async def list_students(request: Request, exam_id: int):
+    """JSON: the exam's students by id with their upload counts, a page at a time."""
+    page = service.parse_page(request)
+    if await repository.get_exams(exam_id) is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    students, next_cursor = await service.students_page(exam_id, page)
+    return JSONResponse(jsonable_encoder({"students": students, "next_cursor": next_cursor}))
+
 @router.post("/exams/{exam_id}/students")
 async def add_student(request: Request, exam_id: int):
     try:
@@ -111,28 +144,121 @@ async def add_student(request: Request, exam_id: int):
         name = form.get("name", "").strip()
         if not name:
             raise HTTPException(status_code=400, detail="Student name is required")
-        conn , cursor = get_cursor()
-        cursor.execute(
-            "INSERT INTO students (exam_id, name) VALUES (%s, %s)",
-            (exam_id, name),
-        )
-        conn.commit()
-        conn.close()
+        await repository.add_student(exam_id, name)
         return RedirectResponse(url=f"/exams/{exam_id}", status_code=303)
     except Exception as e:
         logger.error(f"Error is {e}")
 
+@router.post("/exams/{exam_id}/students/import")
+async def import_students(request: Request, exam_id: int):
+    """Bulk-load a roster from CSV (``name`` column) or JSON."""
+    return await service.import_rows(
+        request, exam_id, service.parse_student_rows, repository.bulk_insert_students
+    )
+
+@router.post("/exams/{exam_id}/questions/import")
+async def import_questions(request: Request, exam_id: int):
+    """Bulk-load questions from CSV or JSON (``text``, ``ideal_answer``, ``point_value``)."""
+    response = await service.import_rows(
+        request, exam_id, service.parse_question_rows, repository.bulk_insert_questions
+    )
+    if response.status_code == 200:
+        await warn_if_layout_incomplete(exam_id)
+    return response
+
+@router.post("/exams/{exam_id}/questions/{question_id}")
+async def edit_question(request: Request, exam_id: int, question_id: int):
+    """Edit a question; a changed ideal answer or point value re-scores only that question."""
+    form = await request.form()
+    text = form.get("text", "").strip()
+    ideal_answer = form.get("ideal_answer", "").strip()
+    point_value = service.form_point_value(form)
+    if not text or not ideal_answer:
+        raise HTTPException(status_code=400, detail="Question text and ideal answer are required")
+    old = await repository.update_question(exam_id, question_id, text, ideal_answer, point_value)
+    if old is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    if old["rubric_changed"]:
+        # Scores memoized against the old rubric can never be hit again.
+        await asyncio.to_thread(score_cache.invalidate, old["ideal_answer"], old["point_value"])
+        if old["rescore_queued"]:
+            logger.info(f"Queued re-score of question {question_id}")
+        else:
+            logger.info(f"Re-score of question {question_id} is already queued")
+    return RedirectResponse(url=f"/exams/{exam_id}", status_code=303)
+
+async def warn_if_layout_incomplete(exam_id: int) -> None:
+    # New questions have no answer box, and a partial layout is not used.
+    layout = service.layout_status(await repository.get_answer_regions(exam_id))
+    if layout["missing_question_ids"]:
+        logger.warning(
+            f"Exam {exam_id} layout has no answer region for questions {layout['missing_question_ids']}; "
+            f"sheets are OCRed whole-page until they get one"
+        )
+
+@router.get("/exams/{exam_id}/layout")
+async def get_layout(exam_id: int):
+    """The exam's answer-region template: page and box per question (null when unset).
+
+    ``complete`` says whether grading uses it; ``missing_question_ids``
+    lists the questions that still need a box.
+    """
+    if await repository.get_exams(exam_id) is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    regions = await repository.get_answer_regions(exam_id)
+    return {"regions": regions, **service.layout_status(regions)}
+
+@router.post("/exams/{exam_id}/layout")
+async def set_layout(request: Request, exam_id: int):
+    """Set the answer-region template; OCR then reads only these boxes.
+
+    Every question of the exam needs a region for the template to be used.
+    An empty list clears the template.
+    """
+    if await repository.get_exams(exam_id) is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Layout must be JSON")
+    rows, errors = service.parse_layout_regions(payload)
+    if errors:
+        return JSONResponse({"updated": 0, "errors": errors[:service.MAX_IMPORT_ERRORS]}, status_code=422)
+    if not rows:
+        await repository.clear_answer_regions(exam_id)
+        return JSONResponse({"updated": 0, "errors": []})
+    if not await repository.set_answer_regions(exam_id, rows):
+        raise HTTPException(status_code=422, detail="Every question_id must belong to this exam")
+    return JSONResponse({"updated": len(rows), "errors": []})
+
+@router.get("/exams/{exam_id}/events")
+async def exam_events(request: Request, exam_id: int):
+    """Server-Sent Events stream of grading progress for the exam's sheets."""
+    if await repository.get_exams(exam_id) is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    async def stream():
+        async with progress.hub.subscribe(exam_id) as events:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=progress.KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield progress.format_sse(event)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.get("/answer_sheets/{sheet_id}/download")
 async def download_answer_sheet(sheet_id: int):
     try:
         """Allow the user to download the original uploaded PDF file."""
-        conn , cursor = get_cursor()
-        cursor.execute("SELECT filename FROM answer_sheets WHERE id = %s", (sheet_id,))
-        row = cursor.fetchone()
-        conn.close()
-        if row is None:
+        filename = await repository.get_sheet_filename(sheet_id)
+        if filename is None:
             raise HTTPException(status_code=404, detail="File not found")
-        file_path = uploads / row["filename"]
+        file_path = uploads / filename
         return FileResponse(path=file_path, filename=file_path.name, media_type="routerlication/pdf")
     except Exception as e:
         logger.error(f"Error is {e}")
@@ -140,125 +266,129 @@ async def download_answer_sheet(sheet_id: int):
 @router.post("/exams/{exam_id}/upload")
 async def upload_answer_sheet(request: Request, exam_id: int):
     try:
-        body = await request.body()
-        content_type = request.headers.get("content-type", "")
-        boundary_marker = "boundary="
-        if boundary_marker not in content_type:
-            raise HTTPException(status_code=400, detail="Invalid multipart request")
-        boundary = content_type.split(boundary_marker)[1]
-        if boundary.startswith("\"") and boundary.endswith("\""):
-            boundary = boundary[1:-1]
-        delimiter = ("--" + boundary).encode()
-        parts = body.split(delimiter)
-        fields: dict[str, bytes] = {}
-        for part in parts:
-            if not part or part == b"--\r\n" or part == b"--":
-                continue
-            part = part.strip(b"\r\n")
-            # Split headers and content
-            header_end = part.find(b"\r\n\r\n")
-            if header_end == -1:
-                continue
-            header_blob = part[:header_end].decode(errors="ignore")
-            content = part[header_end + 4:]
-            # Parse headers
-            headers = {}
-            for line in header_blob.split("\r\n"):
-                if ":" in line:
-                    k, v = line.split(":", 1)
-                    headers[k.strip().lower()] = v.strip()
-            disposition = headers.get("content-disposition", "")
-            # content-disposition: form-data; name="student_id"
-            # or: content-disposition: form-data; name="file"; filename="..."
-            if "form-data" in disposition:
-                # Extract name and filename if present
-                attrs = {}
-                for item in disposition.split(";"):
-                    if "=" in item:
-                        key, value = item.strip().split("=", 1)
-                        attrs[key.strip()] = value.strip().strip('"')
-                name = attrs.get("name")
-                filename = attrs.get("filename")
-                if filename:
-                    # It's the uploaded file
-                    fields[name] = {"filename": filename, "content": content}
-                else:
-                    fields[name] = content
-        # Validate student_id
-        if "student_id" not in fields:
-            raise HTTPException(status_code=400, detail="Missing student_id field")
-        student_id_bytes = fields["student_id"]
-        try:
-            student_id = int(student_id_bytes.decode().strip())
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid student_id")
-        file_field = fields.get("file")
-        if not isinstance(file_field, dict) or "filename" not in file_field:
-            raise HTTPException(status_code=400, detail="Missing file field")
-        filename = file_field["filename"]
-        content_bytes: bytes = file_field["content"]
-        if not filename.lower().endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Only PDF files are supported")
-        unique_name = f"{uuid.uuid4().hex}_{os.path.basename(filename)}"
-        dest_path = uploads / unique_name
-        with open(dest_path, "wb") as f:
-            f.write(content_bytes)
-        conn , cursor = get_cursor()
-        cursor.execute(
-            "INSERT INTO answer_sheets (student_id, filename) VALUES (%s, %s)",
-            (student_id, unique_name),
-        )
-        sheet_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        # ======================================= Evaluate the sheet =============================================
+        # Stream the body to disk; the PDF is never held in memory.
+        fields, files = await receive_upload(request, uploads)
+        file_field = files.get("file")
         try:
-            utilities.evaluate_answer_sheet(dest_path , sheet_id)
-        except Exception as e:
-            print(f"Error evaluating sheet {sheet_id}: {e}")
+            if "student_id" not in fields:
+                raise HTTPException(status_code=400, detail="Missing student_id field")
+            try:
+                student_id = int(fields["student_id"].strip())
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid student_id")
+            if file_field is None:
+                raise HTTPException(status_code=400, detail="Missing file field")
+        except HTTPException:
+            for stored in files.values():
+                stored.path.unlink(missing_ok=True)
+            raise
+        unique_name = file_field.path.name
+        logger.info(f"Received {file_field.filename} ({file_field.size} bytes, sha256 {file_field.sha256})")
+        # Grading runs in the worker processes (src/worker.py); we only queue it here.
+        sheet_id = await repository.create_answer_sheet(student_id, unique_name, file_field.sha256)
+        logger.info(f"Queued grading job for sheet {sheet_id}")
         return RedirectResponse(url=f"/exams/{exam_id}", status_code=303)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error is {e}")
 
+@router.get("/answer_sheets/{sheet_id}/status")
+async def answer_sheet_status(sheet_id: int):
+    """Report the grading job state for an answer sheet."""
+    status = await repository.get_job_status(sheet_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No grading job for this answer sheet")
+    return JSONResponse(jsonable_encoder({"sheet_id": sheet_id, **status}))
+
+@router.post("/answer_sheets/{sheet_id}/regrade")
+async def regrade_answer_sheet(sheet_id: int):
+    """Re-score a sheet from its stored answers; OCR (through the page cache) only if it has none."""
+    if await repository.get_sheet(sheet_id) is None:
+        raise HTTPException(status_code=404, detail="Answer sheet not found")
+    queued = await repository.queue_regrade(sheet_id=sheet_id)
+    return JSONResponse(
+        {"sheet_id": sheet_id, "queued": bool(queued), "status_url": f"{router.prefix}/answer_sheets/{sheet_id}/status"},
+        status_code=202,
+    )
+
+@router.post("/exams/{exam_id}/regrade")
+async def regrade_exam(exam_id: int):
+    """Re-score every answer sheet of an exam, e.g. after a rubric change."""
+    if await repository.get_exams(exam_id) is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    queued = await repository.queue_regrade(exam_id=exam_id)
+    return JSONResponse({"exam_id": exam_id, "queued": len(queued), "sheet_ids": queued}, status_code=202)
+
+@router.post("/exams/{exam_id}/upload/bulk")
+async def upload_answer_sheets_bulk(request: Request, exam_id: int):
+    """Ingest a ZIP of per-student PDFs or one scanned stack split by page ranges."""
+    return await service.ingest_answer_sheets(request, exam_id, uploads)
+
 @router.get("/exams/{exam_id}/results")
 async def exam_results(request: Request, exam_id: int):
-        try:
-            exam = await repository.get_exams(exam_id)
-            if exam is None:
-                raise HTTPException(status_code=404, detail="Exam not found")
-
-            rows = await repository.get_students_results(exam_id)
-            # Build a list grouped by students; each student may have multiple sheets
-            students = {}
-            for row in rows:
-                sid = row["student_id"]
-                if sid not in students:
-                    students[sid] = {"name": row["name"], "sheets": []}
-                if row["sheet_id"] is not None:
-                    students[sid]["sheets"].append({"id": row["sheet_id"], "total_score": row["total_score"]})
-
-            return templates.TemplateResponse(
-                "results.html",
-                {
-                    "request": request,
-                    "exam": exam,
-                    "students": students,
-                },
-            )
-        except Exception as e:
-            logger.error(f"Error is {e}")
+    page = service.parse_result_page(request)
+
+    async def render():
+        exam = await repository.get_exams(exam_id)
+        if exam is None:
+            raise HTTPException(status_code=404, detail="Exam not found")
+
+        # Sorted, paginated and grouped by student in SQL
+        students, next_cursor = await service.results_page(exam_id, page)
+
+        return templates.TemplateResponse(
+            request,
+            "results.html",
+            {
+                "request": request,
+                "exam": exam,
+                "students": students,
+                "page": page,
+                "next_cursor": next_cursor,
+            },
+        )
+    try:
+        return await service.cached_page(
+            request, service.page_cache_key(f"exam_results:{exam_id}", page),
+            await repository.get_exam_version(exam_id), render, share=service.shareable(page),
+        )
+    except Exception as e:
+        logger.error(f"Error is {e}")
+
+@router.get("/exams/{exam_id}/scores")
+async def exam_scores(request: Request, exam_id: int):
+    """JSON: students with their sheets, sorted by ``name`` or best ``score``, a page at a time."""
+    page = service.parse_result_page(request)
+    if await repository.get_exams(exam_id) is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    students, next_cursor = await service.results_page(exam_id, page)
+    return JSONResponse(jsonable_encoder({
+        "students": students, "sort": page["sort"], "order": page["order"], "next_cursor": next_cursor,
+    }))
+
+@router.get("/exams/{exam_id}/analytics")
+async def exam_analytics(exam_id: int):
+    """Score distribution and per-question difficulty/discrimination for an exam."""
+    exam = await repository.get_exams(exam_id)
+    if exam is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    stats = await analytics.get_exam_analytics(exam_id)
+    tiers = analytics.tier_report(await repository.get_grading_tiers(exam_id))
+    return JSONResponse({"exam_id": exam_id, **stats, "grading_tiers": tiers})
 
 @router.get("/answer_sheets/{sheet_id}")
 async def sheet_detail(request: Request, sheet_id: int):
-    try:
-        """Show detailed evaluation for a single answer sheet."""
+    """Show detailed evaluation for a single answer sheet."""
+    async def render():
         sheet = await repository.get_sheet(sheet_id)
         if sheet is None:
             raise HTTPException(status_code=404, detail="Answer sheet not found")
         # Fetch question evaluations
         
-        evaluations = repository.get_evaluations(sheet_id)
+        evaluations = await repository.get_evaluations(sheet_id)
         return templates.TemplateResponse(
+            request,
             "sheet_detail.html",
             {
                 "request": request,
@@ -267,37 +397,28 @@ async def sheet_detail(request: Request, sheet_id: int):
                 "exam_id": sheet["exam_id"],
             },
         )
+    try:
+        return await service.cached_page(
+            request, f"sheet_detail:{sheet_id}", await repository.get_sheet_version(sheet_id), render
+        )
     except Exception as e:
         logger.error(f"Error is {e}")
 
 @router.get("/exams/{exam_id}/export")
 async def export_results(exam_id: int):
-    try:
-        """Export all results for an exam as a CSV file."""
-        import csv
-        from io import StringIO
-        conn , cursor = get_cursor()
-        # Get exam and question count to compute maximum possible score
-        exam = await repository.get_exams(exam_id)
-        if exam is None:
-            raise HTTPException(status_code=404, detail="Exam not found")
-        cursor.execute("SELECT SUM(point_value) FROM questions WHERE exam_id = ?", (exam_id,))
-        total_possible = cursor.fetchone()[0] or 0.0
-        # Retrieve scores
-        rows = await repository.retrieve_scores(exam_id)
-        csv_io = StringIO()
-        writer = csv.writer(csv_io)
-        writer.writerow(["Student", "Score", "Out of"])
-        for row in rows:
-            score = row["total_score"] if row["total_score"] is not None else ""
-            writer.writerow([row["name"], score, total_possible])
-        csv_content = csv_io.getvalue()
-        csv_io.close()
-        filename = f"exam_{exam_id}_results.csv"
-        return FileResponse(
-            path_or_file=bytes(csv_content, "utf-8"),
-            media_type="text/csv",
-            filename=filename,
-        )
-    except Exception as e:
-        logger.error(f"Error is {e}")
+    """Export all results for an exam as a CSV file, streamed row by row."""
+    exam = await repository.get_exams(exam_id)
+    if exam is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    questions = await repository.get_questons(exam_id)
+    filename = f"exam_{exam_id}_results.csv"
+    return StreamingResponse(
+        service.export_results_csv(exam_id, questions),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/health/pool")
+async def database_pool_stats():
+    """Connection pool counters for this worker process."""
+    return JSONResponse(pool_stats())
@@ -0,0 +1,72 @@
+"""
+Florence-2 inference server
+===========================
+
+Owns the single copy of Florence-2 on a machine and serves OCR requests
+from local grading workers over a Unix socket (``florence.socket_path``)::
+
+    python src/inference_server.py
+
+Requests from all connections feed one ``BatchInferenceEngine``, so pages
+from different workers are decoded in shared batches.  The wire format is
+described in ``utility/inference_client.py``.
+"""
+
+import os
+import sys
+import logging
+import socketserver
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+from PIL import Image
+from configuration.logging_config import setup_logging
+from configuration.florenc2_config import load_florence
+from configuration.main_config import FLORENCE_SOCKET_PATH , FLORENCE_POOL_PROCESSES , METRICS_INFERENCE_PORT
+from utility import metrics
+from utility.inference import get_engine
+from utility.inference_client import recv_exact, recv_header, send_header
+
+setup_logging()
+logger = logging.getLogger("inference_server.blog")
+
+
+class OCRRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        header = recv_header(self.request)
+        images = [
+            Image.frombytes("RGB", (width, height), recv_exact(self.request, width * height * 3))
+            for width, height in header["pages"]
+        ]
+        results = get_engine().run(images, header["task_prompt"], return_exceptions=True)
+        send_header(self.request, {"results": [
+            {"error": f"{type(r).__name__}: {r}"} if isinstance(r, Exception) else r
+            for r in results
+        ]})
+
+
+class OCRServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: str = FLORENCE_SOCKET_PATH) -> None:
+    if FLORENCE_POOL_PROCESSES:
+        get_engine()  # the pool's processes load their own copies
+    else:
+        load_florence()
+    metrics.serve(METRICS_INFERENCE_PORT)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with OCRServer(socket_path, OCRRequestHandler) as server:
+        logger.info(f"Florence-2 inference server listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    serve()
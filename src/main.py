@@ -26,13 +26,16 @@ import sqlite3
 import uvicorn
 import logging
 
-from fastapi import FastAPI 
+from fastapi import FastAPI , Response
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 
-from ..configuration.database_config import initialise_database
-from ..configuration.logging_config import setup_logging
+from configuration.database_config import initialise_database , open_pool , close_pool
+from configuration.logging_config import setup_logging
 from .controllers import routes
+from utility import metrics
+from utility.progress import hub as progress_hub
 from fastapi.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 
@@ -49,7 +52,15 @@ logger = logging.getLogger(__name__)
 
 initialise_database()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Each uvicorn worker owns one connection pool for its lifetime.
+    await open_pool()
+    yield
+    await progress_hub.close()
+    await close_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 # Directories for uploads and static files
 BASE_DIR = Path(os.getenv("BASE_DIR", ".")).resolve()
@@ -59,7 +70,14 @@ DATABASE_PATH = BASE_DIR / os.getenv("DATABASE_PATH", "grade_buddy.db")
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 
-app.include_router(routers.router)
+app.include_router(routes.router)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint for the grading pipeline metrics."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+"""
+Grading job queue
+=================
+
+Durable queue of grading jobs stored in the ``grading_jobs`` table.
+Uploads enqueue a job in the same transaction that creates the answer
+sheet; standalone workers (``src/worker.py``) claim jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` so any number of workers on any
+number of machines can drain the queue without handing the same job
+out twice.
+
+A claimed job is leased until ``locked_until``; the worker renews the
+lease with ``extend_lease`` while it works, so a long sheet is not handed
+out twice.  If the worker crashes the lease expires and the job becomes
+claimable again.  Failed jobs are
+retried with exponential backoff until ``max_attempts`` is reached.
+
+A job grades either one answer sheet (``answer_sheet_id``) or, after a
+question's rubric was edited, re-scores that question across every
+graded sheet of the exam (``question_id``).  Regrades of a sheet are
+``rescore_only``: they re-score the answers already extracted from it.  A sheet that was scored
+against a rubric edited meanwhile queues that re-score again when it
+commits, since the first one may already have run without it.
+"""
+
+import random
+import psycopg
+from psycopg.rows import dict_row
+from configuration.main_config import (
+    DB_URL,
+    JOB_MAX_ATTEMPTS,
+    JOB_VISIBILITY_TIMEOUT,
+    JOB_BACKOFF_BASE,
+    JOB_BACKOFF_MAX,
+)
+import logging
+logger = logging.getLogger("jobs.blog")
+
+# Queue a re-score for each question id, unless one is already waiting
+# (the grading_jobs_question_queued_idx unique index, so concurrent edits
+# cannot both insert); returns the ids that were actually queued.  A
+# running re-score has read the old rubric, so it does not count.
+QUEUE_RESCORE = """
+    INSERT INTO grading_jobs (question_id)
+    SELECT unnest(%s::integer[])
+    ON CONFLICT (question_id) WHERE status = 'queued' DO NOTHING
+    RETURNING question_id
+"""
+
+
+def connect():
+    return psycopg.connect(DB_URL, row_factory=dict_row)
+
+
+def claim_job(worker_id: str, visibility_timeout: int = JOB_VISIBILITY_TIMEOUT,
+              max_attempts: int = JOB_MAX_ATTEMPTS):
+    """Lease the next runnable job to ``worker_id``, or return ``None``."""
+    with connect() as conn:
+        # Leases that expired on their last allowed attempt are dead.
+        conn.execute(
+            """
+            UPDATE grading_jobs
+            SET status = 'failed', locked_by = NULL, locked_until = NULL,
+                last_error = COALESCE(last_error, 'visibility timeout expired'),
+                finished_at = now(), updated_at = now()
+            WHERE status = 'running' AND locked_until < now() AND attempts >= %s
+            """,
+            (max_attempts,),
+        )
+        job = conn.execute(
+            """
+            UPDATE grading_jobs
+            SET status = 'running', attempts = attempts + 1, locked_by = %s,
+                locked_until = now() + make_interval(secs => %s), updated_at = now()
+            WHERE id = (
+                SELECT id FROM grading_jobs
+                WHERE (status = 'queued' AND run_after <= now())
+                   OR (status = 'running' AND locked_until < now())
+                ORDER BY run_after, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, answer_sheet_id, question_id, rescore_only, attempts
+            """,
+            (worker_id, visibility_timeout),
+        ).fetchone()
+    return job
+
+
+def extend_lease(job_id: int, worker_id: str, visibility_timeout: int = JOB_VISIBILITY_TIMEOUT) -> bool:
+    """Push ``locked_until`` out again; ``False`` if the lease was already lost."""
+    with connect() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE grading_jobs
+            SET locked_until = now() + make_interval(secs => %s), updated_at = now()
+            WHERE id = %s AND locked_by = %s AND status = 'running'
+            """,
+            (visibility_timeout, job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+
+def complete_job(job_id: int, worker_id: str) -> bool:
+    with connect() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE grading_jobs
+            SET status = 'done', locked_by = NULL, locked_until = NULL, last_error = NULL,
+                finished_at = now(), updated_at = now()
+            WHERE id = %s AND locked_by = %s
+            """,
+            (job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+
+def backoff_seconds(attempts: int, base: float = JOB_BACKOFF_BASE, cap: float = JOB_BACKOFF_MAX) -> float:
+    """Exponential backoff with full jitter for the retry after ``attempts`` tries."""
+    return random.uniform(0, min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def fail_job(job_id: int, worker_id: str, attempts: int, error: str,
+             max_attempts: int = JOB_MAX_ATTEMPTS) -> str:
+    """Record a failed attempt; requeue with backoff or give up.
+
+    Returns the new status, or ``None`` if the lease was lost and the job
+    now belongs to another worker (nothing is changed then).
+    """
+    status = "failed" if attempts >= max_attempts else "queued"
+    delay = 0 if status == "failed" else backoff_seconds(attempts)
+    with connect() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE grading_jobs
+            SET status = %s, last_error = %s, locked_by = NULL, locked_until = NULL,
+                run_after = now() + make_interval(secs => %s), updated_at = now(),
+                finished_at = CASE WHEN %s = 'failed' THEN now() END
+            WHERE id = %s AND locked_by = %s
+            """,
+            (status, error[:2000], delay, status, job_id, worker_id),
+        )
+        if cursor.rowcount != 1:
+            logger.warning(f"Job {job_id} attempt {attempts} failed after its lease was lost: {error}")
+            return None
+    logger.warning(f"Job {job_id} attempt {attempts} failed ({status}): {error}")
+    return status
+
+
+def get_sheet_filename(answer_sheet_id: int):
+    with connect() as conn:
+        row = conn.execute(
+            "SELECT filename FROM answer_sheets WHERE id = %s", (answer_sheet_id,)
+        ).fetchone()
+    return row["filename"] if row else None
@@ -1,98 +1,467 @@
-from configuration.database_config import get_cursor
+from configuration.database_config import pool
+from psycopg import Rollback
+from psycopg.types.json import Jsonb
+from repository.jobs import QUEUE_RESCORE
 from fastapi.responses import RedirectResponse, FileResponse , HTMLResponse
-import logging 
+import logging
 logger = logging.getLogger("repository.blog")
 
-async def create_exams_repo(title , subject , instructions):
+# Every write that changes what an exam's pages show runs one of these in
+# the same transaction, so cached pages (utility/page_cache.py) go stale.
+BUMP_EXAM_VERSION = "UPDATE exams SET version = version + 1 WHERE id = %s"
+BUMP_STUDENT_EXAM_VERSION = (
+    "UPDATE exams SET version = version + 1 WHERE id IN (SELECT exam_id FROM students WHERE id = ANY(%s))"
+)
+
+async def create_exams_repo(title , subject , instructions , scoring_mode=None):
     try:
-        conn , cursor = get_cursor()
-        cursor.execute(
-        "INSERT INTO exams (title, subject, instructions) VALUES (%s, %s, %s)",
-        (title, subject, instructions),
-        )
-        exam_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(
+                "INSERT INTO exams (title, subject, instructions, scoring_mode) VALUES (%s, %s, %s, %s) RETURNING id",
+                (title, subject, instructions, scoring_mode),
+            )
+            exam_id = (await cursor.fetchone())["id"]
         return RedirectResponse(url=f"/exams/{exam_id}", status_code=303)
     except Exception as e:
         logger.error(f"Error is {e}")
         return None
 
+async def list_exams(limit, after_id=None):
+    """Newest exams first, ``limit`` rows below ``after_id`` (the primary key is the index)."""
+    # Separate statements for the first page and the rest: an ``IS NULL OR``
+    # seek cannot use the index once Postgres switches to a generic plan.
+    seek = "WHERE id < %(after)s" if after_id is not None else ""
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            f"""
+            SELECT id, title, subject FROM exams
+            {seek}
+            ORDER BY id DESC LIMIT %(limit)s
+            """,
+            {"after": after_id, "limit": limit},
+        )
+        return await cursor.fetchall()
+
+async def get_exams_list_version():
+    """Version of the exam list: exams are never edited in it, only added."""
+    async with pool.connection() as conn:
+        cursor = await conn.execute("SELECT COUNT(*) AS exams, COALESCE(MAX(id), 0) AS newest FROM exams")
+        row = await cursor.fetchone()
+    return f"{row['exams']}.{row['newest']}"
+
+async def get_exam_version(exam_id):
+    async with pool.connection() as conn:
+        cursor = await conn.execute("SELECT version FROM exams WHERE id = %s", (exam_id,))
+        row = await cursor.fetchone()
+    return row["version"] if row else None
+
+async def get_sheet_version(sheet_id):
+    """The version of the exam a sheet belongs to."""
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            """
+            SELECT exams.version FROM answer_sheets
+            JOIN students ON answer_sheets.student_id = students.id
+            JOIN exams ON students.exam_id = exams.id
+            WHERE answer_sheets.id = %s
+            """,
+            (sheet_id,),
+        )
+        row = await cursor.fetchone()
+    return row["version"] if row else None
+
 async def get_exams(exam_id):
-    conn , cursor = get_cursor()
-    cursor.execute("SELECT * FROM exams WHERE id = %s", (exam_id,))
-    exam = cursor.fetchone()
-    return exam
+    async with pool.connection() as conn:
+        cursor = await conn.execute("SELECT * FROM exams WHERE id = %s", (exam_id,))
+        return await cursor.fetchone()
+
+async def set_scoring(exam_id, scoring_mode, tier_high, tier_low):
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            "UPDATE exams SET scoring_mode = %s, tier_high = %s, tier_low = %s, version = version + 1 WHERE id = %s",
+            (scoring_mode, tier_high, tier_low, exam_id),
+        )
+        return cursor.rowcount == 1
+
+async def get_grading_tiers(exam_id):
+    """How many of the exam's answers each grading tier decided."""
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            """
+            SELECT COALESCE(answers.graded_by, 'llm') AS tier, COUNT(*) AS answers
+            FROM answers
+            JOIN answer_sheets ON answers.answer_sheet_id = answer_sheets.id
+            JOIN students ON answer_sheets.student_id = students.id
+            WHERE students.exam_id = %s
+            GROUP BY 1
+            """,
+            (exam_id,),
+        )
+        return {row["tier"]: row["answers"] for row in await cursor.fetchall()}
 
 async def get_questons(exam_id):
-    conn , cursor = get_cursor()
-    cursor.execute("SELECT * FROM questions WHERE exam_id = %s ORDER BY id", (exam_id,))
-    questions = cursor.fetchall()
-    return questions
+    async with pool.connection() as conn:
+        cursor = await conn.execute("SELECT * FROM questions WHERE exam_id = %s ORDER BY id", (exam_id,))
+        return await cursor.fetchall()
+
+async def add_question(exam_id, text, ideal_answer, point_value):
+    async with pool.connection() as conn:
+        await conn.execute(
+            "INSERT INTO questions (exam_id, text, ideal_answer, point_value) VALUES (%s, %s, %s, %s)",
+            (exam_id, text, ideal_answer, point_value),
+        )
+        await conn.execute(BUMP_EXAM_VERSION, (exam_id,))
+
+async def update_question(exam_id, question_id, text, ideal_answer, point_value):
+    """Edit a question; if its rubric changed, queue a re-score of its answers.
+
+    Returns the question as it was before the edit (with ``rubric_changed``
+    and ``rescore_queued``), or ``None`` if it does not belong to the exam.
+    """
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            # Compare in SQL: point_value is REAL, so a Python float may not round-trip.
+            cursor = await conn.execute(
+                """
+                SELECT *, (ideal_answer IS DISTINCT FROM %s OR point_value IS DISTINCT FROM %s::real)
+                          AS rubric_changed
+                FROM questions WHERE id = %s AND exam_id = %s FOR UPDATE
+                """,
+                (ideal_answer, point_value, question_id, exam_id),
+            )
+            old = await cursor.fetchone()
+            if old is None:
+                return None
+            await conn.execute(
+                "UPDATE questions SET text = %s, ideal_answer = %s, point_value = %s WHERE id = %s",
+                (text, ideal_answer, point_value, question_id),
+            )
+            await conn.execute(BUMP_EXAM_VERSION, (exam_id,))
+            old["rescore_queued"] = False
+            if old["rubric_changed"]:
+                # A job still waiting in the queue will read the new rubric anyway.
+                cursor = await conn.execute(QUEUE_RESCORE, ([question_id],))
+                old["rescore_queued"] = await cursor.fetchone() is not None
+    return old
+
+async def get_answer_regions(exam_id):
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            "SELECT id AS question_id, answer_page AS page, answer_box AS box FROM questions WHERE exam_id = %s ORDER BY id",
+            (exam_id,),
+        )
+        return await cursor.fetchall()
+
+async def set_answer_regions(exam_id, regions):
+    """Store ``(question_id, page, box)`` layout rows, all or nothing.
+
+    Returns ``False`` (and changes nothing) if any question does not
+    belong to the exam.
+    """
+    question_ids, pages, boxes = zip(*regions)
+    async with pool.connection() as conn, conn.transaction():
+        cursor = await conn.execute(
+            """
+            UPDATE questions SET answer_page = layout.page, answer_box = layout.box
+            FROM unnest(%s::int[], %s::int[], %s::jsonb[]) AS layout(question_id, page, box)
+            WHERE questions.id = layout.question_id AND questions.exam_id = %s
+            """,
+            (list(question_ids), list(pages), [Jsonb(box) for box in boxes], exam_id),
+        )
+        if cursor.rowcount != len(regions):
+            raise Rollback()
+        await conn.execute(BUMP_EXAM_VERSION, (exam_id,))
+        return True
+    return False
+
+async def clear_answer_regions(exam_id):
+    async with pool.connection() as conn:
+        await conn.execute(
+            "UPDATE questions SET answer_page = NULL, answer_box = NULL WHERE exam_id = %s", (exam_id,)
+        )
+        await conn.execute(BUMP_EXAM_VERSION, (exam_id,))
 
 async def get_students(exam_id):
-    conn , cursor = get_cursor()
-    cursor.execute("SELECT * FROM students WHERE exam_id = %s ORDER BY id", (exam_id,))
-    students = cursor.fetchall()
-    return students
-
-async def get_data(student):
-    conn , cursor = get_cursor()
-    cursor.execute("SELECT COUNT(*) FROM answer_sheets WHERE student_id = %s", (student["id"],))
-    return cursor.fetchone()[0]
-
-async def get_students_results(exam_id):
-    conn , cursor = get_cursor() 
-    cursor.execute(
-        """
-        SELECT students.id AS student_id, students.name, answer_sheets.id AS sheet_id, answer_sheets.total_score
-        FROM students
-        LEFT JOIN answer_sheets ON students.id = answer_sheets.student_id
-        WHERE students.exam_id = %s
-        ORDER BY students.id
-        """,
-        (exam_id,),
+    async with pool.connection() as conn:
+        cursor = await conn.execute("SELECT * FROM students WHERE exam_id = %s ORDER BY id", (exam_id,))
+        return await cursor.fetchall()
+
+async def add_student(exam_id, name):
+    async with pool.connection() as conn:
+        await conn.execute(
+            "INSERT INTO students (exam_id, name) VALUES (%s, %s)",
+            (exam_id, name),
+        )
+        await conn.execute(BUMP_EXAM_VERSION, (exam_id,))
+
+async def get_students_with_sheet_counts(exam_id, limit, after_id=None):
+    """One page of an exam's students (by id) with their upload counts."""
+    seek = "AND students.id > %(after)s" if after_id is not None else ""
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            f"""
+            SELECT students.id, students.exam_id, students.name, sheets.sheet_count
+            FROM students
+            CROSS JOIN LATERAL (
+                SELECT COUNT(*) AS sheet_count FROM answer_sheets WHERE answer_sheets.student_id = students.id
+            ) AS sheets
+            WHERE students.exam_id = %(exam_id)s {seek}
+            ORDER BY students.id LIMIT %(limit)s
+            """,
+            {"exam_id": exam_id, "after": after_id, "limit": limit},
+        )
+        return await cursor.fetchall()
+
+# Result orderings; each expression has a (exam_id, expression, id) index.
+RESULT_SORTS = {
+    "name": ("students.name", "text"),
+    "score": ("COALESCE(students.best_score, '-infinity'::real)", "real"),
+}
+
+async def get_students_results(exam_id, sort, descending, limit, after=None):
+    """One page of students with their sheets, ordered by ``RESULT_SORTS[sort]`` then id.
+
+    ``after`` is the ``[sort_key, student_id]`` of the last row already
+    shown.  Each row carries its ``sort_key`` and a ``sheets`` list.
+    """
+    expression, key_type = RESULT_SORTS[sort]
+    direction, operator = ("DESC", "<") if descending else ("ASC", ">")
+    after_key, after_id = after if after else (None, None)
+    seek = (
+        f"AND ({expression}, students.id) {operator} (%(after_key)s::{key_type}, %(after_id)s)" if after else ""
     )
-    return cursor.fetchall()
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            f"""
+            SELECT students.id AS student_id, students.name, students.best_score,
+                   {expression} AS sort_key, sheets.sheets
+            FROM students
+            CROSS JOIN LATERAL (
+                SELECT COALESCE(
+                    json_agg(json_build_object('id', answer_sheets.id, 'total_score', answer_sheets.total_score)
+                             ORDER BY answer_sheets.id),
+                    '[]'::json
+                ) AS sheets
+                FROM answer_sheets WHERE answer_sheets.student_id = students.id
+            ) AS sheets
+            WHERE students.exam_id = %(exam_id)s {seek}
+            ORDER BY {expression} {direction}, students.id {direction}
+            LIMIT %(limit)s
+            """,
+            {"exam_id": exam_id, "after_key": after_key, "after_id": after_id, "limit": limit},
+        )
+        return await cursor.fetchall()
 
 async def get_sheet(sheet_id):
-    conn , cursor = get_cursor()
-    cursor.execute(
-        """
-        SELECT answer_sheets.*, students.name AS student_name, exams.title AS exam_title, exams.id AS exam_id
-        FROM answer_sheets
-        JOIN students ON answer_sheets.student_id = students.id
-        JOIN exams ON students.exam_id = exams.id
-        WHERE answer_sheets.id = ?
-        """,
-        (sheet_id,),
-    )
-    return cursor.fetchone()
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            """
+            SELECT answer_sheets.*, students.name AS student_name, exams.title AS exam_title, exams.id AS exam_id
+            FROM answer_sheets
+            JOIN students ON answer_sheets.student_id = students.id
+            JOIN exams ON students.exam_id = exams.id
+            WHERE answer_sheets.id = %s
+            """,
+            (sheet_id,),
+        )
+        return await cursor.fetchone()
+
+async def get_sheet_filename(sheet_id):
+    async with pool.connection() as conn:
+        cursor = await conn.execute("SELECT filename FROM answer_sheets WHERE id = %s", (sheet_id,))
+        row = await cursor.fetchone()
+    return row["filename"] if row else None
 
 async def get_evaluations(sheet_id):
-    conn , cursor = get_cursor()
-    cursor.execute(
-        """
-        SELECT questions.text AS question_text, questions.ideal_answer, answers.student_answer, answers.score
-        FROM answers
-        JOIN questions ON answers.question_id = questions.id
-        WHERE answers.answer_sheet_id = %s
-        ORDER BY questions.id
-        """,
-        (sheet_id,),
-    )
-    return cursor.fetchall()
-
-async def retrieve_scroes(exam_id):
-    conn , cursor = get_cursor()
-    cursor.execute(
-        """
-        SELECT students.name, answer_sheets.total_score
-        FROM students
-        LEFT JOIN answer_sheets ON students.id = answer_sheets.student_id
-        WHERE students.exam_id = %s
-        ORDER BY students.id
-        """,
-        (exam_id,),
-    )
-    return cursor.fetchall()
\ No newline at end of file
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            """
+            SELECT questions.text AS question_text, questions.ideal_answer, answers.student_answer, answers.score
+            FROM answers
+            JOIN questions ON answers.question_id = questions.id
+            WHERE answers.answer_sheet_id = %s
+            ORDER BY questions.id
+            """,
+            (sheet_id,),
+        )
+        return await cursor.fetchall()
+
+async def stream_sheet_scores(exam_id, batch_size=2000):
+    """Yield one row per (student, sheet) with per-question scores pivoted into ``scores``.
+
+    Rows come from a server-side (named) cursor ``batch_size`` at a time,
+    so memory stays flat however large the exam is.  ``scores`` maps
+    ``str(question_id)`` to score.
+    """
+    async with pool.connection() as conn:
+        async with conn.cursor(name=f"export_exam_{exam_id}") as cursor:
+            cursor.itersize = batch_size
+            await cursor.execute(
+                """
+                SELECT students.id AS student_id, students.name,
+                       answer_sheets.id AS sheet_id, answer_sheets.total_score,
+                       COALESCE(
+                           jsonb_object_agg(answers.question_id, answers.score)
+                               FILTER (WHERE answers.question_id IS NOT NULL),
+                           '{}'::jsonb
+                       ) AS scores
+                FROM students
+                LEFT JOIN answer_sheets ON students.id = answer_sheets.student_id
+                LEFT JOIN answers ON answers.answer_sheet_id = answer_sheets.id
+                WHERE students.exam_id = %s
+                GROUP BY students.id, answer_sheets.id
+                ORDER BY students.id, answer_sheets.id
+                """,
+                (exam_id,),
+            )
+            async for row in cursor:
+                yield row
+
+
+async def create_answer_sheet(student_id, filename, sha256=None):
+    """Insert an answer sheet and queue its grading job in one transaction."""
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            cursor = await conn.execute(
+                "INSERT INTO answer_sheets (student_id, filename, sha256) VALUES (%s, %s, %s) RETURNING id",
+                (student_id, filename, sha256),
+            )
+            sheet_id = (await cursor.fetchone())["id"]
+            await conn.execute(
+                "INSERT INTO grading_jobs (answer_sheet_id) VALUES (%s)",
+                (sheet_id,),
+            )
+            await conn.execute(BUMP_STUDENT_EXAM_VERSION, ([student_id],))
+    return sheet_id
+
+async def get_job_status(sheet_id):
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            """
+            SELECT grading_jobs.id AS job_id, grading_jobs.status, grading_jobs.attempts,
+                   grading_jobs.last_error, grading_jobs.run_after, grading_jobs.created_at,
+                   grading_jobs.finished_at, answer_sheets.total_score, answer_sheets.evaluated_at
+            FROM grading_jobs
+            JOIN answer_sheets ON grading_jobs.answer_sheet_id = answer_sheets.id
+            WHERE grading_jobs.answer_sheet_id = %s
+            ORDER BY grading_jobs.id DESC
+            LIMIT 1
+            """,
+            (sheet_id,),
+        )
+        return await cursor.fetchone()
+
+async def bulk_insert_students(exam_id, names):
+    """Load a roster with COPY in a single transaction."""
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cursor:
+                async with cursor.copy("COPY students (exam_id, name) FROM STDIN") as copy:
+                    for name in names:
+                        await copy.write_row((exam_id, name))
+            await conn.execute(BUMP_EXAM_VERSION, (exam_id,))
+
+async def bulk_insert_questions(exam_id, rows):
+    """Load a question bank with COPY in a single transaction."""
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cursor:
+                async with cursor.copy(
+                    "COPY questions (exam_id, text, ideal_answer, point_value) FROM STDIN"
+                ) as copy:
+                    for text, ideal_answer, point_value in rows:
+                        await copy.write_row((exam_id, text, ideal_answer, point_value))
+            await conn.execute(BUMP_EXAM_VERSION, (exam_id,))
+
+async def create_answer_sheets_bulk(rows):
+    """Insert ``(student_id, filename, sha256)`` sheets and their grading jobs in one transaction.
+
+    Returns ``{filename: sheet_id}``.
+    """
+    if not rows:
+        return {}
+    student_ids, filenames, digests = (list(column) for column in zip(*rows))
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            cursor = await conn.execute(
+                """
+                INSERT INTO answer_sheets (student_id, filename, sha256)
+                SELECT * FROM unnest(%s::integer[], %s::text[], %s::text[])
+                RETURNING id, filename
+                """,
+                (student_ids, filenames, digests),
+            )
+            sheet_ids = {row["filename"]: row["id"] for row in await cursor.fetchall()}
+            await conn.execute(
+                "INSERT INTO grading_jobs (answer_sheet_id) SELECT unnest(%s::integer[])",
+                (list(sheet_ids.values()),),
+            )
+            await conn.execute(BUMP_STUDENT_EXAM_VERSION, (list(set(student_ids)),))
+    return sheet_ids
+
+async def queue_regrade(sheet_id=None, exam_id=None):
+    """Queue grading jobs for one sheet or every sheet of an exam.
+
+    Sheets that already have a queued or running job are skipped (a
+    partial unique index, so concurrent requests cannot both queue).  The
+    jobs are ``rescore_only``: the worker re-scores the answers stored for
+    the sheet and runs OCR only for a sheet that has none.  Returns the
+    sheet ids queued.
+    """
+    column = "answer_sheets.id" if sheet_id is not None else "students.exam_id"
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            f"""
+            INSERT INTO grading_jobs (answer_sheet_id, rescore_only)
+            SELECT answer_sheets.id, true
+            FROM answer_sheets
+            JOIN students ON answer_sheets.student_id = students.id
+            WHERE {column} = %s
+            ON CONFLICT (answer_sheet_id) WHERE status IN ('queued', 'running') DO NOTHING
+            RETURNING answer_sheet_id
+            """,
+            (sheet_id if sheet_id is not None else exam_id,),
+        )
+        return [row["answer_sheet_id"] for row in await cursor.fetchall()]
+
+async def get_exam_analytics_cache(exam_id):
+    async with pool.connection() as conn:
+        cursor = await conn.execute(
+            "SELECT question_ids, point_values, exam_version, stats FROM exam_analytics WHERE exam_id = %s",
+            (exam_id,),
+        )
+        return await cursor.fetchone()
+
+async def rebuild_exam_analytics_cache(exam_id, build):
+    """Rebuild an exam's analytics cache from ``answers``.
+
+    ``build(rows)`` turns the ``(sheet_id, question_id, score)`` rows into
+    ``(question_ids, point_values, stats)``; the stats are returned.  The
+    exam version is read before the rows, so a sheet committed while the
+    rebuild runs leaves the stamp behind and the next view rebuilds again.
+    """
+    async with pool.connection() as conn:
+        cursor = await conn.execute("SELECT version FROM exams WHERE id = %s", (exam_id,))
+        version = (await cursor.fetchone())["version"]
+        cursor = await conn.execute(
+            """
+            SELECT answers.answer_sheet_id AS sheet_id, answers.question_id, answers.score
+            FROM answers
+            JOIN answer_sheets ON answers.answer_sheet_id = answer_sheets.id
+            JOIN students ON answer_sheets.student_id = students.id
+            WHERE students.exam_id = %s AND answer_sheets.evaluated_at IS NOT NULL
+            """,
+            (exam_id,),
+        )
+        question_ids, point_values, stats = build(await cursor.fetchall())
+        await conn.execute(
+            """
+            INSERT INTO exam_analytics (exam_id, question_ids, point_values, exam_version, stats)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (exam_id) DO UPDATE SET
+                question_ids = EXCLUDED.question_ids, point_values = EXCLUDED.point_values,
+                exam_version = EXCLUDED.exam_version, stats = EXCLUDED.stats, updated_at = now()
+            """,
+            (exam_id, Jsonb(question_ids), Jsonb(point_values), version, Jsonb(stats)),
+        )
+    return stats
@@ -0,0 +1,123 @@
+"""
+Exam analytics
+==============
+
+Score statistics for an exam, computed with NumPy over the
+sheets x questions score matrix: mean, median, standard deviation,
+percentiles, a histogram of totals, and per question the difficulty
+(mean fraction of points earned) and discrimination (correlation of the
+item with the total of the *other* items).
+
+Results are cached per exam in ``exam_analytics``, stamped with the
+``exams.version`` they were built at.  Grading a sheet (like any other
+write to the exam) only bumps that version, so workers do no analytics
+work at all; the next view finds the stamp behind and rebuilds once from
+``answers``, however many sheets were graded in between.
+"""
+
+import numpy as np
+from repository import repository
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10
+
+
+def _round(value):
+    return None if value is None or not np.isfinite(value) else round(float(value), 4)
+
+
+def compute_stats(matrix: np.ndarray, points: np.ndarray, bins: int = HISTOGRAM_BINS) -> dict:
+    """Statistics for a ``(sheets, questions)`` score matrix."""
+    sheets, question_count = matrix.shape
+    total_possible = float(points.sum())
+    if sheets == 0:
+        return {"sheets": 0, "total_possible": total_possible, "questions": []}
+
+    totals = matrix.sum(axis=1)
+    counts, edges = np.histogram(totals, bins=bins, range=(0.0, max(total_possible, float(totals.max()), 1.0)))
+
+    # Corrected item-total correlation: item vs. the sum of the other items.
+    rest = totals[:, None] - matrix
+    item_dev = matrix - matrix.mean(axis=0)
+    rest_dev = rest - rest.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discrimination = (item_dev * rest_dev).sum(axis=0) / np.sqrt(
+            (item_dev ** 2).sum(axis=0) * (rest_dev ** 2).sum(axis=0)
+        )
+        difficulty = matrix.mean(axis=0) / points
+
+    return {
+        "sheets": sheets,
+        "total_possible": total_possible,
+        "mean": _round(totals.mean()),
+        "median": _round(np.median(totals)),
+        "std": _round(totals.std(ddof=1)) if sheets > 1 else 0.0,
+        "min": _round(totals.min()),
+        "max": _round(totals.max()),
+        "percentiles": {str(p): _round(v) for p, v in zip(PERCENTILES, np.percentile(totals, PERCENTILES))},
+        "histogram": {
+            "edges": [_round(edge) for edge in edges],
+            "counts": counts.tolist(),
+        },
+        "questions": [
+            {
+                "index": index + 1,
+                "mean": _round(matrix[:, index].mean()),
+                "difficulty": _round(difficulty[index]),
+                "discrimination": _round(discrimination[index]),
+            }
+            for index in range(question_count)
+        ],
+    }
+
+
+def build_matrix(question_ids: list, rows: list) -> dict:
+    """Fold ``(sheet_id, question_id, score)`` rows into ``{sheet_id: [score per question]}``."""
+    column = {question_id: index for index, question_id in enumerate(question_ids)}
+    sheet_scores = {}
+    for sheet_id, question_id, score in rows:
+        if question_id in column:
+            scores = sheet_scores.setdefault(str(sheet_id), [0.0] * len(question_ids))
+            scores[column[question_id]] = float(score or 0.0)
+    return sheet_scores
+
+
+def stats_for(sheet_scores: dict, point_values: list) -> dict:
+    matrix = np.array(list(sheet_scores.values()), dtype=float).reshape(len(sheet_scores), len(point_values))
+    return compute_stats(matrix, np.array(point_values, dtype=float))
+
+
+def matches(cached, questions: list) -> bool:
+    """Whether a cached entry was built for the exam's current questions and point values."""
+    return (
+        cached["question_ids"] == [question["id"] for question in questions]
+        and cached["point_values"] == [float(question["point_value"]) for question in questions]
+    )
+
+
+def tier_report(tiers: dict) -> dict:
+    """Answers per grading tier and the share escalated to the LLM."""
+    total = sum(tiers.values())
+    return {
+        "answers": {tier: tiers.get(tier, 0) for tier in ("fuzzy_full", "fuzzy_zero", "llm")},
+        "escalation_rate": round(tiers.get("llm", 0) / total, 4) if total else None,
+    }
+
+
+async def get_exam_analytics(exam_id: int) -> dict:
+    """Cached statistics for an exam, rebuilt from ``answers`` only when stale."""
+    questions = await repository.get_questons(exam_id)
+    cached = await repository.get_exam_analytics_cache(exam_id)
+    if (
+        cached is not None and matches(cached, questions)
+        and cached["exam_version"] == await repository.get_exam_version(exam_id)
+    ):
+        return cached["stats"]
+    question_ids = [question["id"] for question in questions]
+    point_values = [float(question["point_value"]) for question in questions]
+
+    def build(rows):
+        sheet_scores = build_matrix(question_ids, [(r["sheet_id"], r["question_id"], r["score"]) for r in rows])
+        return question_ids, point_values, stats_for(sheet_scores, point_values)
+
+    return await repository.rebuild_exam_analytics_cache(exam_id, build)
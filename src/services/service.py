@@ -1,5 +1,170 @@
+import asyncio
+import csv
+import io
+import json
+import math
+import tempfile
+import zipfile
+from pathlib import Path
 from fastapi import APIRouter , HTTPException , Request
+from fastapi.responses import JSONResponse , HTMLResponse , Response
+from configuration.main_config import UPLOAD_MAX_BYTES , PAGE_SIZE , MAX_PAGE_SIZE
 from repository import repository
+from utility import ingest
+from utility.uploads import receive_upload , read_body
+from utility.scoring import SCORING_MODES
+from utility.page_cache import page_cache
+from utility.pagination import decode_cursor , split_page
+
+def parse_scoring_mode(value):
+    """Form value -> ``scoring_mode`` column; empty means the configured default."""
+    value = (value or "").strip()
+    if value and value not in SCORING_MODES:
+        raise HTTPException(status_code=400, detail=f"Scoring mode must be one of {', '.join(SCORING_MODES)}")
+    return value or None
+
+def parse_point_value(value):
+    """A question's point value: empty means 1; raises ``ValueError`` unless finite and non-negative."""
+    try:
+        point_value = 1.0 if value in (None, "") else float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"point_value {value!r} is not a number")
+    if not math.isfinite(point_value):
+        raise ValueError(f"point_value {value!r} is not a finite number")
+    if point_value < 0:
+        raise ValueError("point_value must not be negative")
+    return point_value
+
+def form_point_value(form):
+    """``parse_point_value`` of a question form, as a 400."""
+    try:
+        return parse_point_value(form.get("point_value", "").strip())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def parse_tier_thresholds(form):
+    """``(tier_high, tier_low)`` similarity thresholds (0-100); both empty means the default."""
+    high, low = (form.get(name, "").strip() for name in ("tier_high", "tier_low"))
+    if not high and not low:
+        return None, None
+    try:
+        high, low = float(high), float(low)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Set both similarity thresholds as numbers")
+    if not 0 <= low < high <= 100:
+        raise HTTPException(status_code=400, detail="Thresholds must satisfy 0 <= low < high <= 100")
+    return high, low
+
+# ======================================= Keyset pagination =======================================================
+
+# Default direction per result ordering: names A-Z, best scores first.
+RESULT_ORDERS = {"name": "asc", "score": "desc"}
+
+MAX_ROW_ID = 2 ** 31 - 1  # INTEGER primary keys
+MAX_REAL = 3.4e38
+
+def _is_row_id(value):
+    return type(value) is int and 0 <= value <= MAX_ROW_ID
+
+def _is_name(value):
+    return isinstance(value, str) and "\x00" not in value
+
+def _is_score(value):
+    # Finite REAL, or the -infinity that stands in for students without a score.
+    return type(value) in (int, float) and (value == float("-inf") or abs(value) <= MAX_REAL)
+
+# What precedes the row id in each listing's seek key.
+CURSOR_VALUES = {"id": (), "name": (_is_name,), "score": (_is_score,)}
+
+def valid_cursor_key(sort, key):
+    """Whether a decoded ``key`` can be bound to the ``sort`` seek query."""
+    checks = CURSOR_VALUES[sort] + (_is_row_id,)
+    return len(key) == len(checks) and all(check(value) for check, value in zip(checks, key))
+
+def parse_page(request, sort="id", order="asc"):
+    """Validated ``limit`` and ``after`` cursor of a listing request."""
+    value = request.query_params.get("limit", "").strip()
+    try:
+        limit = int(value) if value else PAGE_SIZE
+    except ValueError:
+        raise HTTPException(status_code=400, detail="limit must be a number")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    token = request.query_params.get("after") or None
+    try:
+        after = decode_cursor(token, sort, order) if token else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if after is not None and not valid_cursor_key(sort, after):
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    return {"limit": limit, "token": token, "after": after, "sort": sort, "order": order}
+
+def parse_result_page(request):
+    sort = request.query_params.get("sort") or "name"
+    if sort not in RESULT_ORDERS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(RESULT_ORDERS)}")
+    order = request.query_params.get("order") or RESULT_ORDERS[sort]
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    return parse_page(request, sort, order)
+
+def page_cache_key(name, page):
+    return f"{name}:{page['sort']}:{page['order']}:{page['limit']}:{page['token'] or ''}"
+
+def shareable(page):
+    """Only first pages at the default size go to the shared page cache: clients can mint any other key."""
+    return page["token"] is None and page["limit"] == PAGE_SIZE
+
+async def exams_page(page):
+    rows = await repository.list_exams(page["limit"] + 1, page["after"][0] if page["after"] else None)
+    return split_page(rows, page["limit"], page["sort"], page["order"], lambda row: [row["id"]])
+
+async def students_page(exam_id, page):
+    rows = await repository.get_students_with_sheet_counts(
+        exam_id, page["limit"] + 1, page["after"][0] if page["after"] else None
+    )
+    return split_page(rows, page["limit"], page["sort"], page["order"], lambda row: [row["id"]])
+
+async def results_page(exam_id, page):
+    """Students with their sheets, sorted in SQL; ``sort_key`` is only used for the cursor."""
+    rows = await repository.get_students_results(
+        exam_id, page["sort"], page["order"] == "desc", page["limit"] + 1, page["after"]
+    )
+    students, next_cursor = split_page(
+        rows, page["limit"], page["sort"], page["order"], lambda row: [row["sort_key"], row["student_id"]]
+    )
+    return [{key: value for key, value in row.items() if key != "sort_key"} for row in students], next_cursor
+
+def etag_matches(request, etag):
+    """``If-None-Match`` check (weak comparison, as RFC 9110 asks for GET)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+async def cached_page(request, page, version, render, share=True):
+    """Serve ``page`` as rendered at ``version``: 304, from the page cache, or ``await render()``.
+
+    ``version`` is ``None`` when the page's exam or sheet does not exist;
+    ``render`` then produces the error and nothing is cached.  ``share``
+    is ``False`` for pages kept out of the shared tier (see ``shareable``).
+    """
+    if version is None:
+        return await render()
+    etag = page_cache.etag(page, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        page_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    body = await page_cache.get(page, version, share)
+    if body is None:
+        response = await render()
+        if response is None or response.status_code != 200:
+            return response
+        body = response.body
+        await page_cache.put(page, version, body, share)
+    return HTMLResponse(body, headers=headers)
 
 async def create_exams(request):
     form = await request.form()
@@ -8,5 +173,259 @@ async def create_exams(request):
     instructions = form.get("instructions", "").strip()
     if not title or not subject:
         raise HTTPException(status_code=400, detail="Title and subject are required")
-    return repository.create_exams_repo(title , subject , instructions)
-    
\ No newline at end of file
+    scoring_mode = parse_scoring_mode(form.get("scoring_mode"))
+    return await repository.create_exams_repo(title , subject , instructions , scoring_mode)
+
+# ======================================= Bulk imports =============================================
+
+MAX_IMPORT_ERRORS = 100
+
+
+async def read_import_payload(request):
+    """Return ``(text, fmt)`` from a CSV/JSON body or a multipart ``file`` field."""
+    content_type = request.headers.get("content-type", "")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Import exceeds the maximum allowed size")
+    # Both paths count bytes as they arrive: chunked requests have no Content-Length.
+    if content_type.startswith("multipart/form-data"):
+        with tempfile.TemporaryDirectory() as workdir:
+            _, files = await receive_upload(request, Path(workdir), allowed_suffixes=())
+            upload = files.get("file")
+            if upload is None:
+                raise HTTPException(status_code=400, detail="Missing file field")
+            raw = upload.path.read_bytes()
+        fmt = Path(upload.filename or "").suffix.lower().lstrip(".")
+    else:
+        raw = await read_body(request)
+        fmt = "json" if "json" in content_type else "csv" if "csv" in content_type else ""
+    if fmt not in ("csv", "json"):
+        raise HTTPException(status_code=415, detail="Upload a .csv or .json file")
+    try:
+        return raw.decode("utf-8-sig"), fmt
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Import file must be UTF-8")
+
+
+def _records(text, fmt):
+    """Yield ``(line_number, record)``; CSV lines count the header as line 1."""
+    if fmt == "json":
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(data, list):
+            raise HTTPException(status_code=400, detail="JSON import must be a list")
+        for index, record in enumerate(data, start=1):
+            yield index, record
+        return
+    reader = csv.DictReader(io.StringIO(text))
+    for record in reader:
+        yield reader.line_num, {k.strip().lower(): v for k, v in record.items() if k}
+
+
+def parse_student_rows(text, fmt):
+    """Validate a roster; returns ``(names, errors)``."""
+    names, errors = [], []
+    for line, record in _records(text, fmt):
+        if isinstance(record, str):
+            record = {"name": record}
+        name = str(record.get("name") or "").strip() if isinstance(record, dict) else ""
+        if not name:
+            errors.append({"line": line, "error": "name is required"})
+            continue
+        names.append(name)
+    return names, errors
+
+
+def parse_question_rows(text, fmt):
+    """Validate a question bank; returns ``(rows, errors)`` of ``(text, ideal_answer, point_value)``."""
+    rows, errors = [], []
+    for line, record in _records(text, fmt):
+        if not isinstance(record, dict):
+            errors.append({"line": line, "error": "expected an object"})
+            continue
+        question = str(record.get("text") or "").strip()
+        ideal_answer = str(record.get("ideal_answer") or "").strip()
+        if not question or not ideal_answer:
+            errors.append({"line": line, "error": "text and ideal_answer are required"})
+            continue
+        try:
+            point_value = parse_point_value(record.get("point_value"))
+        except ValueError as e:
+            errors.append({"line": line, "error": str(e)})
+            continue
+        rows.append((question, ideal_answer, point_value))
+    return rows, errors
+
+
+def parse_layout_regions(payload):
+    """Validate an exam layout; returns ``(rows, errors)`` of ``(question_id, page, box)``.
+
+    ``payload`` is a list (or ``{"regions": [...]}``) of
+    ``{"question_id", "page", "box": [x0, y0, x1, y1]}`` with the page
+    1-based and the box in fractions of the page size.
+    """
+    if isinstance(payload, dict):
+        payload = payload.get("regions")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Layout must be a list of regions")
+    rows, errors, seen = [], [], set()
+    for line, record in enumerate(payload, start=1):
+        if not isinstance(record, dict):
+            errors.append({"line": line, "error": "expected an object"})
+            continue
+        try:
+            question_id, page = int(record.get("question_id")), int(record.get("page"))
+            box = [float(value) for value in record.get("box")]
+        except (TypeError, ValueError):
+            errors.append({"line": line, "error": "question_id, page and box are required numbers"})
+            continue
+        if page < 1:
+            errors.append({"line": line, "error": "page must be 1 or more"})
+            continue
+        if len(box) != 4 or not (0 <= box[0] < box[2] <= 1 and 0 <= box[1] < box[3] <= 1):
+            errors.append({"line": line, "error": "box must be [x0, y0, x1, y1] with 0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1"})
+            continue
+        if question_id in seen:
+            errors.append({"line": line, "error": f"question {question_id} appears twice"})
+            continue
+        seen.add(question_id)
+        rows.append((question_id, page, box))
+    return rows, errors
+
+
+def layout_status(regions):
+    """Whether a layout covers every question (``get_answer_regions`` rows).
+
+    Grading reads only the answer boxes when it does, and falls back to
+    whole-page OCR otherwise; ``missing_question_ids`` lists the questions
+    without a box once any box is set.
+    """
+    if not any(region["page"] for region in regions):
+        return {"complete": False, "missing_question_ids": []}
+    missing = [region["question_id"] for region in regions if not (region["page"] and region["box"])]
+    return {"complete": not missing, "missing_question_ids": missing}
+
+
+async def import_rows(request, exam_id, parse, insert):
+    """Parse, validate and load an import in one transaction.
+
+    The import is all-or-nothing: any invalid line rejects the whole file
+    with 422 and the per-line errors.
+    """
+    if await repository.get_exams(exam_id) is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    text, fmt = await read_import_payload(request)
+    rows, errors = parse(text, fmt)
+    if errors:
+        return JSONResponse(
+            {"imported": 0, "rejected": len(errors), "errors": errors[:MAX_IMPORT_ERRORS]},
+            status_code=422,
+        )
+    if not rows:
+        raise HTTPException(status_code=400, detail="Import file contains no rows")
+    await insert(exam_id, rows)
+    return JSONResponse({"imported": len(rows), "rejected": 0, "errors": []})
+
+
+# ======================================= Bulk answer-sheet ingestion =============================================
+
+async def ingest_answer_sheets(request, exam_id, uploads_dir):
+    """Split a ZIP or a scanned stack into per-student sheets and queue them all.
+
+    Form fields: ``file`` (.zip or .pdf) and, for a PDF, either
+    ``mapping`` (JSON list of ``{"student_id", "pages"}``) or
+    ``pages_per_student``.  For a ZIP, ``mapping`` may be a JSON object of
+    ``{member_name: student_id}``; otherwise members are matched by a
+    leading student id or by student name.
+    """
+    if await repository.get_exams(exam_id) is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    fields, files = await receive_upload(request, uploads_dir, allowed_suffixes=(".pdf", ".zip"))
+    upload = files.get("file")
+    if upload is None:
+        raise HTTPException(status_code=400, detail="Missing file field")
+    try:
+        students = await repository.get_students(exam_id)
+        try:
+            mapping = json.loads(fields["mapping"]) if fields.get("mapping", "").strip() else None
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid mapping JSON: {e}")
+
+        if upload.filename.lower().endswith(".zip"):
+            if mapping is not None and not isinstance(mapping, dict):
+                raise HTTPException(status_code=400, detail="ZIP mapping must be an object of file name to student id")
+            try:
+                items = await asyncio.to_thread(
+                    ingest.split_zip, upload.path, uploads_dir,
+                    ingest.student_resolver(students, mapping),
+                    UPLOAD_MAX_BYTES, UPLOAD_MAX_BYTES * 4,
+                )
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail="Invalid ZIP archive")
+        else:
+            try:
+                count = await asyncio.to_thread(ingest.page_count, upload.path)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid PDF: {e}")
+            try:
+                if isinstance(mapping, list):
+                    roster = {student["id"] for student in students}
+                    unknown = [e.get("student_id") for e in mapping if e.get("student_id") not in roster]
+                    if unknown:
+                        raise HTTPException(status_code=400, detail=f"Unknown student ids {unknown}")
+                    ranges = ingest.parse_page_ranges(mapping, count)
+                elif fields.get("pages_per_student", "").strip():
+                    ranges = ingest.ranges_per_student(students, int(fields["pages_per_student"]), count)
+                else:
+                    raise HTTPException(status_code=400, detail="Provide mapping or pages_per_student")
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                raise HTTPException(status_code=400, detail=f"Invalid page mapping: {e}")
+            items = await asyncio.to_thread(ingest.split_pdf, upload.path, uploads_dir, ranges)
+    finally:
+        # The per-student files are what we keep; the container is done with.
+        upload.path.unlink(missing_ok=True)
+
+    ready = [item for item in items if item.status == "split"]
+    sheet_ids = await repository.create_answer_sheets_bulk(
+        [(item.student_id, item.filename, item.sha256) for item in ready]
+    )
+    for item in ready:
+        item.sheet_id = sheet_ids[item.filename]
+        item.status = "queued"
+    return JSONResponse({
+        "queued": len(ready),
+        "failed": len(items) - len(ready),
+        "files": [item.report() for item in items],
+    })
+
+
+# ======================================= CSV export =============================================
+
+async def export_results_csv(exam_id, questions):
+    """Stream the results CSV: one row per sheet, one column per question."""
+    total_possible = sum(question["point_value"] for question in questions)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(
+        ["Student", "Sheet"]
+        + [f"Q{index} ({question['point_value']} pts)" for index, question in enumerate(questions, start=1)]
+        + ["Score", "Out of"]
+    )
+    yield flush()
+    async for row in repository.stream_sheet_scores(exam_id):
+        scores = row["scores"]
+        writer.writerow(
+            [row["name"], row["sheet_id"] or ""]
+            + [scores.get(str(question["id"]), "") for question in questions]
+            + [row["total_score"] if row["total_score"] is not None else "", total_possible]
+        )
+        yield flush()
@@ -0,0 +1,186 @@
+"""
+Batched Florence-2 inference
+============================
+
+``BatchInferenceEngine`` collects page images submitted from any number
+of threads (for example several answer sheets being graded at once by
+one worker) and runs them through the processor and ``model.generate``
+as padded batches.  A batch is flushed as soon as it reaches
+``max_batch_size`` or the oldest pending page has waited ``max_wait_ms``.
+
+Decoding is controlled by a named profile from the ``florence`` section
+of ``configuration/config.yml``: ``throughput`` decodes greedily with the
+KV cache, ``quality`` uses beam search like the original pipeline.
+
+With ``florence.pool.processes`` set, batches run in worker processes
+(``utility/ocr_pool.py``), several at a time.
+"""
+
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from . import metrics
+
+from configuration.florenc2_config import load_florence
+from configuration.main_config import (
+    FLORENCE_BATCH_SIZE,
+    FLORENCE_MAX_WAIT_MS,
+    FLORENCE_PROFILE,
+    FLORENCE_PROFILES,
+    FLORENCE_POOL_PROCESSES,
+    FLORENCE_POOL_BATCH_SIZE,
+)
+
+logger = logging.getLogger("inference.blog")
+
+
+def decoding_kwargs(profile: str) -> dict:
+    if profile not in FLORENCE_PROFILES:
+        raise ValueError(f"Unknown decoding profile '{profile}'")
+    kwargs = dict(FLORENCE_PROFILES[profile])
+    kwargs.setdefault("max_new_tokens", 1024)
+    kwargs.setdefault("do_sample", False)
+    kwargs.setdefault("early_stopping", False)
+    return kwargs
+
+
+def run_batch(images: list, task_prompt: str, profile: str = FLORENCE_PROFILE) -> list:
+    """Run one padded batch through Florence-2 and post-process every page."""
+    processor, model = load_florence()
+    return generate(processor, model, images, task_prompt, profile)
+
+
+def generate(processor, model, images: list, task_prompt: str, profile: str = FLORENCE_PROFILE) -> list:
+    """``run_batch`` on an explicit processor/model (benchmarks compare several)."""
+    with metrics.stage("ocr_generate"):
+        inputs = processor(
+            text=[task_prompt] * len(images),
+            images=images,
+            return_tensors="pt",
+            padding=True,
+        ).to(model.device)
+
+        generated_ids = model.generate(
+            input_ids=inputs["input_ids"],
+            pixel_values=inputs["pixel_values"].to(model.dtype),
+            **decoding_kwargs(profile),
+        )
+        generated_texts = processor.batch_decode(generated_ids, skip_special_tokens=False)
+    with metrics.stage("postprocess"):
+        return [
+            processor.post_process_generation(text, task=task_prompt, image_size=image.size)
+            for text, image in zip(generated_texts, images)
+        ]
+
+
+@dataclass
+class _Pending:
+    image: object
+    task_prompt: str
+    future: Future = field(default_factory=Future)
+    submitted: float = field(default_factory=time.monotonic)
+
+
+class BatchInferenceEngine:
+    def __init__(self, runner=run_batch, max_batch_size: int = FLORENCE_BATCH_SIZE,
+                 max_wait_ms: float = FLORENCE_MAX_WAIT_MS, profile: str = FLORENCE_PROFILE,
+                 workers: int = 1):
+        self.runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.profile = profile
+        # More than one worker keeps that many batches in flight (for a
+        # runner that is itself parallel, like ``OCRPool``).
+        self._flusher = ThreadPoolExecutor(workers, thread_name_prefix="florence-flush") if workers > 1 else None
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="florence-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, task_prompt: str) -> Future:
+        pending = _Pending(image, task_prompt)
+        self._queue.put(pending)
+        return pending.future
+
+    def run(self, images: list, task_prompt: str, return_exceptions: bool = False) -> list:
+        """Submit ``images`` and block until all are done, preserving order."""
+        futures = [self.submit(image, task_prompt) for image in images]
+        if not return_exceptions:
+            return [future.result() for future in futures]
+        return [future.exception() or future.result() for future in futures]
+
+    def _loop(self) -> None:
+        # Pages wait here grouped by task prompt: a batch must share a prompt.
+        waiting: dict[str, list[_Pending]] = {}
+        while True:
+            timeout = None
+            if waiting:
+                oldest = min(group[0].submitted for group in waiting.values())
+                timeout = max(0.0, oldest + self.max_wait - time.monotonic())
+            try:
+                pending = self._queue.get(timeout=timeout)
+                waiting.setdefault(pending.task_prompt, []).append(pending)
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            for task_prompt in list(waiting):
+                group = waiting[task_prompt]
+                if len(group) >= self.max_batch_size or now - group[0].submitted >= self.max_wait:
+                    batch = group[:self.max_batch_size]
+                    rest = group[self.max_batch_size:]
+                    if rest:
+                        waiting[task_prompt] = rest
+                    else:
+                        del waiting[task_prompt]
+                    if self._flusher:
+                        self._flusher.submit(self._flush, batch, task_prompt)
+                    else:
+                        self._flush(batch, task_prompt)
+
+    def _flush(self, batch: list, task_prompt: str) -> None:
+        started = time.monotonic()
+        try:
+            results = self.runner([p.image for p in batch], task_prompt, self.profile)
+            if len(results) != len(batch):
+                # Which page a result belongs to is lost; fail them all rather than leave callers waiting.
+                raise RuntimeError(f"OCR runner returned {len(results)} results for a batch of {len(batch)} pages")
+        except Exception as e:
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+        for pending, result in zip(batch, results):
+            pending.future.set_result(result)
+        logger.info(
+            f"Florence-2 batch of {len(batch)} pages ({task_prompt}, {self.profile}) "
+            f"took {time.monotonic() - started:.2f}s"
+        )
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> BatchInferenceEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            if FLORENCE_POOL_PROCESSES:
+                from .ocr_pool import OCRPool
+
+                _engine = BatchInferenceEngine(
+                    runner=OCRPool(), max_batch_size=FLORENCE_POOL_BATCH_SIZE, workers=FLORENCE_POOL_PROCESSES
+                )
+            else:
+                _engine = BatchInferenceEngine()
+        return _engine
+
+
+def set_engine(engine: BatchInferenceEngine) -> None:
+    """Replace the process-wide engine (benchmarks run it with a stub runner)."""
+    global _engine
+    with _engine_lock:
+        _engine = engine
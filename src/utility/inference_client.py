@@ -0,0 +1,71 @@
+"""
+Florence-2 inference server client
+==================================
+
+With ``florence.mode: server`` the grading workers do not load the model
+themselves; they send pages to the one process running
+``src/inference_server.py`` over a local Unix socket.  That process owns
+the only copy of Florence-2 and batches pages from every client.
+
+Wire format (both directions): a 4-byte big-endian length followed by a
+JSON header, then any binary payload the header announces.  A request
+header is ``{"task_prompt": ..., "pages": [[width, height], ...]}``
+followed by the raw RGB bytes of each page in order; the response header
+is ``{"results": [...]}`` (an ``{"error": ...}`` entry per failed page).
+"""
+
+import json
+import socket
+import struct
+
+from configuration.main_config import FLORENCE_SOCKET_PATH, FLORENCE_SOCKET_TIMEOUT
+
+_LENGTH = struct.Struct(">I")
+
+
+class InferenceServerError(Exception):
+    pass
+
+
+def recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("Inference socket closed mid-message")
+        received += n
+    return bytes(buffer)
+
+
+def send_header(sock: socket.socket, header: dict) -> None:
+    blob = json.dumps(header).encode()
+    sock.sendall(_LENGTH.pack(len(blob)) + blob)
+
+
+def recv_header(sock: socket.socket) -> dict:
+    (length,) = _LENGTH.unpack(recv_exact(sock, _LENGTH.size))
+    return json.loads(recv_exact(sock, length))
+
+
+def run_remote(images: list, task_prompt: str, socket_path: str = FLORENCE_SOCKET_PATH,
+               timeout: float = FLORENCE_SOCKET_TIMEOUT, return_exceptions: bool = False) -> list:
+    """OCR RGB PIL ``images`` on the inference server, preserving order."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        send_header(sock, {"task_prompt": task_prompt, "pages": [list(image.size) for image in images]})
+        for image in images:
+            sock.sendall(image.tobytes())
+        response = recv_header(sock)
+
+    results = []
+    for result in response["results"]:
+        if isinstance(result, dict) and "error" in result and len(result) == 1:
+            error = InferenceServerError(result["error"])
+            if not return_exceptions:
+                raise error
+            result = error
+        results.append(result)
+    return results
@@ -0,0 +1,197 @@
+"""
+Bulk answer-sheet ingestion
+===========================
+
+Turns what the scanning room produces into one PDF per student:
+
+* ``split_zip`` -- a ZIP of per-student PDFs, streamed out member by
+  member (with size limits against ZIP bombs).
+* ``split_pdf`` -- one scanned stack for a whole section, cut into page
+  ranges with PyMuPDF's ``insert_pdf``, which copies page objects as-is
+  and never rasterizes them.
+
+Both return an ``IngestItem`` per output file; the caller creates the
+answer sheets and grading jobs for the ones that succeeded.  A stack
+PyMuPDF cannot read (corrupt, or password protected) raises
+``ValueError`` rather than failing part way through the split.
+"""
+
+import re
+import uuid
+import hashlib
+import zipfile
+import logging
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+import fitz
+
+logger = logging.getLogger("ingest.blog")
+
+_LEADING_ID = re.compile(r"^(\d+)(?:\D|$)")
+
+
+@dataclass
+class IngestItem:
+    source: str
+    student_id: int = None
+    pages: str = None
+    filename: str = None
+    sha256: str = None
+    size: int = 0
+    status: str = "pending"
+    error: str = None
+    sheet_id: int = None
+
+    def fail(self, error: str) -> "IngestItem":
+        self.status = "error"
+        self.error = error
+        return self
+
+    def report(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+def _open_pdf(pdf_path: Path):
+    try:
+        document = fitz.open(pdf_path)
+    except RuntimeError as e:  # fitz.FileDataError and friends
+        raise ValueError(f"unreadable PDF: {e}") from e
+    if document.needs_pass:
+        document.close()
+        raise ValueError("PDF is password protected")
+    return document
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def student_resolver(students: list, mapping: dict = None):
+    """Build ``resolve(member_name) -> student_id`` for ZIP members.
+
+    An explicit ``{member_name: student_id}`` mapping wins; otherwise a
+    leading number in the file name is taken as the student id, and
+    failing that the file stem is matched against student names.
+    """
+    ids = {student["id"] for student in students}
+    by_name = {student["name"].strip().lower(): student["id"] for student in students}
+    mapping = {str(k): int(v) for k, v in (mapping or {}).items()}
+
+    def resolve(member_name: str):
+        base = Path(member_name).name
+        if mapping:
+            student_id = mapping.get(member_name, mapping.get(base))
+            return student_id if student_id in ids else None
+        match = _LEADING_ID.match(base)
+        if match and int(match.group(1)) in ids:
+            return int(match.group(1))
+        return by_name.get(Path(base).stem.replace("_", " ").strip().lower())
+
+    return resolve
+
+
+def split_zip(zip_path: Path, dest_dir: Path, resolve, max_member_bytes: int,
+              max_total_bytes: int) -> list:
+    items = []
+    total = 0
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.infolist():
+            if member.is_dir() or Path(member.filename).name.startswith("."):
+                continue
+            item = IngestItem(source=member.filename)
+            items.append(item)
+            if not member.filename.lower().endswith(".pdf"):
+                item.fail("not a PDF")
+                continue
+            item.student_id = resolve(member.filename)
+            if item.student_id is None:
+                item.fail("no matching student")
+                continue
+            if member.file_size > max_member_bytes or total + member.file_size > max_total_bytes:
+                item.fail("file too large")
+                continue
+            item.filename = f"{uuid.uuid4().hex}_{Path(member.filename).name}"
+            digest = hashlib.sha256()
+            with archive.open(member) as source, open(dest_dir / item.filename, "wb") as target:
+                # Count real bytes too: the size in the directory can lie.
+                for block in iter(lambda: source.read(1 << 20), b""):
+                    item.size += len(block)
+                    if item.size > max_member_bytes:
+                        break
+                    digest.update(block)
+                    target.write(block)
+            if item.size > max_member_bytes:
+                (dest_dir / item.filename).unlink(missing_ok=True)
+                item.filename = None
+                item.fail("file too large")
+                continue
+            total += item.size
+            item.sha256 = digest.hexdigest()
+            item.status = "split"
+    return items
+
+
+def parse_page_ranges(mapping: list, page_count: int) -> list:
+    """``[{"student_id": 3, "pages": "1-4"}, ...]`` -> ``[(student_id, first, last)]`` (0-based)."""
+    ranges = []
+    for entry in mapping:
+        pages = str(entry["pages"]).strip()
+        first, _, last = pages.partition("-")
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= page_count:
+            raise ValueError(f"page range {pages} is outside 1-{page_count}")
+        ranges.append((int(entry["student_id"]), first - 1, last - 1))
+    ordered = sorted(ranges, key=lambda r: r[1])
+    for (_, _, previous_last), (_, first, _) in zip(ordered, ordered[1:]):
+        if first <= previous_last:
+            raise ValueError(f"page {first + 1} is assigned to more than one student")
+    return ranges
+
+
+def ranges_per_student(students: list, pages_per_student: int, page_count: int) -> list:
+    """Assign fixed-size page ranges to the roster in id order."""
+    if pages_per_student < 1:
+        raise ValueError("pages_per_student must be at least 1")
+    ranges = []
+    for index, student in enumerate(students):
+        first = index * pages_per_student
+        if first >= page_count:
+            break
+        ranges.append((student["id"], first, first + pages_per_student - 1))
+    return ranges
+
+
+def split_pdf(pdf_path: Path, dest_dir: Path, ranges: list) -> list:
+    items = []
+    with _open_pdf(pdf_path) as stack:
+        page_count = stack.page_count
+        for student_id, first, last in ranges:
+            item = IngestItem(source=pdf_path.name, student_id=student_id, pages=f"{first + 1}-{last + 1}")
+            items.append(item)
+            if last >= page_count:
+                item.fail(f"stack has only {page_count} pages")
+                continue
+            item.filename = f"{uuid.uuid4().hex}_student{student_id}_p{first + 1}-{last + 1}.pdf"
+            path = dest_dir / item.filename
+            with fitz.open() as part:
+                part.insert_pdf(stack, from_page=first, to_page=last)
+                part.save(path, garbage=3, deflate=True)
+            item.size = path.stat().st_size
+            item.sha256 = _sha256_file(path)
+            item.status = "split"
+        assigned = max((last for _, _, last in ranges), default=-1) + 1
+        if assigned < page_count:
+            items.append(IngestItem(source=pdf_path.name, pages=f"{assigned + 1}-{page_count}").fail(
+                "pages not assigned to any student"
+            ))
+    return items
+
+
+def page_count(pdf_path: Path) -> int:
+    with _open_pdf(pdf_path) as document:
+        return document.page_count
@@ -0,0 +1,93 @@
+"""
+Pipeline metrics
+================
+
+Prometheus metrics for the grading pipeline.  ``STAGE_SECONDS`` times
+each stage of grading a sheet, each stage at one granularity only:
+
+* ``rasterize`` -- pdf2image turning a sheet's PDF into page images
+* ``handoff`` -- preparing a sheet's pages for OCR (in memory or spilled)
+* ``ocr_generate`` -- one Florence-2 batch: preprocessing, ``generate``
+  and decoding (batches mix pages of several sheets)
+* ``ocr_pool`` -- one batch's round trip through an OCR worker process
+  (shared-memory transfer, waiting and ``ocr_generate`` in the worker)
+* ``postprocess`` -- one batch's Florence-2 ``post_process_generation``
+* ``scoring`` -- LLM scoring of every answer on a sheet
+* ``db_write`` -- storing a sheet's answers, totals and analytics
+* ``rescoring`` -- re-scoring one edited question across the exam
+
+The web app serves ``/metrics`` (``src/main.py``); grading workers and the
+inference server expose their own registry on ``metrics.worker_port`` /
+``metrics.inference_port``.  When ``PROMETHEUS_MULTIPROC_DIR`` is set,
+every process on the host writes there and ``/metrics`` aggregates them.
+"""
+
+import os
+import logging
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+    CONTENT_TYPE_LATEST,
+)
+
+logger = logging.getLogger("metrics.blog")
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "grading_stage_seconds", "Time spent in each grading stage", ["stage"], buckets=STAGE_BUCKETS
+)
+PAGES = Counter("grading_pages_total", "Pages sent through OCR")
+OCR_PIXELS = Counter("grading_ocr_pixels_total", "Pixels of pages or answer regions handed to OCR")
+SHEETS = Counter("grading_sheets_total", "Answer sheets graded")
+ERRORS = Counter("grading_errors_total", "Errors in the grading pipeline", ["stage"])
+ANSWER_COUNT_MISMATCHES = Counter(
+    "grading_answer_count_mismatches_total",
+    "Sheets whose extracted answers did not match the question count",
+    ["kind"],
+)
+SCORING_CALLS = Counter(
+    "scoring_calls_total", "Scoring model calls, including retries", ["mode"]
+)
+SCORING_PROMPT_TOKENS = Counter(
+    "scoring_prompt_tokens_total", "Estimated prompt tokens sent to the scoring model", ["mode"]
+)
+SCORING_TIERS = Counter(
+    "scoring_tier_answers_total", "Answers graded by each tier (escalation rate = llm / all)", ["tier"]
+)
+JOBS_IN_FLIGHT = Gauge(
+    "grading_jobs_in_flight", "Grading jobs currently being processed", multiprocess_mode="livesum"
+)
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage."""
+    return STAGE_SECONDS.labels(name).time()
+
+
+def render() -> tuple:
+    """Return ``(body, content_type)`` for a scrape of this host's metrics."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def serve(port: int) -> None:
+    """Expose this process's metrics on ``port`` (0 disables)."""
+    if port and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        try:
+            start_http_server(port)
+        except OSError as e:
+            # Another worker on this host already owns the port.
+            logger.warning(f"Metrics port {port} unavailable ({e}); use PROMETHEUS_MULTIPROC_DIR")
+            return
+        logger.info(f"Serving metrics on :{port}")
@@ -0,0 +1,125 @@
+"""
+OCR page cache
+==============
+
+Florence-2 is the most expensive step of grading, and regrades or
+re-uploads of the same scan send identical pages through it again.
+Results are therefore cached per page in the ``ocr_cache`` table, keyed
+by a hash of the rasterized page together with the model id, task prompt
+and decoding profile, so a change to any of those misses the cache.
+
+The table is bounded to ``florence.cache_max_entries`` rows; every hit
+refreshes ``last_used_at``.  At most every
+``florence.cache_evict_interval`` seconds a write counts the rows, and
+once they are over the limit the least recently used pages are deleted
+in one batch (read from the cold end of the ``last_used_at`` index) down
+to ``EVICT_TO`` of it, so a full cache is not trimmed on every sheet.
+"""
+
+import json
+import time
+import hashlib
+import logging
+
+from PIL import Image
+from psycopg.types.json import Jsonb
+
+from configuration.database_config import get_cursor
+from configuration.florenc2_config import cache_model_id
+from configuration.main_config import (
+    FLORENCE_CACHE_MAX_ENTRIES,
+    FLORENCE_CACHE_EVICT_INTERVAL,
+    FLORENCE_PROFILE,
+    FLORENCE_PROFILES,
+)
+
+logger = logging.getLogger("ocr_cache.blog")
+
+EVICT_TO = 0.9
+
+
+def page_key(image: Image.Image, task_prompt: str, profile: str = FLORENCE_PROFILE,
+             model_id: str = None) -> str:
+    model_id = model_id or cache_model_id()
+    digest = hashlib.sha256()
+    settings = json.dumps(FLORENCE_PROFILES[profile], sort_keys=True)
+    digest.update(f"{model_id}\x1f{task_prompt}\x1f{settings}\x1f{image.mode}\x1f{image.size}\x1f".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class OCRCache:
+    def __init__(self, max_entries: int = FLORENCE_CACHE_MAX_ENTRIES,
+                 evict_interval: float = FLORENCE_CACHE_EVICT_INTERVAL):
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self._next_eviction = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: list) -> dict:
+        """Return ``{key: result}`` for every cached page, marking them as used."""
+        unique = list(dict.fromkeys(keys))
+        if not unique:
+            return {}
+        conn , cursor = get_cursor()
+        try:
+            cursor.execute(
+                """UPDATE ocr_cache SET last_used_at = now()
+                WHERE page_key = ANY(%s) RETURNING page_key, result""",
+                (unique,),
+            )
+            found = {row["page_key"]: row["result"] for row in cursor.fetchall()}
+            conn.commit()
+        finally:
+            conn.close()
+        self.hits += len(found)
+        self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, entries: list, task_prompt: str, model_id: str = None) -> None:
+        """Store ``(key, result)`` pairs, evicting if the periodic size check is due."""
+        if not entries:
+            return
+        model_id = model_id or cache_model_id()
+        conn , cursor = get_cursor()
+        try:
+            cursor.executemany(
+                """INSERT INTO ocr_cache (page_key, model_id, task_prompt, result)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (page_key) DO UPDATE SET result = EXCLUDED.result, last_used_at = now()""",
+                [(key, model_id, task_prompt, Jsonb(result)) for key, result in entries],
+            )
+            conn.commit()
+            if time.monotonic() >= self._next_eviction:
+                self._next_eviction = time.monotonic() + self.evict_interval
+                self.evict(cursor)
+                conn.commit()
+        finally:
+            conn.close()
+
+    def evict(self, cursor) -> int:
+        """Trim the table to ``EVICT_TO`` of ``max_entries`` once it is over; returns rows deleted."""
+        cursor.execute("SELECT count(*) AS entries FROM ocr_cache")
+        entries = cursor.fetchone()["entries"]
+        if entries <= self.max_entries:
+            return 0
+        cursor.execute(
+            """DELETE FROM ocr_cache WHERE page_key IN (
+                SELECT page_key FROM ocr_cache ORDER BY last_used_at ASC LIMIT %s
+            )""",
+            (entries - int(self.max_entries * EVICT_TO),),
+        )
+        logger.info(f"Evicted {cursor.rowcount} OCR cache entries")
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+ocr_cache = OCRCache()
@@ -0,0 +1,138 @@
+"""
+Multi-process OCR pool
+======================
+
+One Python process runs one ``generate`` at a time, so a many-core node
+running Florence-2 in-process leaves most of its cores idle.  ``OCRPool``
+is a ``BatchInferenceEngine`` runner that hands every batch to one of
+``florence.pool.processes`` worker processes instead; the engine keeps
+that many batches in flight.  Each worker loads the model once at start
+with ``threads_per_process`` torch threads, so processes x threads can be
+tuned to the machine.
+
+Pages are not pickled: a batch is copied once into a
+``multiprocessing.shared_memory`` block as packed RGB rows, the worker
+rebuilds the images from it, and only the (small) OCR results come back.
+
+A worker that dies (OOM killer, a crash in native code) breaks the whole
+executor; the pool then starts a fresh one and retries the batch once.
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+
+from PIL import Image
+
+from . import metrics
+
+from configuration.main_config import FLORENCE_POOL_PROCESSES, FLORENCE_POOL_THREADS
+
+logger = logging.getLogger("ocr_pool.blog")
+
+
+@contextmanager
+def shared_pages(images: list):
+    """Copy RGB ``images`` into one shared-memory block.
+
+    Yields ``(name, layout)`` with ``(width, height, offset)`` per image;
+    the block is unlinked on exit.
+    """
+    layout, offset = [], 0
+    for image in images:
+        layout.append((image.width, image.height, offset))
+        offset += image.width * image.height * 3
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for image, (width, height, start) in zip(images, layout):
+            rgb = image if image.mode == "RGB" else image.convert("RGB")
+            block.buf[start:start + width * height * 3] = rgb.tobytes()
+        yield block.name, layout
+    finally:
+        block.close()
+        block.unlink()
+
+
+def read_pages(name: str, layout: list) -> list:
+    """Rebuild the images of a ``shared_pages`` block (copies them out)."""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return [
+            Image.frombytes("RGB", (width, height), bytes(block.buf[start:start + width * height * 3]))
+            for width, height, start in layout
+        ]
+    finally:
+        block.close()
+
+
+def run_florence(images: list, task_prompt: str, profile: str) -> list:
+    from .inference import run_batch
+
+    return run_batch(images, task_prompt, profile)
+
+
+def _start_worker(threads: int, preload: bool) -> None:
+    if preload:
+        from configuration.florenc2_config import load_florence
+
+        # One inter-op thread: parallelism across pages comes from the pool.
+        load_florence(threads, 1)
+
+
+def _run_shared(run, name: str, layout: list, task_prompt: str, profile: str) -> list:
+    return run(read_pages(name, layout), task_prompt, profile)
+
+
+class OCRPool:
+    """``BatchInferenceEngine`` runner backed by worker processes.
+
+    ``run`` is the per-batch function executed in the workers (it must be
+    importable by name); the default loads Florence-2 at worker start.
+    """
+
+    def __init__(self, processes: int = FLORENCE_POOL_PROCESSES, threads: int = FLORENCE_POOL_THREADS,
+                 run=run_florence):
+        self.processes = processes
+        self.threads = threads
+        self.run = run
+        self._lock = threading.Lock()
+        self._executor = self._start()
+        logger.info("ocr_pool_started", extra={"data": {"processes": processes, "threads": threads}})
+
+    def _start(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the parent already runs threads (batcher, grading).
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=get_context("spawn"),
+            initializer=_start_worker,
+            initargs=(self.threads, self.run is run_florence),
+        )
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            # Concurrent batches all see the same broken executor; replace it once.
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start()
+                logger.warning("ocr_pool_restarted", extra={"data": {"processes": self.processes}})
+
+    def __call__(self, images: list, task_prompt: str, profile: str = None) -> list:
+        started = time.perf_counter()
+        with metrics.stage("ocr_pool"), shared_pages(images) as (name, layout):
+            executor = self._executor
+            try:
+                results = executor.submit(_run_shared, self.run, name, layout, task_prompt, profile).result()
+            except BrokenProcessPool:
+                self._restart(executor)
+                results = self._executor.submit(_run_shared, self.run, name, layout, task_prompt, profile).result()
+        logger.debug("ocr_pool_batch", extra={"data": {
+            "pages": len(images), "seconds": round(time.perf_counter() - started, 3),
+        }})
+        return results
+
+    def shutdown(self) -> None:
+        self._executor.shutdown()
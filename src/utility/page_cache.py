@@ -0,0 +1,161 @@
+"""
+Version-stamped page cache
+==========================
+
+The exam pages (``exam_detail``, ``exam_results``, ``sheet_detail``) only
+change when something is written to the exam, and every such write bumps
+``exams.version`` in the same transaction.  A rendered page is cached
+under its page name with the version it was rendered at, and its ETag is
+derived from that version: a request costs one primary-key lookup, and a
+browser that already has the page gets ``304 Not Modified`` without any
+rendering.
+
+Lookups hit a size-bounded in-process LRU first and then, with
+``page_cache.shared``, the ``page_cache`` table that every web worker
+shares.  Each tier keeps only the latest version of a page.  Callers
+keep pages whose key a client can vary at will (cursor pages, custom
+page sizes) out of the shared tier, and every ``page_cache.evict_interval``
+seconds a write drops rows of other template builds and trims the table
+to ``EVICT_TO`` of ``shared_max_entries``, oldest first.
+
+ETags also carry a digest of the templates, so a deploy that changes
+them never serves pages rendered by the old ones.
+"""
+
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from configuration.database_config import pool
+from configuration.main_config import (
+    PAGE_CACHE_ENABLED,
+    PAGE_CACHE_MAX_ENTRIES,
+    PAGE_CACHE_SHARED,
+    PAGE_CACHE_SHARED_MAX_ENTRIES,
+    PAGE_CACHE_EVICT_INTERVAL,
+)
+
+logger = logging.getLogger("page_cache.blog")
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent.parent / "templates"
+
+EVICT_TO = 0.9
+
+
+def templates_digest(directory: Path = TEMPLATES_DIR) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(directory.glob("*.html")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+class PageCache:
+    def __init__(self, max_entries: int = PAGE_CACHE_MAX_ENTRIES, shared: bool = PAGE_CACHE_SHARED,
+                 enabled: bool = PAGE_CACHE_ENABLED, shared_max_entries: int = PAGE_CACHE_SHARED_MAX_ENTRIES,
+                 evict_interval: float = PAGE_CACHE_EVICT_INTERVAL):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.enabled = enabled
+        self.shared_max_entries = shared_max_entries
+        self.evict_interval = evict_interval
+        self._next_eviction = 0.0
+        self.build = templates_digest()
+        self._entries: "OrderedDict[str, tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def etag(self, page: str, version) -> str:
+        return f'"{self.build}-{page}-v{version}"'
+
+    async def get(self, page: str, version, share: bool = True) -> bytes:
+        """The body of ``page`` rendered at ``version``, or ``None``."""
+        if not self.enabled:
+            return None
+        version = str(version)
+        with self._lock:
+            entry = self._entries.get(page)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(page)
+                self.memory_hits += 1
+                return entry[1]
+        if self.shared and share:
+            async with pool.connection() as conn:
+                cursor = await conn.execute(
+                    "SELECT body FROM page_cache WHERE page = %s AND version = %s", (self._key(page), version)
+                )
+                row = await cursor.fetchone()
+            if row is not None:
+                self._remember(page, version, bytes(row["body"]))
+                self.shared_hits += 1
+                return bytes(row["body"])
+        self.misses += 1
+        return None
+
+    async def put(self, page: str, version, body: bytes, share: bool = True) -> None:
+        if not self.enabled:
+            return
+        version = str(version)
+        self._remember(page, version, body)
+        if self.shared and share:
+            async with pool.connection() as conn:
+                await conn.execute(
+                    """INSERT INTO page_cache (page, version, body) VALUES (%s, %s, %s)
+                    ON CONFLICT (page) DO UPDATE
+                    SET version = EXCLUDED.version, body = EXCLUDED.body, created_at = now()""",
+                    (self._key(page), version, body),
+                )
+                if time.monotonic() >= self._next_eviction:
+                    self._next_eviction = time.monotonic() + self.evict_interval
+                    await self.evict(conn)
+
+    async def evict(self, conn) -> int:
+        """Drop other builds' pages, then trim to ``EVICT_TO`` of ``shared_max_entries``; returns rows deleted."""
+        cursor = await conn.execute(
+            "DELETE FROM page_cache WHERE left(page, %s) <> %s", (len(self.build) + 1, f"{self.build}:")
+        )
+        deleted = cursor.rowcount
+        cursor = await conn.execute("SELECT count(*) AS entries FROM page_cache")
+        entries = (await cursor.fetchone())["entries"]
+        if entries > self.shared_max_entries:
+            cursor = await conn.execute(
+                """DELETE FROM page_cache WHERE page IN (
+                    SELECT page FROM page_cache ORDER BY created_at ASC LIMIT %s
+                )""",
+                (entries - int(self.shared_max_entries * EVICT_TO),),
+            )
+            deleted += cursor.rowcount
+        if deleted:
+            logger.info(f"Evicted {deleted} shared page cache entries")
+        return deleted
+
+    def _key(self, page: str) -> str:
+        # Workers running different templates must not share rendered pages.
+        return f"{self.build}:{page}"
+
+    def _remember(self, page: str, version: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[page] = (version, body)
+            self._entries.move_to_end(page)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_rate": (self.memory_hits + self.shared_hits) / lookups if lookups else 0.0,
+        }
+
+
+page_cache = PageCache()
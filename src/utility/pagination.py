@@ -0,0 +1,46 @@
+"""
+Keyset pagination
+=================
+
+Listings seek past the last row shown instead of using ``OFFSET``: a
+page is ``WHERE (sort_key, id) > (last_key, last_id) ORDER BY sort_key,
+id LIMIT n`` (``<`` for descending order), which an index on
+``(sort_key, id)`` answers directly however deep the page is, and which
+does not skip or repeat rows when rows are added in between.
+
+The cursor handed to clients is opaque: the sort, the order and the last
+row's key, URL-safe base64 encoded.  A cursor only continues the listing
+(and sort) it came from.
+"""
+
+import json
+import base64
+
+
+def encode_cursor(sort: str, order: str, key: list) -> str:
+    raw = json.dumps({"s": sort, "o": order, "k": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: str, order: str) -> list:
+    """The key of ``token``; ``ValueError`` if it is malformed or from another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor = json.loads(raw)
+        key = cursor["k"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Malformed cursor")
+    if cursor.get("s") != sort or cursor.get("o") != order or not isinstance(key, list):
+        raise ValueError("Cursor belongs to a different sort order")
+    return key
+
+
+def split_page(rows: list, limit: int, sort: str, order: str, key) -> tuple:
+    """``rows`` fetched with ``LIMIT limit + 1`` -> ``(page, next_cursor)``.
+
+    ``key(row)`` returns the row's seek key, e.g. ``[row["name"], row["id"]]``.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(sort, order, key(page[-1]))
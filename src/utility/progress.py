@@ -0,0 +1,156 @@
+"""
+Grading progress events
+=======================
+
+``evaluate_answer_sheet`` publishes each step as it finishes with
+Postgres ``NOTIFY`` on the ``grading_progress`` channel:
+``page_rasterized`` and ``page_ocr`` per page, ``question_scored`` per
+answer, ``sheet_finished`` and (from the worker) ``sheet_failed``.  Every payload is a JSON object carrying
+``event``, ``exam_id`` and ``sheet_id``.
+
+Any web node can stream them: ``hub`` keeps one ``LISTEN`` connection per
+process and fans the events out to the Server-Sent Events subscribers of
+each exam (``GET /exams/{exam_id}/events``), so nothing polls the
+database.  Events are best effort: a subscriber that connects late or
+falls behind misses them, and publishing never fails a grading job.
+"""
+
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import psycopg
+
+from configuration.main_config import DB_URL
+
+logger = logging.getLogger("progress.blog")
+
+CHANNEL = "grading_progress"
+KEEPALIVE_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+# ======================================= Publishing (grading worker) =============================================
+
+class Progress:
+    """Publishes the events of one answer sheet on the grading connection.
+
+    Grading writes nothing until its final commit, so each event is sent
+    and committed right away instead of waiting for that commit.
+    """
+
+    def __init__(self, conn, exam_id: int, sheet_id: int):
+        self.conn = conn
+        self.base = {"exam_id": exam_id, "sheet_id": sheet_id}
+
+    def emit(self, event: str, **data) -> None:
+        self.emit_many(event, [data])
+
+    def emit_many(self, event: str, rows: list) -> None:
+        """One ``event`` per dict in ``rows``, in a single round trip."""
+        if not rows:
+            return
+        payloads = [json.dumps({"event": event, **self.base, **row}, default=str) for row in rows]
+        try:
+            self.conn.execute(
+                "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload", (CHANNEL, payloads)
+            )
+            self.conn.commit()
+        except psycopg.Error as e:
+            self.conn.rollback()
+            logger.warning("progress_publish_failed", extra={"data": {**self.base, "event": event, "error": str(e)}})
+
+
+class _Silent(Progress):
+    def __init__(self):
+        pass
+
+    def emit_many(self, event: str, rows: list) -> None:
+        pass
+
+
+SILENT = _Silent()
+
+
+def publish_sheet(sheet_id: int, event: str, **data) -> None:
+    """Publish one event for ``sheet_id`` on its own connection, looking its exam up in the same statement."""
+    payload = json.dumps({"event": event, "sheet_id": sheet_id, **data}, default=str)
+    try:
+        with psycopg.connect(DB_URL, autocommit=True) as conn:
+            conn.execute(
+                """
+                SELECT pg_notify(%s, (%s::jsonb || jsonb_build_object('exam_id', students.exam_id))::text)
+                FROM answer_sheets JOIN students ON answer_sheets.student_id = students.id
+                WHERE answer_sheets.id = %s
+                """,
+                (CHANNEL, payload, sheet_id),
+            )
+    except psycopg.Error as e:
+        logger.warning("progress_publish_failed", extra={"data": {"sheet_id": sheet_id, "event": event, "error": str(e)}})
+
+
+# ======================================= Streaming (web tier) ====================================================
+
+def format_sse(event: dict) -> str:
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event)}\n\n"
+
+
+class ProgressHub:
+    """One ``LISTEN`` connection per process, fanned out to per-exam queues."""
+
+    def __init__(self, channel: str = CHANNEL, reconnect_delay: float = 2.0):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._subscribers: dict[int, set] = {}
+        self._task = None
+
+    @asynccontextmanager
+    async def subscribe(self, exam_id: int):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(exam_id, set()).add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers.get(exam_id, set())
+            queues.discard(queue)
+            if not queues:
+                self._subscribers.pop(exam_id, None)
+
+    def dispatch(self, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        for queue in self._subscribers.get(event.get("exam_id"), ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass  # a stalled client loses events rather than memory
+
+    async def _listen(self) -> None:
+        # Runs while anyone is subscribed; reconnects after database errors.
+        while self._subscribers:
+            try:
+                async with await psycopg.AsyncConnection.connect(DB_URL, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {self.channel}")
+                    while self._subscribers:
+                        async for notify in conn.notifies(timeout=KEEPALIVE_SECONDS):
+                            self.dispatch(notify.payload)
+            except psycopg.Error as e:
+                logger.warning("progress_listen_failed", extra={"data": {"error": str(e)}})
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+
+hub = ProgressHub()
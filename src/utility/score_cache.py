@@ -0,0 +1,130 @@
+"""
+Score memoization
+=================
+
+Many students write the same short answer, so scores are memoized on
+``(normalized student answer, ideal answer, point value, model id)``.
+Lookups hit an in-process LRU first and then the ``score_cache`` table,
+which every grading worker shares.
+
+Each entry also records a ``rubric_hash`` of the ideal answer and point
+value so that editing a question can drop every score computed against
+its old rubric (``invalidate``).
+"""
+
+import re
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+from configuration.database_config import get_cursor
+from configuration.main_config import SCORING_CACHE_SIZE
+
+logger = logging.getLogger("score_cache.blog")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_answer(answer: str) -> str:
+    return _WHITESPACE.sub(" ", answer).strip().strip(".").lower()
+
+
+def rubric_hash(ideal_answer: str, point_value: float) -> str:
+    return hashlib.sha256(f"{ideal_answer}\x1f{float(point_value)!r}".encode()).hexdigest()
+
+
+def cache_key(student_answer: str, ideal_answer: str, point_value: float, model_id: str) -> str:
+    raw = f"{model_id}\x1f{normalize_answer(student_answer)}\x1f{ideal_answer}\x1f{float(point_value)!r}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ScoreCache:
+    def __init__(self, max_entries: int = SCORING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, rubric: str, score: float) -> None:
+        self._entries[key] = (rubric, score)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, keys: list) -> dict:
+        """Return ``{key: score}`` for every key found in either tier."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key][1]
+            self.memory_hits += len(found)
+        remaining = [key for key in dict.fromkeys(keys) if key not in found]
+        if remaining:
+            conn , cursor = get_cursor()
+            try:
+                cursor.execute(
+                    "SELECT cache_key, rubric_hash, score FROM score_cache WHERE cache_key = ANY(%s)",
+                    (remaining,),
+                )
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+            with self._lock:
+                for row in rows:
+                    self._remember(row["cache_key"], row["rubric_hash"], row["score"])
+                    found[row["cache_key"]] = row["score"]
+                self.db_hits += len(rows)
+                self.misses += len(remaining) - len(rows)
+        return found
+
+    def put_many(self, entries: list) -> None:
+        """Store ``(key, rubric_hash, model_id, score)`` tuples in both tiers."""
+        if not entries:
+            return
+        with self._lock:
+            for key, rubric, _, score in entries:
+                self._remember(key, rubric, score)
+        conn , cursor = get_cursor()
+        try:
+            cursor.executemany(
+                """INSERT INTO score_cache (cache_key, rubric_hash, model_id, score)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (cache_key) DO UPDATE SET score = EXCLUDED.score""",
+                entries,
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def invalidate(self, ideal_answer: str, point_value: float) -> int:
+        """Forget every score computed against this rubric. Returns rows deleted."""
+        rubric = rubric_hash(ideal_answer, point_value)
+        with self._lock:
+            for key in [k for k, (r, _) in self._entries.items() if r == rubric]:
+                del self._entries[key]
+        conn , cursor = get_cursor()
+        try:
+            cursor.execute("DELETE FROM score_cache WHERE rubric_hash = %s", (rubric,))
+            deleted = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return deleted
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+        }
+
+
+score_cache = ScoreCache()
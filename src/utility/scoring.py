@@ -0,0 +1,486 @@
+"""
+LLM answer scoring
+==================
+
+Pluggable async backends for grading student answers.  All answers of a
+sheet are scored concurrently by ``score_answers``, bounded by a
+semaphore and a process-wide token bucket so concurrent sheets cannot
+exceed the provider's rate limit.  Throttled or timed-out calls are
+retried with exponential backoff and full jitter.
+
+Backends (``scoring.backend`` in ``configuration/config.yml``):
+
+* ``replicate`` -- Llama-3-8B-Instruct on Replicate (production).
+* ``stub`` -- deterministic local scorer with a configurable latency,
+  for offline throughput testing.
+
+Scores are memoized through ``score_cache`` so repeated answers to the
+same question cost one model call.
+
+Modes (``scoring.mode``, overridable per exam):
+
+* ``question`` -- one prompt per answer.
+* ``sheet`` -- all answers of a sheet packed into prompts of at most
+  ``scoring.sheet_token_budget`` tokens, each asking for a JSON array of
+  scores.  Entries the model leaves missing or out of range are re-scored
+  one by one.
+
+Tiered grading (``score_tiered``) puts a RapidFuzz fast path in front of
+the model: answers whose similarity to the ideal answer is at least the
+high threshold get full marks, those at or below the low threshold get
+zero, and only the band in between is sent to the LLM.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import difflib
+import threading
+import weakref
+import logging
+
+from rapidfuzz import fuzz, process, utils
+
+from configuration.main_config import (
+    SCORING_BACKEND,
+    SCORING_MODEL,
+    SCORING_CONCURRENCY,
+    SCORING_RATE_PER_SECOND,
+    SCORING_BURST,
+    SCORING_TIMEOUT,
+    SCORING_MAX_RETRIES,
+    SCORING_RETRY_BASE,
+    SCORING_STUB_LATENCY_MS,
+    SCORING_CACHE_ENABLED,
+    SCORING_MODE,
+    SCORING_SHEET_TOKEN_BUDGET,
+    SCORING_TIERED,
+    SCORING_TIER_HIGH,
+    SCORING_TIER_LOW,
+)
+from .score_cache import score_cache, cache_key, rubric_hash
+from . import metrics
+
+logger = logging.getLogger("scoring.blog")
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_ARRAY = re.compile(r"\[[^\[\]]*\]")
+
+SCORING_MODES = ("question", "sheet")
+
+
+def build_prompt(student_answer: str, ideal_answer: str, point_value: float) -> str:
+    return f"""
+    You are grading a short answer question.  The ideal answer is:
+    "{ideal_answer}"
+
+    The student's answer is:
+    "{student_answer}"
+
+    Respond with a single number between 0 and {point_value} representing
+    the score.  Do not provide explanations, only the number.
+    """
+
+
+def parse_score(output, point_value: float):
+    """Read the first number from the (possibly token-streamed) model output.
+
+    The result is clamped to ``[0, point_value]``.  Output without a
+    number gives ``None``: it is not a score, so it must not be cached.
+    """
+    if output is None:
+        return None
+    if not isinstance(output, str):
+        output = "".join(str(token) for token in output)
+    match = _NUMBER.search(output)
+    if match is None:
+        return None
+    return min(max(float(match.group()), 0.0), float(point_value))
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English prose; no tokenizer needed.
+    return len(text) // 4 + 1
+
+
+def build_sheet_entry(number: int, student_answer: str, ideal_answer: str, point_value: float) -> str:
+    return f"""
+    {number}. Points: {point_value}
+    Ideal answer: "{ideal_answer}"
+    Student answer: "{student_answer}"
+"""
+
+
+def build_sheet_prompt(items: list) -> str:
+    entries = "".join(build_sheet_entry(n, *item) for n, item in enumerate(items, 1))
+    return f"""
+    You are grading {len(items)} short answer questions.  For each numbered
+    item, compare the student's answer with the ideal answer and give a
+    score between 0 and the item's points.
+{entries}
+    Respond with a JSON array of exactly {len(items)} numbers, the scores in
+    item order, for example [1, 0.5, 2].  Do not provide explanations, only
+    the array.
+    """
+
+
+def chunk_items(items: list, token_budget: int = SCORING_SHEET_TOKEN_BUDGET) -> list:
+    """Split ``items`` into consecutive chunks whose sheet prompt fits ``token_budget``."""
+    overhead = estimate_tokens(build_sheet_prompt([]))
+    chunks, current, used = [], [], overhead
+    for item in items:
+        cost = estimate_tokens(build_sheet_entry(len(current) + 1, *item))
+        if current and used + cost > token_budget:
+            chunks.append(current)
+            current, used = [], overhead
+        current.append(item)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def parse_sheet_scores(output, point_values: list) -> list:
+    """Read a JSON array of scores, one per item.
+
+    Returns a list aligned with ``point_values`` holding ``None`` for every
+    score that is missing, not a number or outside ``[0, point_value]``;
+    an array of the wrong length invalidates all of them.
+    """
+    if output is None:
+        return [None] * len(point_values)
+    if not isinstance(output, str):
+        output = "".join(str(token) for token in output)
+    for match in _ARRAY.finditer(output):
+        try:
+            values = json.loads(match.group())
+        except ValueError:
+            continue
+        if len(values) == len(point_values):
+            break
+    else:
+        return [None] * len(point_values)
+    return [
+        float(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= float(points)
+        else None
+        for value, points in zip(values, point_values)
+    ]
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire`` sleeps until a token is free.
+
+    It is shared by every event loop in the process (each grading thread
+    runs its own), so the lock is a ``threading.Lock`` and waiting happens
+    with ``asyncio.sleep`` outside it.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ThrottledError(Exception):
+    pass
+
+
+class ScoringError(Exception):
+    """Some answers of a sheet could not be scored; the grading job should be retried."""
+
+
+class ScoringBackend:
+    model_id = ""
+
+    async def complete(self, prompt: str) -> str:
+        raise NotImplementedError
+
+
+class ReplicateBackend(ScoringBackend):
+    def __init__(self, model_id: str = SCORING_MODEL):
+        self.model_id = model_id
+        # replicate's async HTTP client is bound to the loop that created it.
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        import replicate
+
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            self._clients[loop] = replicate.Client(api_token=os.getenv("REPLICATE_API_TOKEN"))
+        return self._clients[loop]
+
+    async def complete(self, prompt: str) -> str:
+        from replicate.exceptions import ReplicateError
+
+        try:
+            output = await self._client().async_run(self.model_id, input={"prompt": prompt})
+        except ReplicateError as e:
+            if getattr(e, "status", None) == 429:
+                raise ThrottledError(str(e)) from e
+            raise
+        if hasattr(output, "__aiter__"):
+            return "".join([str(token) async for token in output])
+        if isinstance(output, str):
+            return output
+        return "".join(str(token) for token in output)
+
+
+class StubBackend(ScoringBackend):
+    """Deterministic offline scorer: string similarity times the point value."""
+
+    model_id = "stub/similarity"
+    _FIELDS = re.compile(
+        r'ideal answer is:\s*"(?P<ideal>.*?)"\s*The student\'s answer is:\s*"(?P<student>.*?)"\s*'
+        r"Respond with a single number between 0 and (?P<points>[\d.]+)",
+        re.DOTALL,
+    )
+
+    _SHEET_ENTRIES = re.compile(
+        r'\d+\. Points: (?P<points>[\d.]+)\s*Ideal answer: "(?P<ideal>.*?)"\s*'
+        r'Student answer: "(?P<student>.*?)"\n',
+        re.DOTALL,
+    )
+
+    def __init__(self, latency_ms: float = SCORING_STUB_LATENCY_MS, item_latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.item_latency = item_latency_ms / 1000.0
+
+    @staticmethod
+    def _score(student: str, ideal: str, points: str) -> float:
+        ratio = difflib.SequenceMatcher(None, student.lower(), ideal.lower()).ratio()
+        return round(ratio * float(points), 2)
+
+    async def complete(self, prompt: str) -> str:
+        entries = list(self._SHEET_ENTRIES.finditer(prompt))
+        # Generation time grows with the number of scores requested.
+        await asyncio.sleep(self.latency + self.item_latency * max(len(entries), 1))
+        if entries:
+            return json.dumps([self._score(m["student"], m["ideal"], m["points"]) for m in entries])
+        match = self._FIELDS.search(prompt)
+        if match is None:
+            return "0"
+        return f"{self._score(match['student'], match['ideal'], match['points'])}"
+
+
+_backend = None
+_bucket = TokenBucket(SCORING_RATE_PER_SECOND, SCORING_BURST)
+
+
+def get_backend() -> ScoringBackend:
+    global _backend
+    if _backend is None:
+        if SCORING_BACKEND == "stub":
+            _backend = StubBackend()
+        elif SCORING_BACKEND == "replicate":
+            _backend = ReplicateBackend()
+        else:
+            raise ValueError(f"Unknown scoring backend '{SCORING_BACKEND}'")
+    return _backend
+
+
+def set_backend(backend: ScoringBackend) -> None:
+    global _backend
+    _backend = backend
+
+
+def set_rate_limit(rate_per_second: float, burst: int) -> None:
+    global _bucket
+    _bucket = TokenBucket(rate_per_second, burst)
+
+
+async def complete_with_retry(backend: ScoringBackend, prompt: str,
+                              timeout: float = SCORING_TIMEOUT,
+                              max_retries: int = SCORING_MAX_RETRIES, mode: str = "question") -> str:
+    metrics.SCORING_PROMPT_TOKENS.labels(mode).inc(estimate_tokens(prompt))
+    for attempt in range(max_retries + 1):
+        metrics.SCORING_CALLS.labels(mode).inc()
+        await _bucket.acquire()
+        try:
+            return await asyncio.wait_for(backend.complete(prompt), timeout)
+        except (ThrottledError, asyncio.TimeoutError) as e:
+            if attempt == max_retries:
+                raise
+            delay = random.uniform(0, SCORING_RETRY_BASE * 2 ** attempt)
+            logger.warning(f"Scoring call {type(e).__name__}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+async def score_answers(items: list, backend: ScoringBackend = None,
+                        concurrency: int = SCORING_CONCURRENCY,
+                        use_cache: bool = SCORING_CACHE_ENABLED, mode: str = SCORING_MODE,
+                        on_score=None) -> list:
+    """Score ``(student_answer, ideal_answer, point_value)`` triples concurrently.
+
+    Returns the scores in input order; ``on_score(index, score)`` is also
+    called as each score is known (per call, or per prompt in sheet
+    mode).  Cached scores are reused and identical answers in ``items``
+    are scored once.  If a call still fails after its retries, the scores
+    that did succeed are cached and ``ScoringError`` is raised, so the
+    grading job fails and is retried instead of storing zeros.
+    """
+    if mode not in SCORING_MODES:
+        raise ValueError(f"Unknown scoring mode '{mode}'")
+    backend = backend or get_backend()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    keys = [cache_key(*item, backend.model_id) for item in items]
+    cached = await asyncio.to_thread(score_cache.get_many, keys) if use_cache else {}
+    pending, positions = {}, {}
+    for index, (key, item) in enumerate(zip(keys, items)):
+        positions.setdefault(key, []).append(index)
+        if key not in cached:
+            pending.setdefault(key, item)
+    errors = []
+
+    def report(key, score):
+        if on_score is not None and score is not None:
+            for index in positions[key]:
+                on_score(index, score)
+
+    for key in cached:
+        report(key, cached[key])
+
+    async def score_one(student_answer, ideal_answer, point_value, call_mode="question"):
+        async with semaphore:
+            try:
+                output = await complete_with_retry(
+                    backend, build_prompt(student_answer, ideal_answer, point_value), mode=call_mode
+                )
+            except Exception as e:
+                logger.error(f"Error is {e}")
+                errors.append(e)
+                return None
+        score = parse_score(output, point_value)
+        if score is None:
+            logger.warning(f"Unparseable score from {backend.model_id}: {str(output)[:200]!r}")
+        return score
+
+    async def score_key(key):
+        score = await score_one(*pending[key])
+        report(key, score)
+        return score
+
+    async def score_chunk(chunk_keys):
+        chunk = [pending[key] for key in chunk_keys]
+        async with semaphore:
+            try:
+                output = await complete_with_retry(backend, build_sheet_prompt(chunk), mode="sheet")
+            except Exception as e:
+                logger.error(f"Error is {e}")
+                output = None
+        scores = parse_sheet_scores(output, [item[2] for item in chunk])
+        failed = [n for n, score in enumerate(scores) if score is None]
+        if failed:
+            logger.warning(f"Sheet scoring returned {len(failed)}/{len(chunk)} unusable scores, re-scoring them")
+            retried = await asyncio.gather(*(score_one(*chunk[n], call_mode="fallback") for n in failed))
+            for n, score in zip(failed, retried):
+                scores[n] = score
+        for key, score in zip(chunk_keys, scores):
+            report(key, score)
+        return scores
+
+    if mode == "sheet":
+        pending_keys, key_chunks = list(pending), []
+        for chunk in chunk_items(list(pending.values())):
+            key_chunks.append(pending_keys[:len(chunk)])
+            pending_keys = pending_keys[len(chunk):]
+        results = [score for chunk_scores in await asyncio.gather(*map(score_chunk, key_chunks)) for score in chunk_scores]
+    else:
+        results = await asyncio.gather(*map(score_key, pending))
+    scored = dict(zip(pending, results))
+    if use_cache:
+        await asyncio.to_thread(score_cache.put_many, [
+            (key, rubric_hash(item[1], item[2]), backend.model_id, scored[key])
+            for key, item in pending.items()
+            if scored[key] is not None
+        ])
+    failed = sum(score is None for score in scored.values())
+    if failed:
+        raise ScoringError(f"{failed} of {len(pending)} answers could not be scored") from (errors[0] if errors else None)
+    return [cached.get(key, scored.get(key)) for key in keys]
+
+
+def tier_thresholds(tier_high: float = None, tier_low: float = None):
+    """``(high, low)`` similarity thresholds for an exam, or ``None`` for LLM-only grading.
+
+    Thresholds set on the exam win; otherwise ``scoring.tiered`` decides
+    whether the configured defaults apply.
+    """
+    if tier_high is not None and tier_low is not None:
+        return float(tier_high), float(tier_low)
+    return (float(SCORING_TIER_HIGH), float(SCORING_TIER_LOW)) if SCORING_TIERED else None
+
+
+def triage(items: list, high: float, low: float) -> list:
+    """Fast-path scores from string similarity (0-100), ``None`` where the LLM must decide.
+
+    Answers are grouped by ideal answer so each question costs one
+    vectorized ``cdist`` call over all of its answers.
+    """
+    by_ideal = {}
+    for index, (_, ideal_answer, _) in enumerate(items):
+        by_ideal.setdefault(ideal_answer, []).append(index)
+    scores = [None] * len(items)
+    for ideal_answer, indexes in by_ideal.items():
+        similarity = process.cdist(
+            [items[index][0] or "" for index in indexes], [ideal_answer],
+            scorer=fuzz.token_sort_ratio, processor=utils.default_process, workers=-1,
+        )[:, 0]
+        for index, value in zip(indexes, similarity):
+            if value >= high:
+                scores[index] = float(items[index][2])
+            elif value <= low:
+                scores[index] = 0.0
+    return scores
+
+
+async def score_tiered(items: list, thresholds=None, on_score=None, **kwargs) -> tuple:
+    """Score triples through the RapidFuzz tiers, escalating the middle band.
+
+    Returns ``(scores, graded_by)`` where ``graded_by`` is ``"fuzzy_full"``,
+    ``"fuzzy_zero"`` or ``"llm"`` per item; ``on_score(index, score,
+    graded_by)`` is called as each score is known.  Extra keyword
+    arguments go to ``score_answers``.
+    """
+    if thresholds is None:
+        on_llm = None if on_score is None else lambda index, score: on_score(index, score, "llm")
+        return await score_answers(items, on_score=on_llm, **kwargs), ["llm"] * len(items)
+    fast = triage(items, *thresholds)
+    escalated = [index for index, score in enumerate(fast) if score is None]
+    graded_by = ["llm" if score is None else "fuzzy_zero" if score == 0 else "fuzzy_full" for score in fast]
+    if on_score is not None:
+        for index, score in enumerate(fast):
+            if score is not None:
+                on_score(index, score, graded_by[index])
+    on_llm = None if on_score is None else lambda n, score: on_score(escalated[n], score, "llm")
+    llm_scores = await score_answers(
+        [items[index] for index in escalated], on_score=on_llm, **kwargs
+    ) if escalated else []
+    scores = list(fast)
+    for index, score in zip(escalated, llm_scores):
+        scores[index] = score
+    for tier in ("fuzzy_full", "fuzzy_zero", "llm"):
+        metrics.SCORING_TIERS.labels(tier).inc(graded_by.count(tier))
+    return scores, graded_by
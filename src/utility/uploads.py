@@ -0,0 +1,174 @@
+"""
+Streaming multipart uploads
+===========================
+
+``receive_upload`` parses a ``multipart/form-data`` request straight
+from ``request.stream()``; ``read_body`` reads any other body under the
+same limit.  File parts are written to disk chunk by chunk
+while their SHA-256 digest is computed, so peak memory per upload is
+bounded by ``uploads.chunk_size`` instead of the file size.  Uploads
+larger than ``uploads.max_bytes`` are rejected with 413 as soon as the
+limit is crossed (or up front when ``Content-Length`` already exceeds
+it).
+"""
+
+import os
+import uuid
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from configuration.main_config import UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE
+
+logger = logging.getLogger("uploads.blog")
+
+# Plain form fields (student_id, ...) are tiny; anything bigger is abuse.
+MAX_FIELD_BYTES = 64 * 1024
+# Allowance for part headers and boundaries on top of the file limit.
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+@dataclass
+class StoredFile:
+    field_name: str
+    filename: str
+    path: Path
+    size: int
+    sha256: str
+
+
+@dataclass
+class _Part:
+    headers: dict = field(default_factory=dict)
+    name: str = ""
+    filename: str = None
+    data: bytearray = field(default_factory=bytearray)
+    handle: object = None
+    path: Path = None
+    size: int = 0
+    hasher: object = None
+
+
+def _boundary(request: Request) -> bytes:
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Invalid multipart request")
+    return params[b"boundary"]
+
+
+async def receive_upload(request: Request, dest_dir: Path, allowed_suffixes: tuple = (".pdf",),
+                         max_bytes: int = UPLOAD_MAX_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """Stream a multipart request to ``dest_dir``.
+
+    Returns ``(fields, files)``: plain fields decoded as ``str`` and a
+    ``StoredFile`` per file part, keyed by field name.  On any error the
+    partially written files are removed.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail="Upload exceeds the maximum allowed size")
+
+    fields: dict[str, str] = {}
+    files: dict[str, StoredFile] = {}
+    written: list[Path] = []
+    current = _Part()
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        nonlocal current
+        current = _Part()
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        current.headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, options = parse_options_header(current.headers.get(b"content-disposition", b""))
+        current.name = options.get(b"name", b"").decode(errors="ignore")
+        if b"filename" not in options:
+            return
+        current.filename = os.path.basename(options[b"filename"].decode(errors="ignore"))
+        if allowed_suffixes and not current.filename.lower().endswith(allowed_suffixes):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Only {', '.join(allowed_suffixes)} files are supported",
+            )
+        current.path = dest_dir / f"{uuid.uuid4().hex}_{current.filename}"
+        current.handle = open(current.path, "wb")
+        current.hasher = hashlib.sha256()
+        written.append(current.path)
+
+    def on_part_data(data, start, end):
+        if current.handle is None:
+            if len(current.data) + end - start > MAX_FIELD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Form field '{current.name}' is too large")
+            current.data.extend(data[start:end])
+            return
+        current.size += end - start
+        if current.size > max_bytes:
+            raise HTTPException(status_code=413, detail="Upload exceeds the maximum allowed size")
+        chunk = memoryview(data)[start:end]
+        current.hasher.update(chunk)
+        current.handle.write(chunk)
+
+    def on_part_end():
+        if current.handle is None:
+            fields[current.name] = current.data.decode(errors="ignore")
+            return
+        current.handle.close()
+        files[current.name] = StoredFile(
+            field_name=current.name,
+            filename=current.filename,
+            path=current.path,
+            size=current.size,
+            sha256=current.hasher.hexdigest(),
+        )
+
+    parser = MultipartParser(_boundary(request), {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+
+    try:
+        async for received in request.stream():
+            for offset in range(0, len(received), chunk_size):
+                parser.write(received[offset:offset + chunk_size])
+        parser.finalize()
+    except BaseException:
+        if current.handle is not None and not current.handle.closed:
+            current.handle.close()
+        for path in written:
+            path.unlink(missing_ok=True)
+        raise
+    return fields, files
+
+
+async def read_body(request: Request, max_bytes: int = UPLOAD_MAX_BYTES) -> bytes:
+    """The request body, or 413 as soon as it exceeds ``max_bytes`` (with or without ``Content-Length``)."""
+    body = bytearray()
+    async for received in request.stream():
+        body.extend(received)
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail="Upload exceeds the maximum allowed size")
+    return bytes(body)
@@ -3,196 +3,496 @@ from pathlib import Path
 from dotenv import load_dotenv
 from PIL import Image 
 from configuration.database_config import get_cursor
-from configuration.florenc2_config import processor , model 
-from langchain_community.llms import Replicate
+from configuration.main_config import FLORENCE_DEBUG_SPILL_PAGES , FLORENCE_MODE , FLORENCE_CACHE_ENABLED , SCORING_MODE
+from .inference import get_engine , run_batch
+from .inference_client import run_remote
+from .ocr_cache import ocr_cache , page_key
+from .ingest import page_count
+from . import scoring
+from . import metrics
+from .progress import Progress , SILENT
+from repository.jobs import QUEUE_RESCORE
 
 from pdf2image import convert_from_path
 
-import replicate , os
+import asyncio
+import os
+from collections import Counter
+from concurrent.futures import as_completed
 import json
 import time
+import logging
 
 
 load_dotenv() 
+logger = logging.getLogger("utilities.blog")
 
 # PyMuPDF (imported as fitz) allows us to extract text from PDF files.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
+# Only used when florence.debug_spill_pages is on.
 images_from_pdf = BASE_DIR / "images_from_pdf" 
-images_from_pdf.mkdir(parents=True,exist_ok=True)
-
-client = replicate.Client(api_token=os.getenv("REPLICATE_API_TOKEN"))
 
 def run_example(image , task_prompt, text_input=None):
-    
-    prompt = task_prompt if text_input is None else task_prompt + text_input
-
-    inputs = processor(text=task_prompt, images=image, return_tensors="pt").to(model.device)
-
-    generated_ids = model.generate(
-        input_ids=inputs["input_ids"],          # no .cuda()
-        pixel_values=inputs["pixel_values"],    # no .cuda()
-        max_new_tokens=1024,
-        early_stopping=False,
-        do_sample=False,
-        num_beams=3,
-        use_cache=False
-    )
-    generated_text = processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
-    parsed_answer = processor.post_process_generation(
-        generated_text,
-        task=task_prompt,
-        image_size=image.size   # (width, height)
-    )
-    return parsed_answer
+    # Single-image entry point; grading goes through the batching engine.
+    return run_batch([image], task_prompt)[0]
 
-def extract_with_paddleocr(image_path: str) -> str:
-    image = Image.open(image_path).convert("RGB")
-    task_prompt = "<OCR_WITH_REGION>"
-    ocr_ans = run_example(image, task_prompt)
-    return ocr_ans
+def to_rgb_image(page) -> Image.Image:
+    """Accept a PIL image, a NumPy HxWxC buffer or a path and return an RGB image."""
+    if isinstance(page, Image.Image):
+        return page if page.mode == "RGB" else page.convert("RGB")
+    if isinstance(page, (str, Path)):
+        with Image.open(page) as image:
+            return image.convert("RGB")
+    # NumPy arrays (and anything else exposing the array interface)
+    return Image.fromarray(page).convert("RGB")
 
-def extract_text_from_pdf(pdf_path: Path) -> list:
-    pdf_path = Path(pdf_path).resolve()
+def run_ocr(images: list, task_prompt: str, on_result=None) -> list:
+    """OCR ``images`` (results in order, exceptions in place of failed pages).
 
-    if not pdf_path.exists():
-        raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+    ``on_result(index, result)`` is called in this thread as each page
+    finishes, in completion order.
+    """
+    if FLORENCE_MODE == "server":
+        # One request per call: the server answers for all pages at once.
+        results = run_remote(images, task_prompt, return_exceptions=True)
+        for index, result in enumerate(results):
+            if on_result is not None:
+                on_result(index, result)
+        return results
+    engine = get_engine()
+    futures = {engine.submit(image, task_prompt): index for index, image in enumerate(images)}
+    results = [None] * len(images)
+    for future in as_completed(futures):
+        index = futures[future]
+        results[index] = future.exception() or future.result()
+        if on_result is not None:
+            on_result(index, results[index])
+    return results
 
-    if not os.access(pdf_path, os.R_OK):
-        raise PermissionError(f"No read access to: {pdf_path}")
+def extract_with_paddleocr(pages: list, use_cache: bool = FLORENCE_CACHE_ENABLED,
+                           task_prompt: str = "<OCR_WITH_REGION>", on_result=None) -> list:
+    """OCR ``pages`` through the cache; ``on_result`` as in ``run_ocr``."""
+    images = [to_rgb_image(page) for page in pages]
+    metrics.OCR_PIXELS.inc(sum(image.width * image.height for image in images))
+    if not use_cache:
+        return run_ocr(images, task_prompt, on_result)
+
+    # Pages seen before (regrades, identical re-uploads) never reach the model.
+    keys = [page_key(image, task_prompt) for image in images]
+    results = ocr_cache.get_many(keys)
+    missing, positions = {}, {}
+    for index, (key, image) in enumerate(zip(keys, images)):
+        if key in results:
+            if on_result is not None:
+                on_result(index, results[key])
+            continue
+        missing.setdefault(key, image)
+        positions.setdefault(key, []).append(index)
+    if missing:
+        missing_keys = list(missing)
+
+        def on_fresh(index, value):
+            for position in positions[missing_keys[index]]:
+                if on_result is not None:
+                    on_result(position, value)
 
-    images = convert_from_path(pdf_path)
-    all_answers = []  
+        fresh = dict(zip(missing_keys, run_ocr(list(missing.values()), task_prompt, on_fresh)))
+        ocr_cache.put_many(
+            [(key, value) for key, value in fresh.items() if not isinstance(value, Exception)],
+            task_prompt,
+        )
+        results.update(fresh)
+    logger.info("ocr_cache", extra={"data": {
+        "pages": len(images), "cached": len(images) - len(missing), **ocr_cache.stats()
+    }})
+    return [results[key] for key in keys]
+
+def spill_pages(images: list) -> list:
+    """Debug only: round-trip pages through PNG files in images_from_pdf/.
 
+    Returns the reloaded images and logs what the round trip costs per
+    page, i.e. the time the default in-memory handoff saves.
+    """
+    images_from_pdf.mkdir(parents=True, exist_ok=True)
+    reloaded = []
+    started = time.perf_counter()
     for i, img in enumerate(images):
         timestamp = int(time.time() * 1000) + i  # Use milliseconds + page index for unique names
         image_path = os.path.join(images_from_pdf, f"page_{timestamp}.png")
         img.save(image_path, "PNG")
-        
         try:
-            value = extract_with_paddleocr(image_path)
-            print(f"Raw OCR result for page {i+1}: {value}")
-            if "<OCR_WITH_REGION>" not in value:
-                print(f"Warning: Page {i+1} missing OCR_WITH_REGION key")
-                continue
-                
-            ocr_data = value["<OCR_WITH_REGION>"]
-            print("=========================================================")
-            print(f"Page {i+1} OCR data:")
-            print(ocr_data)
-            print("=========================================================")
-   
-            # Extract answers from this page
-            if "labels" not in ocr_data:
-                print(f"Warning: Page {i+1} missing labels key in OCR data")
-                continue
-                
-            page_answers = ocr_data["labels"]
-            if isinstance(page_answers, list):
-                all_answers.extend(page_answers)
-                print(f"Page {i+1}: Added {len(page_answers)} answers")
-            else:
-                all_answers.append(page_answers)
-                print(f"Page {i+1}: Added 1 answer")
-                
-        except Exception as e:
-            print(f"Error processing page {i+1}: {e}")
-            continue
+            reloaded.append(to_rgb_image(image_path))
         finally:
             # Clean up the temporary image file
             try:
                 os.remove(image_path)
-            except:
+            except OSError:
                 pass
+    per_page_ms = (time.perf_counter() - started) * 1000 / max(len(images), 1)
+    logger.debug("disk_spill", extra={"data": {"pages": len(images), "ms_per_page": round(per_page_ms, 1)}})
+    return reloaded
+
+def rasterize_pdf(pdf_path: Path, pages: list = None, progress: Progress = SILENT) -> list:
+    """Render the PDF's ``pages`` (1-based, default all) as RGB images, in that order.
+
+    Pages are rendered one at a time, so only the pages asked for are
+    rendered and ``page_rasterized`` goes out as each one is ready.
+    """
+    pdf_path = Path(pdf_path).resolve()
+
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+    if not os.access(pdf_path, os.R_OK):
+        raise PermissionError(f"No read access to: {pdf_path}")
+
+    if pages is None:
+        pages = range(1, page_count(pdf_path) + 1)
+    images = []
+    with metrics.stage("rasterize"):
+        for number in pages:
+            images.extend(convert_from_path(pdf_path, first_page=number, last_page=number))
+            progress.emit("page_rasterized", page=number, pages=len(pages))
+
+    # Pages are handed to OCR in memory; spilling to PNG is opt-in for debugging.
+    with metrics.stage("handoff"):
+        if FLORENCE_DEBUG_SPILL_PAGES:
+            images = spill_pages(images)
+        else:
+            images = [to_rgb_image(img) for img in images]
+    metrics.PAGES.inc(len(images))
+    return images
+
+def page_answers(value, page: dict) -> list:
+    """The answer labels of one ``<OCR_WITH_REGION>`` page result (logged and empty on failure)."""
+    try:
+        if isinstance(value, Exception):
+            raise value
+        logger.debug("ocr_page_raw", extra={"data": {**page, "result": value}})
+        if "<OCR_WITH_REGION>" not in value:
+            logger.warning("ocr_page_missing_task", extra={"data": page})
+            return []
+
+        ocr_data = value["<OCR_WITH_REGION>"]
+        # Extract answers from this page
+        if "labels" not in ocr_data:
+            logger.warning("ocr_page_missing_labels", extra={"data": page})
+            return []
+
+        labels = ocr_data["labels"]
+        labels = labels if isinstance(labels, list) else [labels]
+        logger.debug("ocr_page_answers", extra={"data": {**page, "answers": len(labels)}})
+        return labels
+
+    except Exception as e:
+        metrics.ERRORS.labels("ocr_page").inc()
+        logger.error("ocr_page_failed", extra={"data": {**page, "error": f"{type(e).__name__}: {e}"}})
+        return []
+
+def extract_text_from_pdf(pdf_path: Path, use_ocr_cache: bool = FLORENCE_CACHE_ENABLED,
+                          progress: Progress = SILENT) -> list:
+    pdf_path = Path(pdf_path).resolve()
+    images = rasterize_pdf(pdf_path, progress=progress)
+    answers_by_page = [[] for _ in images]
+
+    def on_page(index, value):
+        answers_by_page[index] = page_answers(value, {"pdf": pdf_path.name, "page": index + 1})
+        progress.emit("page_ocr", page=index + 1, pages=len(images), answers=len(answers_by_page[index]))
+
+    # All pages go to the engine together so they share padded batches
+    # (with pages from any other sheet being graded concurrently).
+    extract_with_paddleocr(images, use_cache=use_ocr_cache, on_result=on_page)
+    all_answers = [answer for answers in answers_by_page for answer in answers]
 
-    print(f"Total answers extracted from {len(images)} pages: {len(all_answers)}")
+    logger.info("pdf_extracted", extra={"data": {"pdf": pdf_path.name, "pages": len(images), "answers": len(all_answers)}})
     return all_answers
 
-def evaluate_answer(student_answer: str, ideal_answer: str, point_value: float) -> float:
-    prompt = f"""
-    You are grading a short answer question.  The ideal answer is:
-    "{ideal_answer}"
+def crop_region(image: Image.Image, box: list) -> Image.Image:
+    """Crop ``[x0, y0, x1, y1]``, given as fractions of the page size."""
+    x0, y0, x1, y1 = box
+    return image.crop((
+        round(x0 * image.width), round(y0 * image.height),
+        round(x1 * image.width), round(y1 * image.height),
+    ))
 
-    The student's answer is:
-    "{student_answer}"
+def extract_answer_regions(pdf_path: Path, regions: list, use_ocr_cache: bool = FLORENCE_CACHE_ENABLED,
+                           progress: Progress = SILENT) -> list:
+    """OCR only the answer boxes of an exam layout.
 
-    Respond with a single number between 0 and {point_value} representing
-    the score.  Do not provide explanations, only the number.
+    ``regions`` holds one ``(page, box)`` per question (page 1-based, box
+    as in ``crop_region``).  The crops of all pages are batched through
+    Florence-2 with the plain ``<OCR>`` task, and answer ``i`` always comes
+    from region ``i``, so nothing is padded or truncated.
     """
-    output = client.run(
-        "meta/meta-llama-3-8b-instruct",
-        input={"prompt": prompt}
-    )
-  
-    # The API will return a string; convert to float
-    try:
-        return float(output[1])
-    except Exception:
-        return 0.0
-    
+    pdf_path = Path(pdf_path).resolve()
+    # Only the pages holding answer boxes are rendered.
+    available = page_count(pdf_path)
+    needed = sorted({page for page, _ in regions if page <= available})
+    images = dict(zip(needed, rasterize_pdf(pdf_path, needed, progress=progress)))
 
-def evaluate_answer_sheet(pdf_path: Path , answer_sheet_id: int) -> None:
-    conn , cursor = get_cursor()
-    # Retrieve answer sheet and associated student
-    cursor.execute(
-        "SELECT answer_sheets.*, students.exam_id FROM answer_sheets JOIN students ON answer_sheets.student_id = students.id WHERE answer_sheets.id = ?",
-        (answer_sheet_id,)
-    )
-    sheet = cursor.fetchone()
-    if sheet is None:
-        conn.close()
-        raise ValueError(f"Answer sheet {answer_sheet_id} not found")
+    crops, slots = [], []
+    for index, (page, box) in enumerate(regions):
+        if page not in images:
+            logger.warning("answer_region_missing_page", extra={"data": {"pdf": pdf_path.name, "page": page}})
+            continue
+        crops.append(crop_region(images[page], box))
+        slots.append(index)
+
+    # A page is done once the last of its crops is.
+    remaining = Counter(regions[index][0] for index in slots)
+    answers = [""] * len(regions)
+
+    def on_crop(position, value):
+        index = slots[position]
+        page = regions[index][0]
+        if isinstance(value, Exception) or "<OCR>" not in value:
+            metrics.ERRORS.labels("ocr_page").inc()
+            logger.error("answer_region_failed", extra={"data": {
+                "pdf": pdf_path.name, "region": index + 1, "error": str(value),
+            }})
+        else:
+            answers[index] = value["<OCR>"]
+        remaining[page] -= 1
+        if not remaining[page]:
+            progress.emit("page_ocr", page=page, pages=len(images), answers=sum(
+                1 for (number, _), answer in zip(regions, answers) if number == page and answer
+            ))
+
+    extract_with_paddleocr(crops, use_cache=use_ocr_cache, task_prompt="<OCR>", on_result=on_crop)
+    logger.info("pdf_extracted", extra={"data": {
+        "pdf": pdf_path.name, "pages": len(images), "regions": len(crops), "answers": sum(map(bool, answers)),
+    }})
+    return answers
+
+def evaluate_answer(student_answer: str, ideal_answer: str, point_value: float) -> float:
+    return asyncio.run(scoring.score_answers([(student_answer, ideal_answer, point_value)]))[0]
     
-    # pdf_path = Path(__file__).parent / "uploads" / sheet["filename"]
-    extracted_text = extract_text_from_pdf(pdf_path)
+
+def extract_answers(pdf_path: Path, answer_sheet_id: int, exam_id: int, questions: list,
+                    use_ocr_cache: bool = FLORENCE_CACHE_ENABLED, progress=SILENT):
+    """OCR a sheet into ``(extracted_text, cleaned_answers)``, one cleaned answer per question."""
+    missing_regions = [question["id"] for question in questions if not (question["answer_page"] and question["answer_box"])]
+    if 0 < len(missing_regions) < len(questions):
+        logger.warning("answer_layout_incomplete", extra={"data": {
+            "sheet_id": answer_sheet_id, "exam_id": exam_id, "missing_question_ids": missing_regions,
+        }})
+    if questions and not missing_regions:
+        # The exam has a layout template: OCR only the answer boxes.
+        extracted_text = extract_answer_regions(
+            pdf_path, [(question["answer_page"], question["answer_box"]) for question in questions],
+            use_ocr_cache=use_ocr_cache, progress=progress,
+        )
+    else:
+        extracted_text = extract_text_from_pdf(pdf_path, use_ocr_cache=use_ocr_cache, progress=progress)
     # extracted_text is now a list of all answers from all pages
-    all_answers = extracted_text
-    
-    cursor.execute(
-        "SELECT id, text, ideal_answer, point_value FROM questions WHERE exam_id = %s ORDER BY id",
-        (sheet["exam_id"],)
-    )
-    questions = cursor.fetchall()
-    questions = [dict(row) for row in questions]
-    
+    all_answers = list(extracted_text)
+
     # Ensure we have enough answers for all questions
+    mismatch = {"sheet_id": answer_sheet_id, "answers": len(all_answers), "questions": len(questions)}
     if len(all_answers) < len(questions):
-        print(f"Warning: Only {len(all_answers)} answers found for {len(questions)} questions")
+        metrics.ANSWER_COUNT_MISMATCHES.labels("padded").inc()
+        logger.warning("answers_padded", extra={"data": mismatch})
         # Pad with empty answers if needed
         all_answers.extend([""] * (len(questions) - len(all_answers)))
     elif len(all_answers) > len(questions):
-        print(f"Warning: {len(all_answers)} answers found for {len(questions)} questions, truncating")
+        metrics.ANSWER_COUNT_MISMATCHES.labels("truncated").inc()
+        logger.warning("answers_truncated", extra={"data": mismatch})
         all_answers = all_answers[:len(questions)]
-    
-    total_score = 0.0
-    # Delete previous evaluations for this answer sheet if any
-    cursor.execute("DELETE FROM answers WHERE answer_sheet_id = ?", (answer_sheet_id,))
-    
-    # Evaluate each answer
-    for i, (question, student_answer) in enumerate(zip(questions, all_answers)):
-        print("==========================================================")
-        print(f"Question {i+1}: {question['text']}")
-        print(f"Student Answer: {student_answer}")
-        print(f"Ideal Answer: {question['ideal_answer']}")
-        print("==========================================================")
-        
+
+    cleaned_answers = []
+    for question, student_answer in zip(questions, all_answers):
         # Clean the student answer
         if isinstance(student_answer, str):
             student_answer = student_answer.replace("</s>", "").replace("<s>", "").strip()
         else:
             student_answer = str(student_answer)
-        
-        score = evaluate_answer(student_answer, question["ideal_answer"], question["point_value"])
-        total_score += score
-        
-        cursor.execute(
-            """INSERT INTO answers (answer_sheet_id, question_id, student_answer, score)
-            VALUES (?, ?, ?, ?)""",
-            (answer_sheet_id, question["id"], student_answer, score),
-        )
+        cleaned_answers.append(student_answer)
+        logger.debug("answer_extracted", extra={"data": {
+            "sheet_id": answer_sheet_id, "question_id": question["id"], "student_answer": student_answer,
+        }})
+    return extracted_text, cleaned_answers
+
+
+def stored_answers(cursor, answer_sheet_id: int, questions: list):
+    """The answers already extracted from this sheet, in question order, or ``None`` if any is missing."""
     cursor.execute(
-        """UPDATE answer_sheets SET extracted_text = ?, evaluated_at = ?, total_score = ? WHERE id = ?""",
-        (", ".join(str(answer) for answer in extracted_text), datetime.now(timezone.utc).isoformat(), total_score, answer_sheet_id),
+        "SELECT question_id, student_answer FROM answers WHERE answer_sheet_id = %s", (answer_sheet_id,)
     )
-    conn.commit()
-    conn.close()
-    
\ No newline at end of file
+    stored = {row["question_id"]: row["student_answer"] or "" for row in cursor.fetchall()}
+    if not questions or any(question["id"] not in stored for question in questions):
+        return None
+    return [stored[question["id"]] for question in questions]
+
+
+def evaluate_answer_sheet(pdf_path: Path , answer_sheet_id: int, use_ocr_cache: bool = FLORENCE_CACHE_ENABLED,
+                          reuse_answers: bool = False) -> None:
+    """Grade one answer sheet; ``reuse_answers`` (regrades) re-scores its stored answers when every question has one."""
+    conn , cursor = get_cursor()
+    try:
+        # Retrieve answer sheet and associated student
+        cursor.execute(
+            """SELECT answer_sheets.*, students.exam_id, exams.scoring_mode, exams.tier_high, exams.tier_low
+            FROM answer_sheets
+            JOIN students ON answer_sheets.student_id = students.id
+            JOIN exams ON students.exam_id = exams.id
+            WHERE answer_sheets.id = %s""",
+            (answer_sheet_id,)
+        )
+        sheet = cursor.fetchone()
+        if sheet is None:
+            raise ValueError(f"Answer sheet {answer_sheet_id} not found")
+
+        cursor.execute(
+            "SELECT id, text, ideal_answer, point_value, answer_page, answer_box FROM questions WHERE exam_id = %s ORDER BY id",
+            (sheet["exam_id"],)
+        )
+        questions = cursor.fetchall()
+        questions = [dict(row) for row in questions]
+
+        progress = Progress(conn, sheet["exam_id"], answer_sheet_id)
+
+        stored = stored_answers(cursor, answer_sheet_id, questions) if reuse_answers else None
+        if stored is None:
+            extracted_text, cleaned_answers = extract_answers(
+                pdf_path, answer_sheet_id, sheet["exam_id"], questions, use_ocr_cache=use_ocr_cache, progress=progress,
+            )
+        else:
+            # A regrade: re-score what was extracted from this scan before, no OCR.
+            extracted_text, cleaned_answers = None, stored
+            logger.info("answers_reused", extra={"data": {"sheet_id": answer_sheet_id, "answers": len(stored)}})
+
+        def on_score(index, score, tier):
+            progress.emit("question_scored", question_id=questions[index]["id"], score=score,
+                          point_value=questions[index]["point_value"], graded_by=tier)
+
+        # Score every answer of the sheet concurrently; clear-cut answers skip the LLM
+        with metrics.stage("scoring"):
+            scores, graded_by = asyncio.run(scoring.score_tiered([
+                (student_answer, question["ideal_answer"], question["point_value"])
+                for question, student_answer in zip(questions, cleaned_answers)
+            ], scoring.tier_thresholds(sheet["tier_high"], sheet["tier_low"]),
+               mode=sheet["scoring_mode"] or SCORING_MODE, on_score=on_score))
+        total_score = sum(scores)
+        logger.info("sheet_scored", extra={"data": {
+            "sheet_id": answer_sheet_id, "total_score": total_score, "escalated": graded_by.count("llm"),
+            "answers": len(graded_by), "score_cache": scoring.score_cache.stats(),
+        }})
+
+        with metrics.stage("db_write"):
+            # FOR SHARE holds off rubric edits until this commits.  One that landed
+            # while the sheet was being scored may have re-scored the question
+            # before these answers existed, so queue its re-score again.
+            cursor.execute(
+                "SELECT id, ideal_answer, point_value FROM questions WHERE exam_id = %s FOR SHARE",
+                (sheet["exam_id"],),
+            )
+            rubric = {row["id"]: (row["ideal_answer"], row["point_value"]) for row in cursor.fetchall()}
+            stale = [
+                question["id"] for question in questions
+                if question["id"] in rubric and rubric[question["id"]] != (question["ideal_answer"], question["point_value"])
+            ]
+            # Delete previous evaluations for this answer sheet if any
+            cursor.execute("DELETE FROM answers WHERE answer_sheet_id = %s", (answer_sheet_id,))
+            cursor.executemany(
+                """INSERT INTO answers (answer_sheet_id, question_id, student_answer, score, graded_by)
+                VALUES (%s, %s, %s, %s, %s)""",
+                [
+                    (answer_sheet_id, question["id"], student_answer, score, tier)
+                    for question, student_answer, score, tier in zip(questions, cleaned_answers, scores, graded_by)
+                ],
+            )
+            cursor.execute(
+                """UPDATE answer_sheets SET extracted_text = COALESCE(%s, extracted_text), evaluated_at = %s, total_score = %s
+                WHERE id = %s""",
+                (
+                    ", ".join(str(answer) for answer in extracted_text) if extracted_text is not None else None,
+                    datetime.now(timezone.utc).isoformat(), total_score, answer_sheet_id,
+                ),
+            )
+            # Results are sorted by each student's best sheet (see RESULT_SORTS).
+            cursor.execute(
+                """UPDATE students SET best_score = (SELECT MAX(total_score) FROM answer_sheets WHERE student_id = %s)
+                WHERE id = %s""",
+                (sheet["student_id"], sheet["student_id"]),
+            )
+            if stale:
+                cursor.execute(QUEUE_RESCORE, (stale,))
+                logger.info("sheet_rubric_changed", extra={"data": {
+                    "sheet_id": answer_sheet_id, "question_ids": stale,
+                    "queued": [row["question_id"] for row in cursor.fetchall()],
+                }})
+            cursor.execute("UPDATE exams SET version = version + 1 WHERE id = %s", (sheet["exam_id"],))
+            conn.commit()
+        progress.emit("sheet_finished", total_score=total_score)
+    finally:
+        conn.close()
+    metrics.SHEETS.inc()
+    
+
+def rescore_question(question_id: int) -> int:
+    """Re-score one question on every graded sheet from the stored answers.
+
+    Used after the question's ideal answer or point value was edited:
+    no OCR is run and other questions keep their scores.  Returns the
+    number of sheets whose totals were updated.
+    """
+    conn , cursor = get_cursor()
+    try:
+        cursor.execute(
+            """SELECT questions.exam_id, questions.ideal_answer, questions.point_value,
+                      exams.scoring_mode, exams.tier_high, exams.tier_low
+            FROM questions JOIN exams ON questions.exam_id = exams.id WHERE questions.id = %s""",
+            (question_id,),
+        )
+        question = cursor.fetchone()
+        if question is None:
+            return 0
+        cursor.execute(
+            "SELECT id, student_answer FROM answers WHERE question_id = %s ORDER BY id", (question_id,)
+        )
+        rows = cursor.fetchall()
+        # One cdist call covers every student's answer to this question.
+        with metrics.stage("rescoring"):
+            scores, graded_by = asyncio.run(scoring.score_tiered([
+                (row["student_answer"] or "", question["ideal_answer"], question["point_value"]) for row in rows
+            ], scoring.tier_thresholds(question["tier_high"], question["tier_low"]),
+               mode=question["scoring_mode"] or SCORING_MODE))
+        logger.info("question_rescored", extra={"data": {
+            "question_id": question_id, "answers": len(rows), "escalated": graded_by.count("llm"),
+            "score_cache": scoring.score_cache.stats(),
+        }})
+
+        cursor.execute(
+            """UPDATE answers SET score = rescored.score, graded_by = rescored.graded_by
+            FROM unnest(%s::integer[], %s::real[], %s::text[]) AS rescored(id, score, graded_by)
+            WHERE answers.id = rescored.id""",
+            ([row["id"] for row in rows], scores, graded_by),
+        )
+        cursor.execute(
+            """UPDATE answer_sheets SET total_score = totals.total
+            FROM (
+                SELECT answer_sheet_id, SUM(score) AS total
+                FROM answers
+                WHERE answer_sheet_id IN (SELECT answer_sheet_id FROM answers WHERE question_id = %s)
+                GROUP BY answer_sheet_id
+            ) AS totals
+            WHERE answer_sheets.id = totals.answer_sheet_id""",
+            (question_id,),
+        )
+        updated = cursor.rowcount
+        cursor.execute(
+            """UPDATE students SET best_score = best.score
+            FROM (
+                SELECT answer_sheets.student_id, MAX(answer_sheets.total_score) AS score
+                FROM answer_sheets JOIN students ON answer_sheets.student_id = students.id
+                WHERE students.exam_id = %s
+                GROUP BY answer_sheets.student_id
+            ) AS best
+            WHERE students.id = best.student_id AND students.best_score IS DISTINCT FROM best.score""",
+            (question["exam_id"],),
+        )
+        cursor.execute("UPDATE exams SET version = version + 1 WHERE id = %s", (question["exam_id"],))
+        conn.commit()
+        return updated
+    finally:
+        conn.close()
@@ -0,0 +1,140 @@
+"""
+Grading worker
+==============
+
+Standalone process that drains the ``grading_jobs`` queue.  Run as many
+of these as the hardware allows, on as many machines as share the
+database::
+
+    python src/worker.py
+
+Each worker runs ``jobs.concurrency`` grading threads.  A thread claims
+one job at a time, grades the answer sheet with
+``utilities.evaluate_answer_sheet`` (or re-scores an edited question with
+``utilities.rescore_question``) and records the outcome.  The
+threads share one Florence-2 batching engine, so pages from several
+sheets are decoded together.  While a job runs, a heartbeat thread
+renews its lease every ``jobs.heartbeat_interval`` seconds.  SIGINT and
+SIGTERM stop the worker after the jobs in hand are finished.
+"""
+
+import os
+import sys
+import socket
+import signal
+import time
+import threading
+import logging
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+from configuration.logging_config import setup_logging
+from configuration.main_config import JOB_POLL_INTERVAL , JOB_CONCURRENCY , METRICS_WORKER_PORT , JOB_HEARTBEAT_INTERVAL
+from repository import jobs
+from utility import utilities
+from utility import metrics
+from utility import progress
+
+uploads = BASE_DIR / "uploads"
+
+setup_logging()
+logger = logging.getLogger("worker.blog")
+
+_stopping = False
+
+
+def _request_stop(signum, frame):
+    global _stopping
+    logger.info(f"Received signal {signum}, stopping after the current job")
+    _stopping = True
+
+
+@contextmanager
+def heartbeat(job_id: int, worker_id: str, interval: float = JOB_HEARTBEAT_INTERVAL):
+    """Renew the job's lease in the background until the block exits."""
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(interval):
+            try:
+                if not jobs.extend_lease(job_id, worker_id):
+                    logger.warning(f"Job {job_id} lease was lost while running")
+                    return
+            except Exception as e:
+                # A missed beat is not fatal; the lease has room for a few.
+                logger.error(f"Error is {e}")
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+@metrics.JOBS_IN_FLIGHT.track_inprogress()
+def process_job(job, worker_id: str) -> None:
+    sheet_id = job["answer_sheet_id"]
+    try:
+        with heartbeat(job["id"], worker_id):
+            if job["question_id"] is not None:
+                rescored = utilities.rescore_question(job["question_id"])
+                done = f"re-scored question {job['question_id']} on {rescored} sheets"
+            else:
+                filename = jobs.get_sheet_filename(sheet_id)
+                if filename is None:
+                    raise ValueError(f"Answer sheet {sheet_id} not found")
+                utilities.evaluate_answer_sheet(uploads / filename, sheet_id, reuse_answers=job["rescore_only"])
+                done = f"graded sheet {sheet_id}"
+    except Exception as e:
+        metrics.ERRORS.labels("job").inc()
+        logger.debug(traceback.format_exc())
+        error = f"{type(e).__name__}: {e}"
+        status = jobs.fail_job(job["id"], worker_id, job["attempts"], error)
+        # With the lease lost the job is another worker's; its outcome is not ours to report.
+        if sheet_id is not None and status is not None:
+            progress.publish_sheet(sheet_id, "sheet_failed", error=error[:500],
+                                   attempts=job["attempts"], will_retry=status == "queued")
+        return
+    if not jobs.complete_job(job["id"], worker_id):
+        logger.warning(f"Job {job['id']} lease was lost before completion")
+    else:
+        logger.info(f"Job {job['id']} {done}")
+
+
+def run(worker_id: str, poll_interval: float = JOB_POLL_INTERVAL) -> None:
+    logger.info(f"Worker {worker_id} started")
+    while not _stopping:
+        try:
+            job = jobs.claim_job(worker_id)
+        except Exception as e:
+            logger.error(f"Error is {e}")
+            time.sleep(poll_interval)
+            continue
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        logger.info(f"Job {job['id']} claimed (sheet {job['answer_sheet_id']}, attempt {job['attempts']})")
+        process_job(job, worker_id)
+    logger.info(f"Worker {worker_id} stopped")
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    metrics.serve(METRICS_WORKER_PORT)
+    threads = [
+        threading.Thread(target=run, args=(f"{worker_name}:{n}",), name=f"grader-{n}")
+        for n in range(JOB_CONCURRENCY)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Exam analytics: score matrix, statistics and the version-stamped cache.
+"""
+
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from repository import repository
+from services import analytics
+
+
+def test_build_matrix_places_scores_by_question():
+    rows = [(7, 11, 2.0), (7, 12, None), (8, 12, 1.5), (8, 99, 5.0)]
+    assert analytics.build_matrix([11, 12], rows) == {"7": [2.0, 0.0], "8": [0.0, 1.5]}
+
+
+def test_compute_stats():
+    matrix = np.array([[2.0, 1.0, 1.0], [1.0, 0.0, 1.0], [0.0, 1.0, 1.0], [2.0, 1.0, 1.0]])
+    stats = analytics.compute_stats(matrix, np.array([2.0, 1.0, 1.0]))
+    totals = matrix.sum(axis=1)
+    assert stats["sheets"] == 4 and stats["total_possible"] == 4.0
+    assert stats["mean"] == pytest.approx(totals.mean(), abs=1e-4)
+    assert stats["median"] == 3.0 and (stats["min"], stats["max"]) == (2.0, 4.0)
+    assert stats["std"] == pytest.approx(totals.std(ddof=1), abs=1e-4)
+    assert sum(stats["histogram"]["counts"]) == 4
+    first, second, constant = stats["questions"]
+    assert first["difficulty"] == pytest.approx(1.25 / 2, abs=1e-4)
+    rest = totals - matrix[:, 0]
+    assert first["discrimination"] == pytest.approx(np.corrcoef(matrix[:, 0], rest)[0, 1], abs=1e-4)
+    assert constant["discrimination"] is None  # no variance, no correlation
+
+
+def test_compute_stats_without_sheets():
+    assert analytics.compute_stats(np.zeros((0, 2)), np.array([1.0, 1.0]))["questions"] == []
+
+
+class RecordingConnection:
+    def __init__(self, log):
+        self.log = log
+
+    async def execute(self, query, params=None):
+        self.log.append(" ".join(query.split()))
+
+        class Cursor:
+            async def fetchone(self):
+                return {"version": 12}
+
+            async def fetchall(self):
+                return [{"sheet_id": 5, "question_id": 1, "score": 1.0}]
+
+        return Cursor()
+
+
+class RecordingPool:
+    def __init__(self):
+        self.connections = []
+
+    @asynccontextmanager
+    async def connection(self):
+        self.connections.append([])
+        yield RecordingConnection(self.connections[-1])
+
+
+def test_rebuild_stamps_the_version_read_before_the_scores(monkeypatch):
+    fake = RecordingPool()
+    monkeypatch.setattr(repository, "pool", fake)
+    stats = asyncio.run(repository.rebuild_exam_analytics_cache(3, lambda rows: ([1], [2.0], {"sheets": len(rows)})))
+    assert stats == {"sheets": 1}
+    (queries,) = fake.connections
+    assert queries[0].startswith("SELECT version FROM exams")
+    assert "FROM answers" in queries[1] and "exam_version = EXCLUDED.exam_version" in queries[2]
+
+
+def test_views_rebuild_only_when_the_exam_moved_on(monkeypatch):
+    questions = [{"id": 1, "point_value": 2.0}]
+    cached = {"question_ids": [1], "point_values": [2.0], "exam_version": 12, "stats": {"sheets": 4}}
+    rebuilds = []
+
+    async def rebuild(exam_id, build):
+        rebuilds.append(exam_id)
+        return build([{"sheet_id": 5, "question_id": 1, "score": 1.5}])[2]
+
+    async def returns(value):
+        return value
+
+    monkeypatch.setattr(repository, "get_questons", lambda exam_id: returns(questions))
+    monkeypatch.setattr(repository, "get_exam_analytics_cache", lambda exam_id: returns(cached))
+    monkeypatch.setattr(repository, "rebuild_exam_analytics_cache", rebuild)
+    monkeypatch.setattr(repository, "get_exam_version", lambda exam_id: returns(12))
+    assert asyncio.run(analytics.get_exam_analytics(3)) == {"sheets": 4} and rebuilds == []
+    monkeypatch.setattr(repository, "get_exam_version", lambda exam_id: returns(13))  # a sheet was graded
+    assert asyncio.run(analytics.get_exam_analytics(3))["sheets"] == 1 and rebuilds == [3]
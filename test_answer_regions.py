@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Answer-region templates: layout validation and crop-then-OCR extraction.
+"""
+
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from services import service
+from utility import utilities
+from utility import inference
+from utility.inference import BatchInferenceEngine
+
+
+def test_layout_validation_reports_each_bad_region():
+    rows, errors = service.parse_layout_regions({"regions": [
+        {"question_id": 1, "page": 1, "box": [0, 0.5, 1, 0.75]},
+        {"question_id": 2, "page": 0, "box": [0, 0, 1, 1]},
+        {"question_id": 3, "page": 1, "box": [0.5, 0, 0.4, 1]},
+        {"question_id": 1, "page": 2, "box": [0, 0, 1, 1]},
+    ]})
+    assert rows == [(1, 1, [0.0, 0.5, 1.0, 0.75])]
+    assert [error["line"] for error in errors] == [2, 3, 4]
+
+
+def test_only_the_answer_boxes_reach_ocr(monkeypatch):
+    pages = [Image.new("RGB", (100, 200), "white") for _ in range(3)]
+    requested = []
+    monkeypatch.setattr(utilities, "page_count", lambda path: len(pages))
+    monkeypatch.setattr(utilities, "convert_from_path",
+                        lambda path, first_page, last_page: (requested.append((first_page, last_page)),
+                                                             pages[first_page - 1:last_page])[1])
+    seen = []
+
+    def runner(images, task_prompt, profile=None):
+        seen.extend(image.size for image in images)
+        return [{task_prompt: f"{image.width}x{image.height}"} for image in images]
+
+    monkeypatch.setattr(inference, "_engine", BatchInferenceEngine(runner=runner))
+    pdf = Path(__file__)  # only needs to exist; rasterizing is patched
+    answers = utilities.extract_answer_regions(
+        pdf, [(1, [0, 0, 0.5, 0.25]), (3, [0.5, 0.5, 1, 1]), (1, [0, 0.5, 1, 0.6])], use_ocr_cache=False
+    )
+    assert requested == [(1, 1), (3, 3)]  # page 2 holds no answer box
+    assert answers == ["50x50", "50x100", "100x20"]
+    assert sorted(seen) == sorted([(50, 50), (50, 100), (100, 20)])
+
+
+def test_layout_status_lists_questions_added_after_the_layout():
+    region = {"question_id": 1, "page": 1, "box": [0, 0, 1, 1]}
+    unset = {"question_id": 2, "page": None, "box": None}
+    assert service.layout_status([region, unset]) == {"complete": False, "missing_question_ids": [2]}
+    assert service.layout_status([region]) == {"complete": True, "missing_question_ids": []}
+    assert service.layout_status([unset]) == {"complete": False, "missing_question_ids": []}
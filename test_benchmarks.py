@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Pieces of the benchmark suite that run without a database or poppler.
+"""
+
+import fitz
+from PIL import Image
+
+from benchmarks import report
+from benchmarks.stubs import StubOCRRunner
+from benchmarks.synthetic import make_answer_pdf
+
+
+def test_synthetic_sheet_has_requested_pages(tmp_path):
+    path = tmp_path / "sheet.pdf"
+    answers = make_answer_pdf(path, pages=3, answers_per_page=4, seed=7)
+    assert len(answers) == 12
+    with fitz.open(path) as document:
+        assert document.page_count == 3
+    assert make_answer_pdf(tmp_path / "other.pdf", 1, 4, seed=8)[0] != answers[0]
+
+
+def test_stub_ocr_is_deterministic_per_page():
+    runner = StubOCRRunner(batch_ms=0, page_ms=0, answers_per_page=2)
+    blank, dark = Image.new("RGB", (8, 8), "white"), Image.new("RGB", (8, 8), "black")
+    first, second, third = runner([blank, dark, blank], "<OCR_WITH_REGION>")
+    assert first == third != second
+    assert len(first["<OCR_WITH_REGION>"]["labels"]) == 2
+
+
+def test_regressions_respect_metric_direction():
+    baselines = {"all.evaluate": {"sheets_per_min": 100.0, "p95_ms": 1000.0, "count": 20}}
+    assert report.regressions({"all.evaluate": {"sheets_per_min": 85.0, "p95_ms": 1100.0}}, baselines, 0.2) == []
+    found = report.regressions({"all.evaluate": {"sheets_per_min": 70.0, "p95_ms": 1300.0, "count": 99}}, baselines, 0.2)
+    assert [line.split(":")[0] for line in found] == ["all.evaluate.sheets_per_min", "all.evaluate.p95_ms"]
+    assert report.regressions({"all.reads": {"p50_ms": 5.0}}, baselines, 0.2) == []
+
+
+def test_ocr_mode_agreement_against_float32():
+    from benchmarks import ocr_modes
+
+    assert ocr_modes.parse_mode("int8+compile") == ("int8", True)
+    reference = [["cell membrane", "gravity"], ["osmosis"]]
+    assert ocr_modes.agreement(reference, reference) == {"label_match": 1.0, "char_similarity": 100.0}
+    drifted = ocr_modes.agreement(reference, [["cell membrane", "gravlty"], ["osmosis"]])
+    assert drifted["label_match"] == round(2 / 3, 4) and 90 < drifted["char_similarity"] < 100
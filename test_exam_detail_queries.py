@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Query count of the exam detail page must not grow with the roster.
+
+The repository's connection pool is replaced by a fake that counts
+statements and answers them with canned rows, so no database is needed.
+"""
+
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from controllers import routes
+from repository import repository
+from configuration.main_config import PAGE_SIZE
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    async def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def execute(self, query, params=None):
+        self.pool.queries.append(query)
+        if "FROM exams" in query:
+            # A new version per roster size, so the page cache never serves an earlier render.
+            return FakeCursor([{"id": 1, "title": "Biology", "subject": "Science", "instructions": "",
+                                "version": self.pool.student_count}])
+        if "FROM students" in query:
+            # The page's LIMIT is honoured; the roster itself can be any size.
+            shown = min(self.pool.student_count, params["limit"])
+            return FakeCursor([
+                {"id": n, "exam_id": 1, "name": f"Student {n}", "sheet_count": n % 3}
+                for n in range(1, shown + 1)
+            ])
+        return FakeCursor([])
+
+
+class CountingPool:
+    def __init__(self, student_count):
+        self.student_count = student_count
+        self.queries = []
+
+    @asynccontextmanager
+    async def connection(self):
+        yield FakeConnection(self)
+
+
+def queries_for_exam_detail(student_count, monkeypatch):
+    fake = CountingPool(student_count)
+    monkeypatch.setattr(repository, "pool", fake)
+    app = FastAPI()
+    app.include_router(routes.router)
+    response = TestClient(app).get(f"{routes.router.prefix}/exams/1")
+    assert response.status_code == 200
+    assert f"Student {min(student_count, PAGE_SIZE)}" in response.text
+    assert ("Next students" in response.text) == (student_count > PAGE_SIZE)
+    return len(fake.queries)
+
+
+def test_exam_detail_query_count_is_constant(monkeypatch):
+    counts = {n: queries_for_exam_detail(n, monkeypatch) for n in (1, 10, 400)}
+    assert len(set(counts.values())) == 1, f"queries per page grew with students: {counts}"
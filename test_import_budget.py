@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for the web tier.
+
+Web workers must boot in seconds and never load the OCR model or the
+LLM client libraries; those belong to the grading workers and the
+inference server.  Each check imports a module in a fresh interpreter.
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+IMPORT_BUDGET_SECONDS = 5.0
+HEAVY_MODULES = ["torch", "transformers", "replicate", "langchain_community"]
+
+PROBE = """
+import json, sys, time
+sys.path[:0] = [{root!r}, {src!r}]
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(module):
+    code = PROBE.format(root=str(ROOT), src=str(ROOT / "src"), module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_routes_import_is_light():
+    result = probe("controllers.routes")
+    assert result["loaded"] == [], f"web tier imported {result['loaded']}"
+    assert result["seconds"] < IMPORT_BUDGET_SECONDS, f"routes import took {result['seconds']:.2f}s"
+
+
+def test_utilities_import_does_not_load_model():
+    result = probe("utility.utilities")
+    assert "torch" not in result["loaded"] and "transformers" not in result["loaded"]
+
+
+if __name__ == "__main__":
+    for module in ("controllers.routes", "utility.utilities"):
+        print(module, probe(module))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Bulk imports: roster and question-bank parsing, and the capped body read.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from services import service
+from utility.uploads import read_body
+
+
+def chunked(content_type, chunks):
+    """A request streamed in ``chunks`` with no Content-Length, like a chunked upload."""
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {"type": "http", "method": "POST", "path": "/", "query_string": b"",
+             "headers": [(b"content-type", content_type.encode())]}
+    return Request(scope, receive)
+
+
+def test_student_rows_from_csv_and_json():
+    assert service.parse_student_rows("name\nAda\n \nGrace\n", "csv") == (
+        ["Ada", "Grace"], [{"line": 3, "error": "name is required"}]
+    )
+    assert service.parse_student_rows('["Ada", {"name": "Grace"}, {}]', "json")[0] == ["Ada", "Grace"]
+
+
+def test_question_rows_default_and_validate_points():
+    rows, errors = service.parse_question_rows(
+        "text,ideal_answer,point_value\nQ1,A1,\nQ2,A2,2.5\nQ3,A3,-1\nQ4,A4,lots\nQ5,,1\n", "csv"
+    )
+    assert rows == [("Q1", "A1", 1.0), ("Q2", "A2", 2.5)]
+    assert [error["line"] for error in errors] == [4, 5, 6]
+
+
+@pytest.mark.parametrize("point_value", ["nan", "inf", "-inf", "1e999"])
+def test_non_finite_point_values_are_rejected(point_value):
+    rows, errors = service.parse_question_rows(f"text,ideal_answer,point_value\nQ,A,{point_value}\n", "csv")
+    assert rows == [] and "finite" in errors[0]["error"]
+    rows, errors = service.parse_question_rows('[{"text": "Q", "ideal_answer": "A", "point_value": NaN}]', "json")
+    assert rows == [] and "finite" in errors[0]["error"]
+
+
+def test_chunked_body_is_read_under_the_cap():
+    request = chunked("text/csv", [b"name\n", b"Ada\n"])
+    assert asyncio.run(service.read_import_payload(request)) == ("name\nAda\n", "csv")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(read_body(chunked("text/csv", [b"name\n", b"Ada\n", b"Grace\n"]), max_bytes=8))
+    assert error.value.status_code == 413
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-1", "lots"])
+def test_question_forms_reject_bad_point_values_with_400(value):
+    with pytest.raises(HTTPException) as error:
+        service.form_point_value({"point_value": value})
+    assert error.value.status_code == 400
+    assert service.form_point_value({"point_value": ""}) == 1.0
+    assert service.form_point_value({"point_value": " 2.5 "}) == 2.5
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Batching engine: every submitted page resolves, even when the runner misbehaves.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from utility.inference import BatchInferenceEngine
+
+
+def test_batches_resolve_in_page_order():
+    engine = BatchInferenceEngine(runner=lambda images, task, profile: [{task: image} for image in images],
+                                  max_batch_size=4, max_wait_ms=5)
+    assert engine.run(["a", "b", "c"], "<OCR>") == [{"<OCR>": "a"}, {"<OCR>": "b"}, {"<OCR>": "c"}]
+
+
+def test_a_short_result_list_fails_every_page_of_the_batch():
+    engine = BatchInferenceEngine(runner=lambda images, task, profile: [{task: images[0]}],
+                                  max_batch_size=3, max_wait_ms=5)
+    futures = [engine.submit(image, "<OCR>") for image in "abc"]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="1 results for a batch of 3"):
+            future.result(timeout=5)
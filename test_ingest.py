@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Bulk ingestion: splitting ZIPs and scanned stacks into per-student PDFs.
+"""
+
+import sys
+import zipfile
+from pathlib import Path
+
+import fitz
+import pytest
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from utility import ingest
+
+STUDENTS = [{"id": 3, "name": "Ada Lovelace"}, {"id": 4, "name": "Grace Hopper"}]
+
+
+def make_pdf(path, pages, **save_options):
+    with fitz.open() as document:
+        for number in range(pages):
+            document.new_page().insert_text((72, 72), f"page {number + 1}")
+        document.save(path, **save_options)
+    return path
+
+
+def test_parse_page_ranges():
+    mapping = [{"student_id": 4, "pages": "3-4"}, {"student_id": 3, "pages": "1-2"}]
+    assert ingest.parse_page_ranges(mapping, 4) == [(4, 2, 3), (3, 0, 1)]
+    assert ingest.parse_page_ranges([{"student_id": 3, "pages": "2"}], 4) == [(3, 1, 1)]
+    for bad in ("0-1", "3-2", "4-5", "one"):
+        with pytest.raises(ValueError):
+            ingest.parse_page_ranges([{"student_id": 3, "pages": bad}], 4)
+
+
+def test_overlapping_page_ranges_are_rejected():
+    mapping = [{"student_id": 3, "pages": "1-3"}, {"student_id": 4, "pages": "3-4"}]
+    with pytest.raises(ValueError, match="page 3"):
+        ingest.parse_page_ranges(mapping, 4)
+
+
+def test_split_pdf_copies_ranges_and_reports_leftovers(tmp_path):
+    stack = make_pdf(tmp_path / "stack.pdf", 5)
+    items = ingest.split_pdf(stack, tmp_path, [(3, 0, 1), (4, 2, 3)])
+    first, second, leftover = items
+    assert (first.status, second.status) == ("split", "split")
+    with fitz.open(tmp_path / second.filename) as part:
+        assert part.page_count == 2 and "page 3" in part[0].get_text()
+    assert (leftover.status, leftover.pages) == ("error", "5-5")
+
+
+@pytest.mark.parametrize("kind", ["corrupt", "encrypted"])
+def test_unreadable_stacks_raise_value_error(tmp_path, kind):
+    path = tmp_path / "stack.pdf"
+    if kind == "corrupt":
+        path.write_bytes(b"%PDF-1.4 not really")
+    else:
+        make_pdf(path, 1, encryption=fitz.PDF_ENCRYPT_AES_256, owner_pw="owner", user_pw="user")
+    with pytest.raises(ValueError):
+        ingest.page_count(path)
+    with pytest.raises(ValueError):
+        ingest.split_pdf(path, tmp_path, [(3, 0, 0)])
+
+
+def test_split_zip_resolves_students_and_enforces_limits(tmp_path):
+    archive = tmp_path / "sheets.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("3_scan.pdf", b"%PDF-1.4 ada")
+        zf.writestr("Grace_Hopper.pdf", b"%PDF-1.4 grace" + b"x" * 100)
+        zf.writestr("notes.txt", b"hi")
+        zf.writestr("99.pdf", b"%PDF-1.4 nobody")
+        zf.writestr(".DS_Store", b"")
+    out = tmp_path / "out"
+    out.mkdir()
+    items = {item.source: item for item in ingest.split_zip(
+        archive, out, ingest.student_resolver(STUDENTS), max_member_bytes=50, max_total_bytes=1000
+    )}
+    assert set(items) == {"3_scan.pdf", "Grace_Hopper.pdf", "notes.txt", "99.pdf"}
+    ada = items["3_scan.pdf"]
+    assert (ada.status, ada.student_id) == ("split", 3)
+    assert (out / ada.filename).read_bytes() == b"%PDF-1.4 ada"
+    assert items["Grace_Hopper.pdf"].error == "file too large"
+    assert items["notes.txt"].error == "not a PDF"
+    assert items["99.pdf"].error == "no matching student"
+    assert [path.name for path in out.iterdir()] == [ada.filename]
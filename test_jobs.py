@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Grading job queue: claiming, leases, the worker heartbeat, and retries with backoff.
+"""
+
+import importlib
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from configuration import logging_config
+from repository import jobs
+
+
+class FakeConnection:
+    def __init__(self, rows=(), rowcount=1):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((" ".join(query.split()), params))
+        return self
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    connection = FakeConnection()
+
+    @contextmanager
+    def connect():
+        yield connection
+
+    monkeypatch.setattr(jobs, "connect", connect)
+    return connection
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setattr(logging_config, "setup_logging", lambda: None)  # no log files from tests
+    return importlib.import_module("worker")
+
+
+def test_claim_expires_dead_leases_then_takes_queued_or_expired_jobs(conn):
+    conn.rows = [{"id": 9, "answer_sheet_id": 4, "question_id": None, "attempts": 1}]
+    assert jobs.claim_job("w1", visibility_timeout=30, max_attempts=3)["id"] == 9
+    (expire, expire_params), (claim, claim_params) = conn.queries
+    assert "SET status = 'failed'" in expire and "locked_until < now() AND attempts >= %s" in expire
+    assert expire_params == (3,)
+    assert "(status = 'running' AND locked_until < now())" in claim and "SKIP LOCKED" in claim
+    assert claim_params == ("w1", 30)
+
+
+def test_extend_lease_only_for_the_holder(conn):
+    assert jobs.extend_lease(9, "w1", visibility_timeout=30)
+    query, params = conn.queries[0]
+    assert "locked_by = %s AND status = 'running'" in query and params == (30, 9, "w1")
+    conn.rowcount = 0  # reclaimed by another worker after it expired
+    assert not jobs.extend_lease(9, "w1")
+
+
+@pytest.mark.parametrize("attempts, status", [(1, "queued"), (4, "queued"), (5, "failed")])
+def test_fail_job_requeues_with_backoff_until_max_attempts(conn, monkeypatch, attempts, status):
+    monkeypatch.setattr(jobs.random, "uniform", lambda low, high: high)
+    assert jobs.fail_job(9, "w1", attempts, "boom", max_attempts=5) == status
+    params = conn.queries[0][1]
+    assert params[0] == status
+    assert params[2] == (0 if status == "failed" else jobs.backoff_seconds(attempts))
+
+
+def test_fail_job_after_the_lease_was_lost_changes_nothing(conn):
+    conn.rowcount = 0
+    assert jobs.fail_job(9, "w1", 1, "boom") is None
+
+
+def test_backoff_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(jobs.random, "uniform", lambda low, high: high)
+    assert [jobs.backoff_seconds(n, base=30, cap=100) for n in (1, 2, 3, 4)] == [30, 60, 100, 100]
+
+
+def test_heartbeat_renews_the_lease_while_a_job_runs(worker, monkeypatch):
+    beats = []
+    renewed = threading.Event()
+
+    def extend_lease(job_id, worker_id):
+        beats.append((job_id, worker_id))
+        if len(beats) == 3:
+            renewed.set()
+        return True
+
+    monkeypatch.setattr(worker.jobs, "extend_lease", extend_lease)
+    with worker.heartbeat(9, "w1", interval=0.01):
+        assert renewed.wait(5)
+    count = len(beats)
+    assert set(beats) == {(9, "w1")}
+    assert len(beats) == count  # stopped with the block
+
+
+def test_heartbeat_stops_once_the_lease_is_lost(worker, monkeypatch):
+    beats = []
+    monkeypatch.setattr(worker.jobs, "extend_lease", lambda job_id, worker_id: beats.append(job_id) or False)
+    with worker.heartbeat(9, "w1", interval=0.01):
+        threading.Event().wait(0.1)
+    assert beats == [9]
+
+
+def test_process_job_fails_through_the_queue(worker, monkeypatch):
+    failed, published = [], []
+    monkeypatch.setattr(worker.jobs, "get_sheet_filename", lambda sheet_id: None)
+    monkeypatch.setattr(worker.jobs, "fail_job", lambda *args: failed.append(args) or "queued")
+    monkeypatch.setattr(worker.progress, "publish_sheet", lambda *args, **kwargs: published.append(kwargs))
+    worker.process_job({"id": 9, "answer_sheet_id": 4, "question_id": None, "attempts": 2}, "w1")
+    assert failed == [(9, "w1", 2, "ValueError: Answer sheet 4 not found")]
+    assert published[0]["will_retry"] is True
+
+
+def test_a_lost_job_is_not_reported_as_failed(worker, monkeypatch):
+    published = []
+    monkeypatch.setattr(worker.jobs, "get_sheet_filename", lambda sheet_id: None)
+    monkeypatch.setattr(worker.jobs, "fail_job", lambda *args: None)
+    monkeypatch.setattr(worker.progress, "publish_sheet", lambda *args, **kwargs: published.append(kwargs))
+    worker.process_job({"id": 9, "answer_sheet_id": 4, "question_id": None, "attempts": 2}, "w1")
+    assert published == []
+
+
+def test_pending_jobs_are_deduped_by_a_unique_index():
+    assert "ON CONFLICT (question_id) WHERE status = 'queued' DO NOTHING" in jobs.QUEUE_RESCORE
+    assert "NOT EXISTS" not in jobs.QUEUE_RESCORE
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+OCR page cache eviction: periodic, batched, from the least recently used end.
+"""
+
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from utility import ocr_cache as ocr_cache_module
+from utility.ocr_cache import OCRCache
+
+
+class FakeCursor:
+    def __init__(self, entries):
+        self.entries = entries
+        self.queries = []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.queries.append((" ".join(query.split()), params))
+        if query.startswith("DELETE"):
+            self.rowcount = params[0]
+
+    def executemany(self, query, rows):
+        self.queries.append((" ".join(query.split()), None))
+
+    def fetchone(self):
+        return {"entries": self.entries}
+
+
+class FakeConnection:
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_eviction_is_periodic_and_trims_the_oldest_batch(monkeypatch):
+    cursor = FakeCursor(entries=1200)
+    monkeypatch.setattr(ocr_cache_module, "get_cursor", lambda: (FakeConnection(), cursor))
+    cache = OCRCache(max_entries=1000, evict_interval=3600)
+
+    cache.put_many([("a", {"<OCR>": "x"})], "<OCR>")
+    cache.put_many([("b", {"<OCR>": "y"})], "<OCR>")
+    deletes = [(query, params) for query, params in cursor.queries if query.startswith("DELETE")]
+    counts = [query for query, _ in cursor.queries if "count(*)" in query]
+    assert len(counts) == 1  # the second write is inside the interval
+    (query, params), = deletes
+    assert "ORDER BY last_used_at ASC LIMIT" in query and "OFFSET" not in query
+    assert params == (1200 - 900,)
+
+
+def test_no_delete_below_the_limit():
+    cursor = FakeCursor(entries=999)
+    assert OCRCache(max_entries=1000).evict(cursor) == 0
+    assert not any(query.startswith("DELETE") for query, _ in cursor.queries)
+
+
+def test_only_quantised_cpu_models_get_their_own_cache_key(monkeypatch):
+    from configuration import florenc2_config
+
+    for cuda, expected in ((True, florenc2_config.model_id), (False, f"{florenc2_config.model_id}:int8")):
+        fake_torch = types.SimpleNamespace(cuda=types.SimpleNamespace(is_available=lambda cuda=cuda: cuda))
+        monkeypatch.setitem(sys.modules, "torch", fake_torch)
+        florenc2_config.cache_model_id.cache_clear()
+        assert florenc2_config.cache_model_id("int8") == expected
+    florenc2_config.cache_model_id.cache_clear()
+    assert florenc2_config.cache_model_id("float32") == florenc2_config.model_id
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+OCR process pool: pages cross process boundaries through shared memory
+and results come back in page order.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from benchmarks.stubs import StubOCRRunner
+from utility.inference import BatchInferenceEngine
+from utility.ocr_pool import OCRPool, read_pages, shared_pages
+
+
+def crash_once(images, task_prompt, profile):
+    """Kills its worker process the first time (``profile`` is a marker path)."""
+    marker = Path(profile)
+    if not marker.exists():
+        marker.touch()
+        os._exit(1)
+    return [{task_prompt: f"page {index}"} for index in range(len(images))]
+
+
+def pages():
+    return [Image.new("RGB", (40 + n, 30), (n * 20, 255 - n * 20, 7)) for n in range(7)]
+
+
+def test_shared_pages_round_trip():
+    images = pages() + [Image.new("L", (5, 5), 128)]
+    with shared_pages(images) as (name, layout):
+        copies = read_pages(name, layout)
+    assert [copy.tobytes() for copy in copies] == [image.convert("RGB").tobytes() for image in images]
+
+
+def test_pool_matches_in_process_results_in_order():
+    runner = StubOCRRunner(batch_ms=0, page_ms=20, answers_per_page=2)
+    pool = OCRPool(processes=2, threads=1, run=runner)
+    try:
+        engine = BatchInferenceEngine(runner=pool, max_batch_size=2, max_wait_ms=5, workers=2)
+        assert engine.run(pages(), "<OCR_WITH_REGION>") == runner(pages(), "<OCR_WITH_REGION>")
+    finally:
+        pool.shutdown()
+
+
+def test_pool_restarts_after_a_worker_dies(tmp_path):
+    pool = OCRPool(processes=1, threads=1, run=crash_once)
+    try:
+        broken = pool._executor
+        results = pool(pages()[:2], "<OCR>", str(tmp_path / "crashed"))
+        assert results == [{"<OCR>": "page 0"}, {"<OCR>": "page 1"}]
+        assert pool._executor is not broken
+    finally:
+        pool.shutdown()
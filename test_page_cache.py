@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Version-stamped page cache: renders once per version, 304 on a matching ETag.
+"""
+
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi.responses import HTMLResponse
+from starlette.requests import Request
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from services import service
+from utility import page_cache as page_cache_module
+from utility.page_cache import PageCache
+from utility.pagination import encode_cursor
+from configuration.main_config import PAGE_SIZE
+
+
+def get(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_pages_render_once_per_version(monkeypatch):
+    monkeypatch.setattr(service, "page_cache", PageCache(max_entries=2, shared=False, enabled=True))
+    renders = []
+
+    async def render():
+        renders.append(1)
+        return HTMLResponse(f"<p>render {len(renders)}</p>")
+
+    async def scenario():
+        first = await service.cached_page(get(), "exam_detail:1", 7, render)
+        again = await service.cached_page(get(), "exam_detail:1", 7, render)
+        revalidated = await service.cached_page(get(f'W/{first.headers["etag"]}, "other"'), "exam_detail:1", 7, render)
+        bumped = await service.cached_page(get(first.headers["etag"]), "exam_detail:1", 8, render)
+        missing = await service.cached_page(get(), "exam_detail:2", None, render)
+        return first, again, revalidated, bumped, missing
+
+    first, again, revalidated, bumped, missing = asyncio.run(scenario())
+    assert first.body == again.body == b"<p>render 1</p>" and first.headers["etag"] == again.headers["etag"]
+    assert revalidated.status_code == 304 and revalidated.body == b""
+    assert bumped.status_code == 200 and bumped.body == b"<p>render 2</p>"
+    assert bumped.headers["etag"] != first.headers["etag"]
+    assert missing.body == b"<p>render 3</p>" and "etag" not in missing.headers
+    assert service.page_cache.stats()["not_modified"] == 1
+
+
+class RecordingConnection:
+    def __init__(self, entries):
+        self.entries = entries
+        self.queries = []
+
+    async def execute(self, query, params=None):
+        self.queries.append((" ".join(query.split()), params))
+        entries = self.entries
+
+        class Cursor:
+            async def fetchone(self):
+                return {"entries": entries}
+
+        cursor = Cursor()
+        cursor.rowcount = params[0] if "LIMIT" in query else 0
+        return cursor
+
+
+class RecordingPool:
+    def __init__(self, entries):
+        self.conn = RecordingConnection(entries)
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self.conn
+
+
+def test_only_first_default_pages_are_shared(monkeypatch):
+    fake = RecordingPool(entries=0)
+    monkeypatch.setattr(page_cache_module, "pool", fake)
+    cache = PageCache(shared=True, enabled=True)
+    first = {"token": None, "limit": PAGE_SIZE}
+    assert service.shareable(first)
+    assert not service.shareable({"token": encode_cursor("id", "desc", [9]), "limit": PAGE_SIZE})
+    assert not service.shareable({"token": None, "limit": PAGE_SIZE - 1})
+
+    asyncio.run(cache.put("exam_detail:1:cursor", 3, b"x", share=False))
+    assert fake.conn.queries == []
+    assert asyncio.run(cache.get("exam_detail:1:cursor", 3, share=False)) == b"x"  # memory tier still serves it
+
+
+def test_shared_writes_evict_old_builds_and_the_oldest_pages(monkeypatch):
+    fake = RecordingPool(entries=120)
+    monkeypatch.setattr(page_cache_module, "pool", fake)
+    cache = PageCache(shared=True, enabled=True, shared_max_entries=100, evict_interval=3600)
+    asyncio.run(cache.put("exam_detail:1", 3, b"a"))
+    asyncio.run(cache.put("exam_detail:2", 3, b"b"))
+    deletes = [(query, params) for query, params in fake.conn.queries if query.startswith("DELETE")]
+    (builds, build_params), (trim, trim_params) = deletes  # the second write is inside the interval
+    assert build_params == (len(cache.build) + 1, f"{cache.build}:")
+    assert "ORDER BY created_at ASC LIMIT" in trim and trim_params == (120 - 90,)
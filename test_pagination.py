@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination: opaque cursors, page splitting and request validation.
+"""
+
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from repository import repository
+from services import service
+from utility.pagination import decode_cursor, encode_cursor, split_page
+from configuration.main_config import MAX_PAGE_SIZE, PAGE_SIZE
+
+
+def get(query=""):
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": query.encode()})
+
+
+def test_cursors_round_trip_only_for_their_own_sort():
+    token = encode_cursor("score", "desc", [float("-inf"), 42])
+    assert decode_cursor(token, "score", "desc") == [float("-inf"), 42]
+    with pytest.raises(ValueError):
+        decode_cursor(token, "name", "desc")
+    with pytest.raises(ValueError):
+        decode_cursor(token, "score", "asc")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", "score", "desc")
+
+
+def test_split_page_uses_the_extra_row_to_detect_more():
+    rows = [{"id": n} for n in range(1, 5)]
+    page, next_cursor = split_page(rows, 3, "id", "asc", lambda row: [row["id"]])
+    assert [row["id"] for row in page] == [1, 2, 3]
+    assert decode_cursor(next_cursor, "id", "asc") == [3]
+    assert split_page(rows[:3], 3, "id", "asc", lambda row: [row["id"]]) == (rows[:3], None)
+
+
+def test_parse_page_limits_and_cursors():
+    assert service.parse_page(get())["limit"] == PAGE_SIZE
+    page = service.parse_page(get(f"limit=5&after={encode_cursor('id', 'desc', [9])}"), "id", "desc")
+    assert (page["limit"], page["after"]) == (5, [9])
+    for query in ("limit=0", f"limit={MAX_PAGE_SIZE + 1}", "limit=ten", f"after={encode_cursor('id', 'asc', [9])}"):
+        with pytest.raises(HTTPException) as error:
+            service.parse_page(get(query), "id", "desc")
+        assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("sort, key", [
+    ("id", []), ("id", ["x"]), ("id", [True]), ("id", [2 ** 40]), ("id", [1, 2]),
+    ("name", ["Ada"]), ("name", [1, 2]), ("name", ["A\x00", 2]),
+    ("score", ["x", 2]), ("score", [1e300, 2]), ("score", [1.5, 2.5]),
+])
+def test_hand_edited_cursor_keys_are_rejected(sort, key):
+    order = "desc" if sort in ("id", "score") else "asc"
+    query = f"after={encode_cursor(sort, order, key)}"
+    with pytest.raises(HTTPException) as error:
+        service.parse_page(get(query), sort, order)
+    assert error.value.status_code == 400
+
+
+def test_cursor_keys_of_real_pages_are_accepted():
+    assert service.valid_cursor_key("score", [float("-inf"), 3])
+    assert service.valid_cursor_key("score", [7, 3])
+    assert service.valid_cursor_key("name", ["Ada", 3])
+
+
+def test_result_pages_default_to_best_score_first():
+    page = service.parse_result_page(get("sort=score"))
+    assert (page["sort"], page["order"]) == ("score", "desc")
+    assert service.parse_result_page(get())["order"] == "asc"
+    for query in ("sort=total", "sort=name&order=sideways"):
+        with pytest.raises(HTTPException):
+            service.parse_result_page(get(query))
+
+
+class RecordingPool:
+    def __init__(self):
+        self.queries = []
+
+    @asynccontextmanager
+    async def connection(self):
+        pool = self
+
+        class Connection:
+            async def execute(self, query, params=None):
+                pool.queries.append(" ".join(query.split()))
+
+                class Cursor:
+                    async def fetchall(self):
+                        return []
+
+                return Cursor()
+
+        yield Connection()
+
+
+def test_first_pages_and_seek_pages_are_separate_statements(monkeypatch):
+    fake = RecordingPool()
+    monkeypatch.setattr(repository, "pool", fake)
+
+    async def scenario():
+        await repository.list_exams(10)
+        await repository.list_exams(10, 42)
+        await repository.get_students_with_sheet_counts(1, 10)
+        await repository.get_students_with_sheet_counts(1, 10, 42)
+        await repository.get_students_results(1, "score", True, 10)
+        await repository.get_students_results(1, "score", True, 10, [1.5, 42])
+
+    asyncio.run(scenario())
+    assert not any("IS NULL" in query for query in fake.queries)
+    exams, exams_after, students, students_after, results, results_after = fake.queries
+    assert "WHERE" not in exams and "WHERE id < %(after)s ORDER BY id DESC" in exams_after
+    assert "students.id >" not in students and "AND students.id > %(after)s ORDER BY" in students_after
+    seek = "(COALESCE(students.best_score, '-infinity'::real), students.id) < (%(after_key)s::real, %(after_id)s)"
+    assert seek not in results and f"AND {seek} ORDER BY" in results_after
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Grading progress: events go out as work finishes and fan out to the SSE subscribers of their exam.
+"""
+
+import asyncio
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from utility import inference, progress, scoring, utilities
+from utility.inference import BatchInferenceEngine
+
+
+def test_events_reach_only_their_exam():
+    async def scenario():
+        hub = progress.ProgressHub()
+        hub._listen = lambda: asyncio.sleep(0)  # no database; payloads are dispatched by hand
+        async with hub.subscribe(1) as first, hub.subscribe(2) as second:
+            hub.dispatch(json.dumps({"event": "page_ocr", "exam_id": 1, "sheet_id": 9, "page": 1}))
+            hub.dispatch("not json")
+            assert second.empty()
+            return await first.get(), hub._subscribers
+
+    event, subscribers = asyncio.run(scenario())
+    assert event["sheet_id"] == 9 and subscribers == {}
+    assert progress.format_sse(event).startswith("event: page_ocr\ndata: {")
+
+
+class RecordingProgress(progress.Progress):
+    def __init__(self):
+        self.events = []
+        self.first_page_done = threading.Event()
+
+    def emit_many(self, event, rows):
+        for row in rows:
+            self.events.append((event, row))
+            if event == "page_ocr" and row["page"] == 1:
+                self.first_page_done.set()
+
+
+def test_page_ocr_is_published_as_each_page_finishes(monkeypatch):
+    pages = [Image.new("RGB", (10 * n, 10), "white") for n in (1, 2, 3)]
+    monkeypatch.setattr(utilities, "page_count", lambda path: len(pages))
+    monkeypatch.setattr(utilities, "convert_from_path",
+                        lambda path, first_page, last_page: pages[first_page - 1:last_page])
+    recorder = RecordingProgress()
+    waited = []
+
+    def runner(images, task_prompt, profile=None):
+        # Page 2 is only OCRed once page 1's event is out: a burst at the end never gets here.
+        if images[0].width == 20:
+            waited.append(recorder.first_page_done.wait(timeout=5))
+        return [{task_prompt: {"labels": [f"answer {image.width // 10}"]}} for image in images]
+
+    monkeypatch.setattr(inference, "_engine", BatchInferenceEngine(runner=runner, max_batch_size=1))
+    answers = utilities.extract_text_from_pdf(Path(__file__), use_ocr_cache=False, progress=recorder)
+    assert answers == ["answer 1", "answer 2", "answer 3"]
+    assert waited == [True]
+    assert [event for event, _ in recorder.events] == ["page_rasterized"] * 3 + ["page_ocr"] * 3
+
+
+def test_question_scores_are_reported_as_they_are_decided():
+    items = [("Cell membrane.", "cell membrane", 2.0), ("the outer cell wall", "cell membrane", 2.0)]
+    reported = []
+
+    class Backend(scoring.StubBackend):
+        async def complete(self, prompt):
+            reported.append(("llm call", None, None))
+            return await super().complete(prompt)
+
+    scoring.set_rate_limit(1000, 1000)
+    asyncio.run(scoring.score_tiered(
+        items, (95, 10), backend=Backend(latency_ms=0), use_cache=False, mode="question",
+        on_score=lambda index, score, tier: reported.append((index, score, tier)),
+    ))
+    assert reported[0] == (0, 2.0, "fuzzy_full")
+    assert reported[1][0] == "llm call" and reported[2][0] == 1 and reported[2][2] == "llm"
+
+
+class GradingConnection:
+    def __init__(self):
+        self.closed = False
+        self.rows = [{"id": 4, "student_id": 2, "exam_id": 1, "scoring_mode": None, "tier_high": None, "tier_low": None}]
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+    def fetchall(self):
+        return [{"id": 11, "text": "Q", "ideal_answer": "A", "point_value": 1.0, "answer_page": None, "answer_box": None}]
+
+    def close(self):
+        self.closed = True
+
+
+def test_a_failed_sheet_still_closes_its_connection(monkeypatch):
+    conn = GradingConnection()
+    monkeypatch.setattr(utilities, "get_cursor", lambda: (conn, conn))
+
+    def broken_ocr(*args, **kwargs):
+        raise RuntimeError("OCR pool is down")
+
+    monkeypatch.setattr(utilities, "extract_text_from_pdf", broken_ocr)
+    with pytest.raises(RuntimeError):
+        utilities.evaluate_answer_sheet(Path("sheet.pdf"), 4)
+    assert conn.closed
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Regrades re-score the answers stored for a sheet and fall back to OCR only without them.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from utility import scoring, utilities
+
+QUESTIONS = [
+    {"id": 11, "text": "Q1", "ideal_answer": "A1", "point_value": 1.0, "answer_page": None, "answer_box": None},
+    {"id": 12, "text": "Q2", "ideal_answer": "A2", "point_value": 2.0, "answer_page": None, "answer_box": None},
+]
+SHEET = {"id": 4, "student_id": 2, "exam_id": 1, "scoring_mode": None, "tier_high": None, "tier_low": None}
+
+
+class SheetConnection:
+    """Answers the queries of ``evaluate_answer_sheet`` for one sheet with ``stored`` answers."""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.queries = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        self.queries.append((" ".join(query.split()), params))
+        if query.startswith("SELECT answer_sheets.*"):
+            self._rows = [SHEET]
+        elif query.startswith("SELECT id, text"):
+            self._rows = [dict(question) for question in QUESTIONS]
+        elif query.startswith("SELECT question_id, student_answer"):
+            self._rows = [{"question_id": qid, "student_answer": answer} for qid, answer in self.stored.items()]
+        elif query.startswith("SELECT id, ideal_answer"):
+            self._rows = [{"id": q["id"], "ideal_answer": q["ideal_answer"], "point_value": q["point_value"]} for q in QUESTIONS]
+        else:
+            self._rows = []
+
+    def executemany(self, query, rows):
+        self.queries.append((" ".join(query.split()), rows))
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def graded(monkeypatch):
+    ocr_calls = []
+    scored = []
+
+    def ocr(*args, **kwargs):
+        ocr_calls.append(args)
+        return ["fresh one", "fresh two"]
+
+    async def score_tiered(items, thresholds=None, on_score=None, **kwargs):
+        scored.extend(answer for answer, _, _ in items)
+        return [1.0] * len(items), ["llm"] * len(items)
+
+    monkeypatch.setattr(utilities, "extract_text_from_pdf", ocr)
+    monkeypatch.setattr(scoring, "score_tiered", score_tiered)
+    return ocr_calls, scored
+
+
+def test_regrade_rescores_stored_answers_without_ocr(monkeypatch, graded):
+    ocr_calls, scored = graded
+    conn = SheetConnection({11: "stored one", 12: "stored two"})
+    monkeypatch.setattr(utilities, "get_cursor", lambda: (conn, conn))
+    utilities.evaluate_answer_sheet(Path("sheet.pdf"), 4, use_ocr_cache=False, reuse_answers=True)
+    assert ocr_calls == [] and scored == ["stored one", "stored two"]
+    (update, params), = [(q, p) for q, p in conn.queries if q.startswith("UPDATE answer_sheets")]
+    assert "COALESCE(%s, extracted_text)" in update and params[0] is None
+
+
+def test_regrade_falls_back_to_ocr_when_an_answer_is_missing(monkeypatch, graded):
+    ocr_calls, scored = graded
+    conn = SheetConnection({11: "stored one"})  # question 12 was added since
+    monkeypatch.setattr(utilities, "get_cursor", lambda: (conn, conn))
+    utilities.evaluate_answer_sheet(Path("sheet.pdf"), 4, use_ocr_cache=False, reuse_answers=True)
+    assert len(ocr_calls) == 1 and scored == ["fresh one", "fresh two"]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Question edits: a changed rubric queues one re-score job, never two.
+"""
+
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from repository import repository
+from repository.jobs import QUEUE_RESCORE
+
+
+class FakeConnection:
+    def __init__(self, rubric_changed, already_queued):
+        self.rubric_changed = rubric_changed
+        self.already_queued = already_queued
+        self.queries = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def execute(self, query, params=None):
+        self.queries.append(query)
+        if "FOR UPDATE" in query:
+            row = {"id": 7, "ideal_answer": "old", "point_value": 1.0, "rubric_changed": self.rubric_changed}
+        elif query == QUEUE_RESCORE:
+            row = None if self.already_queued else {"question_id": params[0][0]}
+        else:
+            row = None
+
+        class Cursor:
+            async def fetchone(self):
+                return row
+
+        return Cursor()
+
+
+class FakePool:
+    def __init__(self, connection):
+        self.conn = connection
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self.conn
+
+
+@pytest.mark.parametrize("rubric_changed, already_queued, queued", [
+    (True, False, True), (True, True, False), (False, False, False),
+])
+def test_update_question_reports_whether_it_queued(monkeypatch, rubric_changed, already_queued, queued):
+    conn = FakeConnection(rubric_changed, already_queued)
+    monkeypatch.setattr(repository, "pool", FakePool(conn))
+    old = asyncio.run(repository.update_question(3, 7, "Q", "new", 2.0))
+    assert old["rescore_queued"] is queued
+    assert (QUEUE_RESCORE in conn.queries) is rubric_changed
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+LLM scoring plumbing: score parsing, the token bucket, retries and failure handling.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from utility import scoring
+
+
+class FlakyBackend(scoring.ScoringBackend):
+    """Raises each error of ``failures`` in turn, then answers ``reply``."""
+
+    model_id = "test/flaky"
+
+    def __init__(self, failures=(), reply="1", delay=0.0):
+        self.failures = list(failures)
+        self.reply = reply
+        self.delay = delay
+        self.calls = 0
+
+    async def complete(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            raise self.failures.pop(0)
+        return self.reply
+
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    scoring.set_rate_limit(1000, 1000)
+    monkeypatch.setattr(scoring, "SCORING_RETRY_BASE", 0)
+
+
+def test_parse_score_reads_and_clamps_the_first_number():
+    assert scoring.parse_score("Score: 1.5", 2) == 1.5
+    assert scoring.parse_score(["1", ".", "5"], 2) == 1.5
+    assert scoring.parse_score("7", 2) == 2.0
+    assert scoring.parse_score("-1", 2) == 0.0
+    assert scoring.parse_score("I cannot grade this.", 2) is None
+    assert scoring.parse_score(None, 2) is None
+
+
+def test_token_bucket_allows_a_burst_then_spaces_calls():
+    bucket = scoring.TokenBucket(rate=10, capacity=2)
+    delays = [bucket._reserve() for _ in range(4)]
+    assert delays[:2] == [0.0, 0.0]
+    assert delays[2] == pytest.approx(0.1, abs=0.01)
+    assert delays[3] == pytest.approx(0.2, abs=0.01)
+    bucket._updated -= 1  # a second later the bucket is full again
+    assert bucket._reserve() == 0.0
+
+
+def test_throttled_and_timed_out_calls_are_retried():
+    backend = FlakyBackend([scoring.ThrottledError("429"), asyncio.TimeoutError()])
+    assert asyncio.run(scoring.complete_with_retry(backend, "prompt", max_retries=2)) == "1"
+    assert backend.calls == 3
+
+    slow = FlakyBackend(delay=1.0)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scoring.complete_with_retry(slow, "prompt", timeout=0.01, max_retries=1))
+    assert slow.calls == 2
+
+
+def test_other_errors_are_not_retried():
+    backend = FlakyBackend([PermissionError("401")])
+    with pytest.raises(PermissionError):
+        asyncio.run(scoring.complete_with_retry(backend, "prompt", max_retries=3))
+    assert backend.calls == 1
+
+
+def test_unscorable_answers_fail_the_sheet_instead_of_scoring_zero():
+    backend = FlakyBackend([RuntimeError("replicate is down")] * 10)
+    items = [("a", "b", 1.0), ("c", "d", 1.0)]
+    with pytest.raises(scoring.ScoringError):
+        asyncio.run(scoring.score_answers(items, backend=backend, use_cache=False, mode="question"))
+
+
+def test_garbled_replies_are_never_cached(monkeypatch):
+    stored = []
+    monkeypatch.setattr(scoring.score_cache, "get_many", lambda keys: {})
+    monkeypatch.setattr(scoring.score_cache, "put_many", stored.extend)
+    with pytest.raises(scoring.ScoringError):
+        asyncio.run(scoring.score_answers([("a", "b", 1.0)], backend=FlakyBackend(reply="n/a"), mode="question"))
+    assert stored == []
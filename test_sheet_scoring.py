@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Sheet-level scoring: JSON array validation, chunking and per-question fallback.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from utility import scoring
+
+ITEMS = [("the cell membrane", "cell membrane", 2.0), ("gravity", "force of gravity", 1.0), ("x", "y", 3.0)]
+
+
+class RecordingBackend(scoring.StubBackend):
+    def __init__(self, sheet_reply=None):
+        super().__init__(latency_ms=0)
+        self.sheet_reply = sheet_reply
+        self.prompts = []
+
+    async def complete(self, prompt):
+        self.prompts.append(prompt)
+        if self.sheet_reply is not None and "JSON array" in prompt:
+            return self.sheet_reply
+        return await super().complete(prompt)
+
+
+def score(backend, mode):
+    scoring.set_rate_limit(1000, 1000)
+    return asyncio.run(scoring.score_answers(ITEMS, backend=backend, use_cache=False, mode=mode))
+
+
+def test_parse_rejects_out_of_range_and_wrong_length():
+    assert scoring.parse_sheet_scores("Scores: [1, 0.5, 3]", [2, 1, 3]) == [1.0, 0.5, 3.0]
+    assert scoring.parse_sheet_scores('[1, 5, "2"]', [2, 1, 3]) == [1.0, None, None]
+    assert scoring.parse_sheet_scores("[1, 2]", [2, 1, 3]) == [None, None, None]
+    assert scoring.parse_sheet_scores("no idea", [2]) == [None]
+
+
+def test_sheet_mode_uses_one_call_and_matches_question_mode():
+    sheet, question = RecordingBackend(), RecordingBackend()
+    assert score(sheet, "sheet") == score(question, "question")
+    assert len(sheet.prompts) == 1
+    assert len(question.prompts) == len(ITEMS)
+
+
+def test_unusable_scores_fall_back_per_question():
+    backend = RecordingBackend(sheet_reply="[1.5, 7, 0]")
+    scores = score(backend, "sheet")
+    assert scores[0] == 1.5 and scores[2] == 0.0
+    assert scores[1] == score(RecordingBackend(), "question")[1]
+    assert len(backend.prompts) == 2  # the sheet call plus one fallback
+
+
+def test_chunks_respect_token_budget():
+    chunks = scoring.chunk_items(ITEMS * 40, token_budget=400)
+    assert sum(map(len, chunks)) == len(ITEMS) * 40
+    assert all(scoring.estimate_tokens(scoring.build_sheet_prompt(chunk)) <= 400 for chunk in chunks)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+RapidFuzz tiers: clear-cut answers are decided without the LLM.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from utility import scoring
+
+ITEMS = [
+    ("Cell membrane.", "cell membrane", 2.0),          # same words -> full marks
+    ("xyz", "cell membrane", 2.0),                     # unrelated -> zero
+    ("the outer cell wall", "cell membrane", 2.0),     # partial -> escalated
+    ("", "force of gravity", 1.0),                     # blank -> zero
+]
+
+
+class CountingStub(scoring.StubBackend):
+    def __init__(self):
+        super().__init__(latency_ms=0)
+        self.prompts = []
+
+    async def complete(self, prompt):
+        self.prompts.append(prompt)
+        return await super().complete(prompt)
+
+
+def test_triage_decides_only_clear_cut_answers():
+    assert scoring.triage(ITEMS, high=95, low=10) == [2.0, 0.0, None, 0.0]
+
+
+def test_only_the_middle_band_reaches_the_llm():
+    scoring.set_rate_limit(1000, 1000)
+    backend = CountingStub()
+    scores, graded_by = asyncio.run(
+        scoring.score_tiered(ITEMS, (95, 10), backend=backend, use_cache=False, mode="question")
+    )
+    assert graded_by == ["fuzzy_full", "fuzzy_zero", "llm", "fuzzy_zero"]
+    assert len(backend.prompts) == 1 and "outer cell wall" in backend.prompts[0]
+    assert scores[:2] == [2.0, 0.0] and 0 < scores[2] < 2.0
+
+
+def test_no_thresholds_means_llm_only():
+    scores, graded_by = asyncio.run(
+        scoring.score_tiered(ITEMS[:1], None, backend=CountingStub(), use_cache=False, mode="question")
+    )
+    assert graded_by == ["llm"]